@@ -3,6 +3,10 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through it (for example ``uvicorn project.asgi:application``)
+to enable the notifications stream; under WSGI the stream endpoint answers 204
+and pages fall back to a single fetch.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -53,12 +53,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'project_app.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'allauth.account.middleware.AccountMiddleware',
+    'project_app.middleware.FinanceUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -152,6 +154,61 @@ LOGOUT_REDIRECT_URL = '/'
 
 # Configure Google provider (set your real keys via environment variables)
 import os
+# Cache shared by all worker processes, so per-user data versions (see
+# project_app/caching.py) stay in sync between them. File-based by default;
+# set FINANCEFLOW_CACHE_URL to redis://host:port/db to use Redis or a
+# Redis-compatible server such as Valkey (needs the "redis" package), or to
+# locmem:// for a single process. The tests pin their own in-memory cache
+# (project_app/tests.py), whatever runner starts them.
+FINANCEFLOW_CACHE_URL = os.environ.get('FINANCEFLOW_CACHE_URL', '')
+if FINANCEFLOW_CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': FINANCEFLOW_CACHE_URL,
+        }
+    }
+elif FINANCEFLOW_CACHE_URL.startswith('locmem://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'financeflow',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('FINANCEFLOW_CACHE_DIR', str(BASE_DIR / '.cache')),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Per-name cache timeouts in seconds, overriding project_app.caching.POLICIES
+FINANCEFLOW_CACHE_POLICIES = {}
+
+# Per-request timing (project_app.middleware.RequestTimingMiddleware): requests
+# slower than FINANCEFLOW_SLOW_REQUEST_MS are logged on "financeflow.requests"
+# as warnings with their SQL. Set FINANCEFLOW_REQUEST_LOG_LEVEL=INFO to also
+# log every request as a JSON line.
+FINANCEFLOW_REQUEST_TIMING = True
+FINANCEFLOW_SLOW_REQUEST_MS = int(os.environ.get('FINANCEFLOW_SLOW_REQUEST_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'financeflow.requests': {
+            'handlers': ['console'],
+            'level': os.environ.get('FINANCEFLOW_REQUEST_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 SOCIALACCOUNT_PROVIDERS = {
     'google': {
         'APP': {
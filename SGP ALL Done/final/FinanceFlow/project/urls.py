@@ -25,9 +25,10 @@ from project_app.views import logout
 from project_app.views import transaction_history
 
 from project_app.views import reports, export_report, generate_report, generate_custom_report
-from project_app.views import analytics, chart_data
+from project_app.views import report_job_status, report_job_download
+from project_app.views import analytics, chart_data, chart_data_batch
 from project_app.views import landing, subscribe_newsletter
-from project_app.views import notifications_data
+from project_app.views import notifications_data, notifications_stream
 from project_app.views import export_profile_data, delete_account
 
 # Edit and Delete Transaction Views
@@ -56,9 +57,13 @@ urlpatterns = [
     path('export-report/', export_report, name='export_report'),
     path('generate-report/', generate_report, name='generate_report'),
     path('generate-custom-report/', generate_custom_report, name='generate_custom_report'),
+    path('reports/jobs/<int:job_id>/', report_job_status, name='report_job_status'),
+    path('reports/jobs/<int:job_id>/download/', report_job_download, name='report_job_download'),
     path('analytics/', analytics, name='analytics'),
     path('chart-data/', chart_data, name='chart_data'),
+    path('chart-data/batch/', chart_data_batch, name='chart_data_batch'),
     path('notifications-data/', notifications_data, name='notifications_data'),
+    path('notifications-stream/', notifications_stream, name='notifications_stream'),
     path('subscribe-newsletter/', subscribe_newsletter, name='subscribe_newsletter'),
     path('accounts/', include('allauth.urls')),
     # Profile actions
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _install_search_index(sender, using, **kwargs):
+    from django.db import connections
+    from . import search
+    # Table rebuilds in later migrations drop the SQLite search triggers
+    if search.available(connections[using]):
+        search.install(connections[using])
 
 
 class ProjectAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(_install_search_index, sender=self)
@@ -0,0 +1,119 @@
+"""Per-user data versions and version-keyed caching.
+
+Every change to a user's incomes or expenses bumps that user's data version
+(see ``signals.py``). Cached values include the version in their key, so
+they never need explicit invalidation: a bump simply makes them unreachable.
+
+How long each kind of value is kept is set per name in POLICIES (seconds),
+overridable with the FINANCEFLOW_CACHE_POLICIES setting. The cache backend
+itself is configured in settings (CACHES; see FINANCEFLOW_CACHE_URL).
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+KEY_PREFIX = 'financeflow'
+
+DAY = 24 * 60 * 60
+# Timeouts by the first part of the cached name ("notification-payload:..." etc.)
+POLICIES = {
+    'notification-payload': DAY,
+    'report-size': DAY,
+    'chart-data': DAY,
+    'fragment': DAY,
+}
+
+
+def timeout_for(name):
+    """Cache timeout for ``name`` from its policy."""
+    policies = dict(POLICIES, **getattr(settings, 'FINANCEFLOW_CACHE_POLICIES', {}))
+    return policies.get(name.split(':', 1)[0], DAY)
+
+
+def _version_key(user_id):
+    return f'{KEY_PREFIX}:data-version:{user_id}'
+
+
+def data_version(user_id):
+    """Return the user's data version: the millisecond timestamp of the last change."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Unknown (cold cache): start a fresh version so nothing stale is served
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_id):
+    """Mark the user's data as changed. Returns the new version."""
+    key = _version_key(user_id)
+    version = max(int(time.time() * 1000), (cache.get(key) or 0) + 1)
+    cache.set(key, version, timeout=None)
+    return version
+
+
+def version_timestamp(version):
+    """The aware UTC datetime a data version was created at."""
+    return datetime.fromtimestamp(version / 1000, tz=dt_timezone.utc)
+
+
+def versioned_key(user_id, name):
+    """Cache key for ``name`` under the user's current data version."""
+    return f'{KEY_PREFIX}:{user_id}:{data_version(user_id)}:{name}'
+
+
+def cached_for_user(user_id, name, builder, timeout=None):
+    """Return ``builder()`` cached under the user's current data version.
+
+    ``name`` must identify everything else the value depends on (for
+    example the current date for date-relative insights). ``timeout``
+    defaults to the name's policy.
+    """
+    key = versioned_key(user_id, name)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout_for(name) if timeout is None else timeout)
+    return value
+
+
+def cached_fragment(user_id, name, render, vary=()):
+    """Rendered HTML of a per-user page fragment, cached like ``cached_for_user``.
+
+    ``vary`` lists anything besides the user's data that the fragment
+    depends on; the current date is always included.
+    """
+    parts = [timezone.localdate().isoformat(), *map(str, vary)]
+    return cached_for_user(user_id, f"fragment:{name}:{':'.join(parts)}", render)
+
+
+def cache_per_user(name):
+    """Cache a GET view's successful responses per user and query string.
+
+    Keys include the user's data version and the current date, so the
+    cached responses are never stale. Requests without a finance user are
+    passed through.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            user = getattr(request, 'finance_user', None)
+            if user is None or request.method != 'GET':
+                return view(request, *args, **kwargs)
+            key = versioned_key(user.pk, f'{name}:{timezone.localdate().isoformat()}:{request.GET.urlencode()}')
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout_for(name))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,91 @@
+"""Calendar buckets for time series: days, weeks (Monday first) and months.
+
+Charts want one value per bucket, including buckets with no data. The
+pattern is: group the rows with ``trunc(field, granularity)`` in a single
+query, turn the result into a ``{bucket: total}`` dict, then read it through
+``dense(totals, keys(...))`` so empty buckets come out as zero and every
+series built from the same keys lines up.
+
+Bucket keys are always ``date`` objects: the day itself, the Monday of
+the week (as TruncWeek) or the first of the month (as TruncMonth).
+"""
+from datetime import date, datetime, timedelta
+
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+
+_TRUNCS = {DAY: TruncDay, WEEK: TruncWeek, MONTH: TruncMonth}
+
+
+def as_key(value):
+    """A date, or the date part of a datetime, as a bucket key."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def floor(value, granularity):
+    """The key of the bucket containing ``value``."""
+    day = as_key(value)
+    if granularity == DAY:
+        return day
+    if granularity == WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == MONTH:
+        return day.replace(day=1)
+    raise ValueError(f'Unknown granularity: {granularity!r}')
+
+
+def shift(key, granularity, n):
+    """The key ``n`` buckets after ``key`` (before it for negative ``n``)."""
+    key = floor(key, granularity)
+    if granularity == DAY:
+        return key + timedelta(days=n)
+    if granularity == WEEK:
+        return key + timedelta(weeks=n)
+    months = key.year * 12 + key.month - 1 + n
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def keys(start, end, granularity):
+    """Keys of every bucket from the one containing ``start`` to the one containing ``end``."""
+    key, last = floor(start, granularity), floor(end, granularity)
+    result = []
+    while key <= last:
+        result.append(key)
+        key = shift(key, granularity, 1)
+    return result
+
+
+def trailing(end, count, granularity):
+    """The last ``count`` bucket keys, ending with the bucket containing ``end``."""
+    return keys(shift(end, granularity, 1 - count), end, granularity)
+
+
+def trunc(field, granularity):
+    """An expression grouping ``field`` into ``granularity`` buckets, for ``values()``."""
+    return _TRUNCS[granularity](field)
+
+
+def totals(rows, key='bucket', value='total'):
+    """``{bucket: total}`` from grouped rows, summing rows that fall in the same bucket."""
+    result = {}
+    for row in rows:
+        bucket = as_key(row[key])
+        result[bucket] = result.get(bucket, 0) + (row[value] or 0)
+    return result
+
+
+def rebucket(totals_by_key, granularity):
+    """Merge totals keyed by finer buckets (e.g. days) into ``granularity`` buckets."""
+    result = {}
+    for key, total in totals_by_key.items():
+        bucket = floor(key, granularity)
+        result[bucket] = result.get(bucket, 0) + total
+    return result
+
+
+def dense(totals_by_key, bucket_keys, default=0):
+    """The totals for ``bucket_keys`` in order, ``default`` where a bucket has none."""
+    return [totals_by_key.get(key, default) for key in bucket_keys]
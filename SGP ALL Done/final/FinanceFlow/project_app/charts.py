@@ -0,0 +1,196 @@
+"""Chart.js payloads for the dashboard charts.
+
+Each chart type has a builder taking a ChartData (the user plus the
+aggregates charts share, each computed at most once) and the request's
+query parameters. ``build`` serves one chart for ``chart_data``;
+``build_many`` serves several from the same ChartData for the batched
+endpoint, so the monthly and balance charts share one monthly query and
+the category charts one category query. (The dashboard's savings chart
+is computed in the browser from the monthly payload.)
+"""
+from datetime import datetime
+from functools import cached_property
+
+from django.utils import timezone
+
+from . import filters, rollups
+from .models import Expense, Income
+
+
+class UnknownChart(ValueError):
+    """No builder for the requested chart type."""
+
+
+class ChartData:
+    """Aggregates shared between the charts of one request."""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def months(self):
+        """``(month_starts, income, expense)`` for the last 12 calendar months."""
+        return rollups.month_series(self.user, 12, datetime.now().date())
+
+    @cached_property
+    def expense_categories(self):
+        return list(rollups.by_category(self.user, rollups.EXPENSE))
+
+    @cached_property
+    def income_categories(self):
+        return list(rollups.by_category(self.user, rollups.INCOME))
+
+
+def monthly(data, params):
+    """Income and expense for the last 12 months."""
+    month_starts, income_totals, expense_totals = data.months
+
+    # Format data for Chart.js
+    months = [month.strftime('%B %Y') for month in month_starts]
+    income_data = [float(total) for total in income_totals]
+    expense_data = [float(total) for total in expense_totals]
+
+    return {
+        'labels': months,
+        'datasets': [
+            {
+                'label': 'Income',
+                'data': income_data,
+                'borderColor': '#10b981',
+                'backgroundColor': 'rgba(16, 185, 129, 0.1)',
+                'tension': 0.4
+            },
+            {
+                'label': 'Expense',
+                'data': expense_data,
+                'borderColor': '#ef4444',
+                'backgroundColor': 'rgba(239, 68, 68, 0.1)',
+                'tension': 0.4
+            }
+        ]
+    }
+
+
+def category(data, params):
+    """Expense totals by category, for the doughnut chart."""
+    expense_categories = data.expense_categories
+
+    # Return data in the format expected by the dashboard chart
+    if expense_categories:
+        return {
+            'labels': [item['category'] for item in expense_categories],
+            'datasets': [{
+                'data': [float(item['total']) for item in expense_categories]
+            }]
+        }
+    else:
+        # Return empty data if no expenses found
+        return {
+            'labels': ['No Data'],
+            'datasets': [{
+                'data': [0]
+            }]
+        }
+
+
+def income_sources(data, params):
+    """Income totals by category."""
+    sources = data.income_categories
+
+    return {
+        'labels': [item['category'] for item in sources],
+        'data': [float(item['total']) for item in sources]
+    }
+
+
+def spending_categories(data, params):
+    """Expense totals by category."""
+    categories = data.expense_categories
+
+    return {
+        'labels': [item['category'] for item in categories],
+        'data': [float(item['total']) for item in categories]
+    }
+
+
+def balance(data, params):
+    """Monthly balance (income - expenses) for the last 12 months."""
+    # Same months as the monthly chart
+    month_starts, income_totals, expense_totals = data.months
+
+    labels = [month.strftime('%b %Y') for month in month_starts]
+    monthly_data = [float(income) - float(expense) for income, expense in zip(income_totals, expense_totals)]
+
+    return {
+        'labels': labels,
+        'datasets': [{
+            'label': 'Balance',
+            'data': monthly_data,
+            'borderColor': '#3B82F6',
+            'backgroundColor': 'rgba(59, 130, 246, 0.1)',
+            'tension': 0.4,
+            'fill': True
+        }]
+    }
+
+
+def filtered(data, params):
+    """Transaction counters and recent transactions for the dashboard filters."""
+    now = timezone.now()
+    condition = filters.compile_filters(params, now)
+    income = filters.counters(Income, data.user, condition, now)
+    expense = filters.counters(Expense, data.user, condition, now)
+
+    recent_transactions = [{
+        'description': row['description'],
+        'category': row['category'],
+        'amount': float(row['amount']),
+        'date': row['created_at'].strftime('%Y-%m-%d'),
+        'type': row['type'],
+    } for row in filters.recent(data.user, condition)]
+
+    return {
+        'transaction_counts': {
+            window: {
+                'total': income[window]['count'] + expense[window]['count'],
+                'income': float(income[window]['total']),
+                'expense': float(expense[window]['total'])
+            }
+            for window in filters.COUNTER_WINDOWS
+        },
+        'recent_transactions': recent_transactions
+    }
+
+
+BUILDERS = {
+    'monthly': monthly,
+    'category': category,
+    'categories': category,
+    'income_sources': income_sources,
+    'spending_categories': spending_categories,
+    'balance': balance,
+    'filtered': filtered,
+}
+
+
+def build(chart_type, data, params):
+    """The payload for one chart. Raises UnknownChart for unknown types."""
+    try:
+        builder = BUILDERS[chart_type]
+    except KeyError:
+        raise UnknownChart(chart_type)
+    return builder(data, params)
+
+
+def build_many(chart_types, data, params):
+    """``{chart_type: payload}`` for several charts, sharing ``data``.
+
+    Unknown types get an ``error`` entry instead of failing the batch.
+    """
+    payloads = {}
+    for chart_type in chart_types:
+        try:
+            payloads[chart_type] = build(chart_type, data, params)
+        except UnknownChart:
+            payloads[chart_type] = {'error': 'Invalid chart type'}
+    return payloads
@@ -0,0 +1,72 @@
+"""Publish/subscribe hub for per-user change events.
+
+Signal handlers publish an event whenever a user's transactions change and
+the notifications stream (an async view) subscribes once per open tab. The
+default hub only reaches subscribers in the same process; point the
+FINANCEFLOW_EVENT_HUB setting at another class with the same
+``subscribe``/``unsubscribe``/``publish`` methods to fan out through a local
+broker when running several server processes.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_HUB = 'project_app.events.InProcessHub'
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # The tab is already behind; it refreshes everything on its next event
+        pass
+
+
+class InProcessHub:
+    """Fan events out to asyncio queues living in this process."""
+    queue_size = 16
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> {queue: event loop}
+
+    def subscribe(self, user_id):
+        """Return a queue receiving the user's events. Call from the event loop."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, event):
+        """Deliver ``event`` to every subscriber of ``user_id``. Safe from any thread."""
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(user_id, queue)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Return the process-wide hub configured by FINANCEFLOW_EVENT_HUB."""
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = import_string(getattr(settings, 'FINANCEFLOW_EVENT_HUB', DEFAULT_HUB))()
+    return _hub
@@ -0,0 +1,106 @@
+"""Streaming CSV and JSON downloads.
+
+Exports are sent as they are produced. Rows are read from the database with
+``iterator(chunk_size=...)`` and encoded a batch at a time, so memory stays
+bounded however many transactions a user has, and the download starts
+right away.
+"""
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+
+# Rows fetched from the database per round trip
+CHUNK_SIZE = 2000
+# Approximate size of each chunk handed to the server
+FLUSH_BYTES = 64 * 1024
+
+
+class Echo:
+    """File-like object whose write() returns the data instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def _batched(pieces):
+    """Join small strings into chunks of about FLUSH_BYTES."""
+    batch, size = [], 0
+    for piece in pieces:
+        batch.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            yield ''.join(batch)
+            batch, size = [], 0
+    if batch:
+        yield ''.join(batch)
+
+
+def iter_rows(queryset, *fields):
+    """Stream ``values_list(*fields)`` of a queryset in CHUNK_SIZE batches."""
+    return queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+def csv_lines(rows):
+    """Encode an iterable of rows as CSV lines, one at a time."""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def json_document(fields, key, items):
+    """Encode ``{**fields, key: [*items]}`` as JSON incrementally.
+
+    Items are written one per line as they are consumed.
+    """
+    yield '{\n'
+    for name, value in fields.items():
+        yield f'  {json.dumps(name)}: {json.dumps(value)},\n'
+    yield f'  {json.dumps(key)}: ['
+    separator = '\n    '
+    for item in items:
+        yield separator + json.dumps(item)
+        separator = ',\n    '
+    yield ('\n  ]' if separator != '\n    ' else ']') + '\n}\n'
+
+
+def json_array(items):
+    """Encode an iterable as a JSON array incrementally, one item per line."""
+    yield '['
+    separator = '\n  '
+    for item in items:
+        yield separator + json.dumps(item)
+        separator = ',\n  '
+    yield ('\n]' if separator != '\n  ' else ']') + '\n'
+
+
+def _counted(chunks, on_complete):
+    """Pass chunks through, then report the total number of UTF-8 bytes."""
+    size = 0
+    for chunk in chunks:
+        chunk = chunk.encode('utf-8')
+        size += len(chunk)
+        yield chunk
+    on_complete(size)
+
+
+def streaming_download(pieces, filename, content_type, on_complete=None):
+    """Stream text pieces as an attachment named ``filename``.
+
+    ``on_complete(size)`` is called with the byte size once the whole
+    file has been sent.
+    """
+    chunks = _batched(pieces)
+    if on_complete:
+        chunks = _counted(chunks, on_complete)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_csv(rows, filename, content_type='text/csv', on_complete=None):
+    return streaming_download(csv_lines(rows), filename, content_type, on_complete)
+
+
+def stream_json(pieces, filename, on_complete=None):
+    return streaming_download(pieces, filename, 'application/json', on_complete)
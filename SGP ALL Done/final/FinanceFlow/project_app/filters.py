@@ -0,0 +1,97 @@
+"""The dashboard filters, compiled to database expressions.
+
+``compile_filters`` turns the ``date_range``/``category``/``amount_range``
+parameters into one Q object that applies to incomes and expenses alike.
+``counters`` then computes the today/this week/this month counts and sums
+for a table with a single conditional aggregate, and ``recent`` reads the
+latest matching transactions of both tables with one UNION ALL ordered by
+the database.
+"""
+from datetime import timedelta
+
+from django.db.models import CharField, Count, Q, Sum, Value
+from django.utils import timezone
+
+from .models import Expense, Income
+
+KINDS = {'income': Income, 'expense': Expense}
+
+AMOUNT_RANGES = {
+    '0-1000': Q(amount__gte=0, amount__lte=1000),
+    '1000-5000': Q(amount__gt=1000, amount__lte=5000),
+    '5000-10000': Q(amount__gt=5000, amount__lte=10000),
+    '10000+': Q(amount__gt=10000),
+}
+
+# Windows the dashboard counters cover, by their key in the response
+COUNTER_WINDOWS = ('today', 'weekly', 'monthly')
+
+
+def _midnight(now):
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def windows(now=None):
+    """``{name: (start, end)}`` for today, this week (from Monday) and this month."""
+    now = timezone.localtime(now)
+    today = _midnight(now)
+    week = today - timedelta(days=today.weekday())
+    month = today.replace(day=1)
+    next_month = (month + timedelta(days=32)).replace(day=1)
+    return {
+        'today': (today, today + timedelta(days=1)),
+        'weekly': (week, week + timedelta(days=7)),
+        'monthly': (month, next_month),
+    }
+
+
+def _date_range(name, now):
+    if name == 'today':
+        start, end = windows(now)['today']
+    elif name == 'this_week':
+        start, end = windows(now)['weekly']
+    elif name == 'this_month':
+        start, end = windows(now)['monthly']
+    elif name == 'last_3_months':
+        return Q(created_at__gte=now - timedelta(days=90), created_at__lte=now)
+    else:
+        return Q()
+    return Q(created_at__gte=start, created_at__lt=end)
+
+
+def compile_filters(params, now=None):
+    """One Q object for the filters in ``params``; unknown or 'all' values don't filter."""
+    now = timezone.localtime(now)
+    condition = _date_range(params.get('date_range', 'all'), now)
+    category = params.get('category', 'all')
+    if category != 'all':
+        condition &= Q(category=category)
+    condition &= AMOUNT_RANGES.get(params.get('amount_range', 'all'), Q())
+    return condition
+
+
+def counters(model, user, condition, now=None):
+    """``{window: {'count', 'total'}}`` of ``model`` rows matching ``condition``, in one query."""
+    spans = windows(now)
+    earliest = min(start for start, _ in spans.values())
+    latest = max(end for _, end in spans.values())
+    aggregates = {}
+    for name, (start, end) in spans.items():
+        in_window = Q(created_at__gte=start, created_at__lt=end)
+        aggregates[f'{name}_count'] = Count('id', filter=in_window)
+        aggregates[f'{name}_total'] = Sum('amount', filter=in_window)
+    # Only rows inside some window can count, so the index range stays narrow
+    row = model.objects.filter(condition, user=user, created_at__gte=earliest,
+                               created_at__lt=latest).aggregate(**aggregates)
+    return {name: {'count': row[f'{name}_count'], 'total': row[f'{name}_total'] or 0} for name in spans}
+
+
+def recent(user, condition, limit=10):
+    """The ``limit`` newest transactions of both kinds matching ``condition``."""
+    parts = [
+        model.objects.filter(condition, user=user)
+        .annotate(type=Value(kind, output_field=CharField()))
+        .values('description', 'category', 'amount', 'created_at', 'type')
+        for kind, model in KINDS.items()
+    ]
+    return list(parts[0].union(*parts[1:], all=True).order_by('-created_at')[:limit])
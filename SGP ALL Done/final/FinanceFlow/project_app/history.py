@@ -0,0 +1,129 @@
+"""Keyset-paginated transaction history.
+
+Incomes and expenses are combined with a single UNION ALL query that the
+database orders by (created_at, kind, id), newest first. Pages continue
+from an opaque cursor holding the last row's sort key instead of an
+OFFSET, so every page costs the same however much history a user has.
+
+Searches go through the full-text index (``search.py``) and are ordered by
+relevance instead, paging on the (score, key) of the last match.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import CharField, Q, Value
+
+from . import search
+from .models import Expense, Income
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+KINDS = {'income': Income, 'expense': Expense}
+FIELDS = ('id', 'amount', 'description', 'date', 'category', 'created_at', 'type')
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _pack(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def _unpack(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(token) from e
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just past ``row``."""
+    return _pack([row['created_at'].isoformat(), row['type'], row['id']])
+
+
+def decode_cursor(token):
+    """Return ``(created_at, type, id)`` from a cursor, or raise InvalidCursor."""
+    try:
+        created_at, kind, pk = _unpack(token)
+        if kind not in KINDS:
+            raise ValueError(kind)
+        return datetime.fromisoformat(created_at), kind, int(pk)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(token) from e
+
+
+def _decode_search_cursor(token):
+    try:
+        score, key = _unpack(token)
+        return float(score), int(key)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(token) from e
+
+
+def _after(kind, cursor):
+    """Rows of ``kind`` that sort after ``cursor`` in newest-first order.
+
+    The kind is constant within each half of the union, so the comparison on
+    it is resolved here. Each half keeps a single created_at range (no OR),
+    so its (user, created_at) index still yields rows in order.
+    """
+    created_at, cursor_kind, pk = cursor
+    if kind == cursor_kind:
+        return Q(created_at__lte=created_at) & ~Q(created_at=created_at, id__gte=pk)
+    if kind < cursor_kind:
+        return Q(created_at__lte=created_at)
+    return Q(created_at__lt=created_at)
+
+
+def history_queryset(user, q='', kinds=None, cursor=None):
+    """UNION ALL of the user's incomes and expenses, newest first."""
+    parts = []
+    for kind in kinds or KINDS:
+        qs = KINDS[kind].objects.filter(user=user)
+        if q:
+            qs = qs.filter(Q(description__icontains=q) | Q(category__icontains=q))
+        if cursor:
+            qs = qs.filter(_after(kind, cursor))
+        parts.append(qs.annotate(type=Value(kind, output_field=CharField())).values(*FIELDS))
+    combined = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    return combined.order_by('-created_at', '-type', '-id')
+
+
+def history_page(user, q='', kinds=None, cursor=None, limit=PAGE_SIZE):
+    """Return ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+
+    ``cursor`` is the token from the previous page (None for the first).
+    With a search term the rows come best match first.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    if q and search.available():
+        return _search_page(user, q, kinds, cursor, limit)
+    key = decode_cursor(cursor) if cursor else None
+    # One extra row tells whether another page exists
+    rows = list(history_queryset(user, q=q, kinds=kinds, cursor=key)[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _search_page(user, q, kinds, cursor, limit):
+    after = _decode_search_cursor(cursor) if cursor else None
+    matches = search.search(user, q, kinds=kinds, limit=limit + 1, after=after)
+    page = matches[:limit]
+
+    ids = {}
+    for kind, pk, _, _ in page:
+        ids.setdefault(kind, []).append(pk)
+    found = {}
+    for kind, pks in ids.items():
+        for row in KINDS[kind].objects.filter(user=user, id__in=pks).annotate(
+            type=Value(kind, output_field=CharField())
+        ).values(*FIELDS):
+            found[kind, row['id']] = row
+
+    rows = [found[kind, pk] for kind, pk, _, _ in page if (kind, pk) in found]
+    next_cursor = _pack(list(page[-1][2:])) if len(matches) > limit else None
+    return rows, next_cursor
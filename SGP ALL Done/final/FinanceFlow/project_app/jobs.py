@@ -0,0 +1,155 @@
+"""Database-backed job queue for slow report renders (PDFs).
+
+Views enqueue a ReportJob and return immediately. The job is rendered on a
+thread pool, either by ``python manage.py run_report_worker`` or, unless
+FINANCEFLOW_REPORT_JOBS_IN_PROCESS is False, by worker threads in the web
+process itself (FINANCEFLOW_REPORT_WORKERS threads, default 2). Jobs are
+claimed with a conditional UPDATE, so several workers can share the queue
+without rendering a job twice. Results are stored under MEDIA_ROOT; a job
+whose render or save fails is marked FAILED with the error.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import reporting
+from .models import ReportJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+
+
+def render_pdf(context):
+    """Render ``reports/pdf_report.html`` to PDF bytes."""
+    from xhtml2pdf import pisa
+    html = render_to_string('reports/pdf_report.html', dict(context, pdf_notice=''))
+    result = BytesIO()
+    pdf = pisa.CreatePDF(src=html, dest=result)
+    if pdf.err:
+        raise RuntimeError('Failed to generate PDF.')
+    return result.getvalue()
+
+
+def _render_report(job):
+    params = job.params
+    end_date = datetime.fromisoformat(params['end_date'])
+    start_date = reporting.report_start(params['date_range'], end_date)
+    return render_pdf({
+        'user': job.user,
+        'report_type': params['report_type'],
+        'date_range': params['date_range'],
+        'generated_on': end_date,
+        'header': reporting.REPORT_HEADER,
+        'rows': list(reporting.report_rows(job.user, params['report_type'], start_date, end_date)),
+    })
+
+
+def _render_custom_report(job):
+    params = job.params
+    return render_pdf({
+        'user': job.user,
+        'report_type': 'Custom Report',
+        'date_range': f"{params.get('start_date') or ''} to {params.get('end_date') or ''}".strip(),
+        'generated_on': datetime.fromisoformat(params['generated_on']),
+        'header': reporting.CUSTOM_REPORT_HEADER,
+        'rows': list(reporting.custom_report_rows(reporting.custom_report_items(job.user, params))),
+    })
+
+
+RENDERERS = {
+    'report': _render_report,
+    'custom_report': _render_custom_report,
+}
+
+
+def enqueue(user, kind, params, filename):
+    """Queue a render of ``kind`` and return its ReportJob."""
+    job = ReportJob.objects.create(user=user, kind=kind, params=params, filename=filename)
+    if getattr(settings, 'FINANCEFLOW_REPORT_JOBS_IN_PROCESS', True):
+        transaction.on_commit(lambda: resume(executor()))
+    return job
+
+
+def resume(pool):
+    """Requeue stale jobs, then hand every pending job to ``pool``.
+
+    Run by the in-process executor on each enqueue, so jobs orphaned by a
+    restart of the web process are picked up again. A job submitted twice
+    is rendered once: the second ``run_job`` loses the claim.
+    """
+    requeue_stale()
+    pending = ReportJob.objects.filter(status=ReportJob.PENDING).order_by('created_at')
+    for job_id in pending.values_list('pk', flat=True):
+        pool.submit(run_job, job_id)
+
+
+def claim(job_id):
+    """Mark a pending job as running. False if another worker got it first."""
+    return ReportJob.objects.filter(pk=job_id, status=ReportJob.PENDING).update(
+        status=ReportJob.RUNNING, started_at=timezone.now()
+    ) == 1
+
+
+def claim_next():
+    """Claim the oldest pending job; returns its id or None."""
+    while True:
+        job_id = ReportJob.objects.filter(status=ReportJob.PENDING).order_by('created_at').values_list('pk', flat=True).first()
+        if job_id is None:
+            return None
+        if claim(job_id):
+            return job_id
+
+
+def requeue_stale(older_than=timedelta(minutes=30)):
+    """Put jobs left running by a dead worker back in the queue."""
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started_at__lt=timezone.now() - older_than
+    ).update(status=ReportJob.PENDING, started_at=None)
+
+
+def run_job(job_id, claimed=False):
+    """Render one job and store the result. Runs on a worker thread."""
+    close_old_connections()
+    try:
+        if not claimed and not claim(job_id):
+            return
+        try:
+            job = ReportJob.objects.select_related('user').get(pk=job_id)
+            content = RENDERERS[job.kind](job)
+            job.file.save(job.filename, ContentFile(content), save=False)
+            job.status, job.finished_at = ReportJob.DONE, timezone.now()
+            job.save(update_fields=['status', 'file', 'finished_at'])
+        except Exception as e:
+            # Whatever failed, the claimed job must not stay RUNNING
+            logger.exception('Report job %s failed', job_id)
+            ReportJob.objects.filter(pk=job_id).update(
+                status=ReportJob.FAILED, error=str(e) or e.__class__.__name__, finished_at=timezone.now()
+            )
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """The process-wide worker thread pool."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'FINANCEFLOW_REPORT_WORKERS', DEFAULT_WORKERS),
+                    thread_name_prefix='report-job',
+                )
+    return _executor
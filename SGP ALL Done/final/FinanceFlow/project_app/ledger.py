@@ -0,0 +1,214 @@
+"""Group ledger: what every member of a group has paid and owes.
+
+Balances are kept in the GroupBalance table, one row per (group, member),
+so reading a group's balances is a single indexed lookup. The signal
+handlers in ``signals.py`` apply each expense and split as it is saved or
+deleted, through ``add``/``remove`` below; splits written in bulk, and
+the splits of a deleted expense, are applied at once with ``add_shares``.
+
+``rebuild`` recomputes the table from the expense history. A member's
+share of an expense comes from GroupExpenseSplit; expenses without split
+rows (created before splits were recorded) fall back to an equal share
+between their included members. The history is read with a single
+UNION ALL and summed in integer cents with NumPy.
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import (Case, Count, DecimalField, Exists, F, IntegerField, OuterRef, Subquery, Sum, Value,
+                              When)
+
+from .models import GroupBalance, GroupExpense, GroupExpenseSplit
+
+PAID, OWED = 1, -1
+CENTS = Decimal(100)
+
+IncludedMember = GroupExpense.included_members.through
+
+_state = threading.local()
+
+
+def _cents(amount):
+    """An amount as stored in a 2-decimal column."""
+    return Decimal(str(amount)).quantize(Decimal('0.01'))
+
+
+@contextmanager
+def suspended(group_id):
+    """Skip per-row maintenance for ``group_id``.
+
+    Used by delete_group: the group's balances are removed by the cascade,
+    so updating them once per deleted expense and split would be wasted work.
+    """
+    group_ids = getattr(_state, 'suspended', set())
+    _state.suspended = group_ids | {group_id}
+    try:
+        yield
+    finally:
+        _state.suspended = group_ids
+
+
+def is_suspended(group_id):
+    return group_id in getattr(_state, 'suspended', ())
+
+
+def _apply(group_id, member_id, paid, owed, create):
+    rows = GroupBalance.objects.filter(group_id=group_id, member_id=member_id)
+    if rows.update(paid_total=F('paid_total') + paid, owed_total=F('owed_total') + owed) or not create:
+        # A removal with no row to subtract from means the table is already
+        # out of sync; ``rebuild_group_balances`` will repair it.
+        return
+    try:
+        with transaction.atomic():
+            GroupBalance.objects.create(group_id=group_id, member_id=member_id, paid_total=paid, owed_total=owed)
+    except IntegrityError:
+        # A concurrent request created the row first
+        rows.update(paid_total=F('paid_total') + paid, owed_total=F('owed_total') + owed)
+
+
+def add(group_id, member_id, paid=0, owed=0):
+    """Add to what ``member_id`` has paid for / owes in ``group_id``."""
+    if group_id is None or member_id is None or is_suspended(group_id):
+        return
+    _apply(group_id, member_id, _cents(paid), _cents(owed), create=True)
+
+
+def remove(group_id, member_id, paid=0, owed=0):
+    """Undo an ``add``."""
+    if group_id is None or member_id is None or is_suspended(group_id):
+        return
+    _apply(group_id, member_id, -_cents(paid), -_cents(owed), create=False)
+
+
+def add_shares(group_id, shares):
+    """Add ``{member_id: amount}`` to what members owe in ``group_id``.
+
+    For splits written with bulk_create, which sends no signals, and (with
+    negative amounts) for the splits of a deleted expense: creates any
+    missing rows, then updates them all with one statement.
+    """
+    if not shares or is_suspended(group_id):
+        return
+    GroupBalance.objects.bulk_create(
+        [GroupBalance(group_id=group_id, member_id=member_id) for member_id in shares], ignore_conflicts=True
+    )
+    GroupBalance.objects.filter(group_id=group_id, member_id__in=shares).update(owed_total=F('owed_total') + Case(
+        *[When(member_id=member_id, then=Value(_cents(amount))) for member_id, amount in shares.items()],
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    ))
+
+
+# Rebuilding from history -----------------------------------------------------
+
+def _history_rows(group=None):
+    """``(group_id, member_id, sign, amount, parts)`` rows making up the balances."""
+    expenses = GroupExpense.objects.all()
+    splits = GroupExpenseSplit.objects.all()
+    included = IncludedMember.objects.all()
+    if group is not None:
+        expenses = expenses.filter(group=group)
+        splits = splits.filter(expense__group=group)
+        included = included.filter(groupexpense__group=group)
+
+    paid = (expenses.values('group_id', 'paid_by_id')
+            .annotate(sign=Value(PAID, output_field=IntegerField()),
+                      total=Sum('amount'),
+                      parts=Value(1, output_field=IntegerField()))
+            .values_list('group_id', 'paid_by_id', 'sign', 'total', 'parts'))
+
+    owed = (splits.values('expense__group_id', 'member_id')
+            .annotate(sign=Value(OWED, output_field=IntegerField()),
+                      total=Sum('amount'),
+                      parts=Value(1, output_field=IntegerField()))
+            .values_list('expense__group_id', 'member_id', 'sign', 'total', 'parts'))
+
+    # One row per included member of each expense that has no splits,
+    # divided by the expense's number of included members
+    included_count = (IncludedMember.objects.filter(groupexpense_id=OuterRef('groupexpense_id'))
+                      .values('groupexpense_id').annotate(n=Count('*')).values('n'))
+    unsplit = (included
+               .exclude(Exists(GroupExpenseSplit.objects.filter(expense_id=OuterRef('groupexpense_id'))))
+               .annotate(sign=Value(OWED, output_field=IntegerField()),
+                         parts=Subquery(included_count, output_field=IntegerField()))
+               .values_list('groupexpense__group_id', 'registration_id', 'sign', 'groupexpense__amount', 'parts'))
+
+    return paid.union(owed, unsplit, all=True)
+
+
+def history_totals(group=None):
+    """``(keys, paid, owed)`` from the expense history.
+
+    ``keys`` is an (n, 2) array of (group_id, member_id); ``paid`` and
+    ``owed`` are the matching totals in cents.
+    """
+    rows = list(_history_rows(group))
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return np.zeros((0, 2), dtype=np.int64), empty, empty
+
+    keys = np.array([(row[0], row[1]) for row in rows], dtype=np.int64)
+    signs = np.fromiter((row[2] for row in rows), dtype=np.int64, count=len(rows))
+    amounts = np.fromiter((int(row[3] * CENTS) for row in rows), dtype=np.int64, count=len(rows))
+    parts = np.fromiter((row[4] or 1 for row in rows), dtype=np.int64, count=len(rows))
+
+    # Equal shares are rounded half up to the cent
+    shares = (2 * amounts + parts) // (2 * parts)
+
+    keys, index = np.unique(keys, axis=0, return_inverse=True)
+    index = index.reshape(-1)
+    paid = np.zeros(len(keys), dtype=np.int64)
+    owed = np.zeros(len(keys), dtype=np.int64)
+    np.add.at(paid, index[signs == PAID], shares[signs == PAID])
+    np.add.at(owed, index[signs == OWED], shares[signs == OWED])
+    return keys, paid, owed
+
+
+def rebuild(group=None):
+    """Recompute GroupBalance from the expense history. Returns the number of rows written."""
+    with transaction.atomic():
+        existing = GroupBalance.objects.all()
+        if group is not None:
+            existing = existing.filter(group=group)
+        existing.delete()
+        keys, paid, owed = history_totals(group)
+        GroupBalance.objects.bulk_create([
+            GroupBalance(group_id=int(group_id), member_id=int(member_id),
+                         paid_total=Decimal(int(p)).scaleb(-2), owed_total=Decimal(int(o)).scaleb(-2))
+            for (group_id, member_id), p, o in zip(keys, paid, owed)
+        ], batch_size=1000)
+    return len(keys)
+
+
+# Reading balances ----------------------------------------------------------
+
+def balance_vector(group):
+    """``(member_ids, cents)`` arrays of net balances, sorted by member id.
+
+    Only members who paid or owe something appear. Positive cents means the
+    group owes the member.
+    """
+    rows = list(GroupBalance.objects.filter(group=group).order_by('member_id')
+                .values_list('member_id', 'paid_total', 'owed_total'))
+    ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    cents = np.fromiter((int((row[1] - row[2]) * CENTS) for row in rows), dtype=np.int64, count=len(rows))
+    return ids, cents
+
+
+def member_balances(group, members=None):
+    """``{member_id: Decimal}`` of every member's net balance.
+
+    Members in ``members`` (ids or Registration objects) that have no
+    expenses are included with a zero balance.
+    """
+    return balance_map(*balance_vector(group), members=members)
+
+
+def balance_map(ids, cents, members=None):
+    """``member_balances`` for an already computed balance vector."""
+    balances = {int(member_id): Decimal(int(c)).scaleb(-2) for member_id, c in zip(ids, cents)}
+    for member in members or ():
+        balances.setdefault(getattr(member, 'pk', member), Decimal('0.00'))
+    return balances
@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from project_app import settlement
+
+
+class Command(BaseCommand):
+    help = 'Time the settlement solver on a synthetic group and compare it with pairwise settling.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=500)
+        parser.add_argument('--expenses', type=int, default=100_000)
+        parser.add_argument('--max-split', type=int, default=8, help='Most members sharing one expense.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        members, expenses = options['members'], options['expenses']
+
+        # Random expenses: a payer, an amount and 1..max-split sharers each
+        payers = rng.integers(members, size=expenses)
+        sizes = rng.integers(1, min(options['max_split'], members) + 1, size=expenses)
+        shares = rng.integers(100, 50_000, size=expenses)
+        sharers = rng.integers(members, size=int(sizes.sum()))
+        expense_of = np.repeat(np.arange(expenses), sizes)
+
+        started = time.perf_counter()
+        cents = np.zeros(members, dtype=np.int64)
+        np.add.at(cents, payers, shares * sizes)
+        np.add.at(cents, sharers, -shares[expense_of])
+        netted = time.perf_counter()
+        transfers = settlement.settle(np.arange(members), cents, exact=False)
+        solved = time.perf_counter()
+
+        # What settling every pair separately would take
+        debts = np.zeros((members, members), dtype=np.int64)
+        np.add.at(debts, (sharers, payers[expense_of]), shares[expense_of])
+        np.fill_diagonal(debts, 0)
+        pairwise = int(np.count_nonzero(np.triu(debts - debts.T)))
+
+        small = cents[:settlement.EXACT_LIMIT].copy()
+        small[-1] -= small.sum()
+        exact_started = time.perf_counter()
+        exact = settlement.settle(np.arange(len(small)), small, exact=True)
+        exact_solved = time.perf_counter()
+        greedy = settlement.settle(np.arange(len(small)), small, exact=False)
+
+        self.stdout.write(f'{members} members, {expenses} expenses ({len(sharers)} shares)')
+        self.stdout.write(f'  netting:  {(netted - started) * 1000:.1f} ms')
+        self.stdout.write(f'  greedy:   {(solved - netted) * 1000:.1f} ms, {len(transfers)} transfers '
+                          f'(pairwise: {pairwise})')
+        self.stdout.write(f'  exact ({len(small)} members): {(exact_solved - exact_started) * 1000:.1f} ms, '
+                          f'{len(exact)} transfers (greedy: {len(greedy)})')
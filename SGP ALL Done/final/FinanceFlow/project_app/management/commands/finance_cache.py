@@ -0,0 +1,60 @@
+import os
+
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand, CommandError
+
+from project_app.caching import POLICIES, bump_data_version, data_version, timeout_for, version_timestamp
+from project_app.models import Registration
+
+
+class Command(BaseCommand):
+    help = 'Inspect or purge the FinanceFlow cache.'
+
+    def add_arguments(self, parser):
+        commands = parser.add_subparsers(dest='action', required=True)
+        commands.add_parser('info', help='Show the cache backend, its size and the timeout policies.')
+        user = commands.add_parser('user', help="Show a user's data version.")
+        user.add_argument('email')
+        purge = commands.add_parser('purge', help="Drop one user's cached values, or everything.")
+        target = purge.add_mutually_exclusive_group(required=True)
+        target.add_argument('--user', metavar='EMAIL', help="Make this user's cached values unreachable.")
+        target.add_argument('--all', action='store_true', help='Clear the whole cache.')
+
+    def _user(self, email):
+        user = Registration.objects.filter(email=email).first()
+        if user is None:
+            raise CommandError(f'No user with email {email}')
+        return user
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(**options)
+
+    def handle_info(self, **options):
+        backend = caches['default']
+        self.stdout.write(f'Backend:  {backend.__class__.__module__}.{backend.__class__.__name__}')
+        location = getattr(backend, '_dir', None) or getattr(backend, '_servers', None)
+        if location:
+            self.stdout.write(f'Location: {location}')
+        if hasattr(backend, '_list_cache_files'):
+            files = backend._list_cache_files()
+            size = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+            self.stdout.write(f'Entries:  {len(files)} ({size / 1024:.1f} KiB)')
+        elif hasattr(backend, '_cache') and isinstance(backend._cache, dict):
+            self.stdout.write(f'Entries:  {len(backend._cache)} (this process only)')
+        self.stdout.write('Timeouts:')
+        for name in POLICIES:
+            self.stdout.write(f'  {name}: {timeout_for(name)}s')
+
+    def handle_user(self, email, **options):
+        user = self._user(email)
+        version = data_version(user.pk)
+        self.stdout.write(f'{user.email}: data version {version} ({version_timestamp(version).isoformat()})')
+
+    def handle_purge(self, user=None, all=False, **options):
+        if all:
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('Cleared the cache.'))
+        else:
+            registration = self._user(user)
+            bump_data_version(registration.pk)
+            self.stdout.write(self.style.SUCCESS(f"Purged {registration.email}'s cached values."))
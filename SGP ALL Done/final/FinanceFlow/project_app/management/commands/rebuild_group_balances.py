@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project_app import ledger
+from project_app.models import Group
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the GroupBalance table from the group expense history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, help='Only rebuild the balances of the group with this id.')
+
+    def handle(self, *args, **options):
+        group = None
+        if options['group'] is not None:
+            group = Group.objects.filter(pk=options['group']).first()
+            if group is None:
+                raise CommandError(f"No group with id {options['group']}")
+        written = ledger.rebuild(group)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} group balance rows.'))
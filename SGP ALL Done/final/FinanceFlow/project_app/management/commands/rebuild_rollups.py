@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from project_app import rollups
+from project_app.models import Registration
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyRollup table from the raw Income and Expense rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only rebuild the rollups of this user.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['email']:
+            user = Registration.objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(f"No user with email {options['email']}")
+        written = rollups.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily rollup rows.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from project_app import search
+
+
+class Command(BaseCommand):
+    help = 'Re-index every income and expense for full-text search (SQLite FTS5).'
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} transactions.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from project_app import sitestats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the landing page counters (SiteStats) from the Registration, Income and Expense tables.'
+
+    def handle(self, *args, **options):
+        values = sitestats.reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f"{values['user_count']} users, {values['income_count'] + values['expense_count']} transactions, "
+            f"{values['income_total'] + values['expense_total']} managed."
+        ))
@@ -0,0 +1,46 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from project_app import jobs
+
+
+class Command(BaseCommand):
+    help = 'Render queued report jobs (PDFs) on a thread pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int,
+                            default=getattr(settings, 'FINANCEFLOW_REPORT_WORKERS', jobs.DEFAULT_WORKERS),
+                            help='Number of jobs rendered at the same time.')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between queue checks when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale jobs.')
+
+        done = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=options['threads'], thread_name_prefix='report-worker') as pool:
+            try:
+                while True:
+                    # Fill every free thread before waiting
+                    while len(running) < options['threads']:
+                        job_id = jobs.claim_next()
+                        if job_id is None:
+                            break
+                        running.add(pool.submit(jobs.run_job, job_id, claimed=True))
+
+                    if running:
+                        finished, running = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                        done += len(finished)
+                    elif options['once']:
+                        break
+                    else:
+                        time.sleep(options['poll'])
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping; waiting for running jobs.')
+        self.stdout.write(self.style.SUCCESS(f'Rendered {done} report jobs.'))
@@ -0,0 +1,93 @@
+"""Adding people to a group by email, in bulk.
+
+``invite`` takes any number of addresses (typed one per field, or pasted
+as a list or CSV export), resolves them with one query on the unique email
+index (emails are stored lowercased, see ``normalize_email``) and adds the
+new members with one ``bulk_create``. It returns one result per address,
+so the page can say who was added and who wasn't.
+"""
+import csv
+import re
+from collections import namedtuple
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from .models import GroupMember, Registration, normalize_email
+
+ADDED = 'added'
+ALREADY_MEMBER = 'already_member'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+DUPLICATE = 'duplicate'
+
+STATUS_MESSAGES = {
+    ADDED: 'Added to the group',
+    ALREADY_MEMBER: 'Already in the group',
+    NOT_FOUND: 'No FinanceFlow account with this email',
+    INVALID: 'Not a valid email address',
+    DUPLICATE: 'Listed more than once',
+}
+
+InviteResult = namedtuple('InviteResult', ['email', 'status', 'member'])
+
+_SEPARATORS = re.compile(r'[\s;]+')
+
+
+def parse_emails(text):
+    """Email addresses in pasted text: one per line, comma/semicolon separated or a CSV export.
+
+    In CSV input only cells that look like addresses are kept, so header
+    rows and name columns are skipped.
+    """
+    emails = []
+    for row in csv.reader(StringIO(text or '')):
+        for cell in row:
+            for token in _SEPARATORS.split(cell.strip().strip('<>"\'')):
+                token = token.strip('<>"\',')
+                if '@' in token:
+                    emails.append(token)
+    return emails
+
+
+def invite(group, emails):
+    """Add the registered users among ``emails`` to ``group``.
+
+    Returns an InviteResult per address, in input order.
+    """
+    results, wanted = [], set()
+    for raw in emails:
+        raw = raw.strip()
+        email = normalize_email(raw)
+        if not email:
+            continue
+        if email in wanted:
+            results.append(InviteResult(raw, DUPLICATE, None))
+            continue
+        wanted.add(email)
+        try:
+            validate_email(email)
+        except ValidationError:
+            results.append(InviteResult(raw, INVALID, None))
+            continue
+        results.append(InviteResult(raw, None, None))
+
+    valid = [normalize_email(raw) for raw, status, _member in results if status is None]
+    found = {member.email: member for member in Registration.objects.filter(email__in=valid)}
+
+    current = set(GroupMember.objects.filter(group=group, member__in=found.values()).values_list('member_id', flat=True))
+    new_members = [member for member in found.values() if member.pk not in current]
+    # ignore_conflicts covers someone being added by another request meanwhile
+    GroupMember.objects.bulk_create([GroupMember(group=group, member=member) for member in new_members],
+                                    ignore_conflicts=True, batch_size=500)
+
+    report = []
+    for email, status, _member in results:
+        if status is None:
+            member = found.get(normalize_email(email))
+            status = NOT_FOUND if member is None else ALREADY_MEMBER if member.pk in current else ADDED
+            report.append(InviteResult(email, status, member))
+        else:
+            report.append(InviteResult(email, status, None))
+    return report
@@ -0,0 +1,177 @@
+"""Period metrics engine used by the dashboard and notifications.
+
+All the windows the dashboard shows (today, this week, last week, this month,
+last month and all-time) are computed with conditional aggregation over the
+DailyRollup table, so one query serves every window instead of one per window.
+"""
+import calendar
+from dataclasses import dataclass
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import DailyRollup
+from .rollups import EXPENSE, INCOME, as_day, rollups_for
+
+
+@dataclass(frozen=True)
+class PeriodWindows:
+    """Half-open [start, end) datetime windows relative to ``now``."""
+    now: object
+    today_start: object
+    today_end: object
+    week_start: object
+    week_end: object
+    prev_week_start: object
+    month_start: object
+    month_end: object
+    prev_month_start: object
+
+    @classmethod
+    def for_date(cls, now):
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today_start - timedelta(days=now.weekday())
+        month_start = today_start.replace(day=1)
+        if month_start.month == 12:
+            month_end = month_start.replace(year=month_start.year + 1, month=1)
+        else:
+            month_end = month_start.replace(month=month_start.month + 1)
+        return cls(
+            now=now,
+            today_start=today_start,
+            today_end=today_start + timedelta(days=1),
+            week_start=week_start,
+            week_end=week_start + timedelta(days=7),
+            prev_week_start=week_start - timedelta(days=7),
+            month_start=month_start,
+            month_end=month_end,
+            prev_month_start=(month_start - timedelta(days=1)).replace(day=1),
+        )
+
+
+@dataclass(frozen=True)
+class KindMetrics:
+    """Totals and counts of one transaction kind (income or expense)."""
+    all_time: Decimal = Decimal('0')
+    today: Decimal = Decimal('0')
+    week: Decimal = Decimal('0')
+    prev_week: Decimal = Decimal('0')
+    month: Decimal = Decimal('0')
+    prev_month: Decimal = Decimal('0')
+    today_count: int = 0
+    week_count: int = 0
+    month_count: int = 0
+
+
+@dataclass(frozen=True)
+class PeriodMetrics:
+    windows: PeriodWindows
+    income: KindMetrics
+    expense: KindMetrics
+
+    @property
+    def net_balance(self):
+        return self.income.all_time - self.expense.all_time
+
+
+def _window(start, end):
+    return Q(day__gte=as_day(start), day__lt=as_day(end))
+
+
+def compute_period_metrics(user, now=None):
+    """Return the PeriodMetrics of ``user`` in a single rollup query.
+
+    Every window is day-aligned, so the totals and counts come from the
+    DailyRollup table with one conditional aggregate per kind and window.
+    """
+    w = PeriodWindows.for_date(now or timezone.localtime())
+    windows = {
+        'all_time': Q(),
+        'today': _window(w.today_start, w.today_end),
+        'week': _window(w.week_start, w.week_end),
+        'prev_week': _window(w.prev_week_start, w.week_start),
+        'month': _window(w.month_start, w.month_end),
+        'prev_month': _window(w.prev_month_start, w.month_start),
+    }
+    counted = ('today', 'week', 'month')
+
+    aggregates = {}
+    for kind in (INCOME, EXPENSE):
+        for name, condition in windows.items():
+            aggregates[f'{kind}__{name}'] = Sum('total', filter=Q(kind=kind) & condition)
+        for name in counted:
+            aggregates[f'{kind}__{name}_count'] = Sum('count', filter=Q(kind=kind) & windows[name])
+    row = DailyRollup.objects.filter(user=user).aggregate(**aggregates)
+
+    def _kind(kind):
+        prefix = f'{kind}__'
+        return KindMetrics(**{
+            key[len(prefix):]: value or 0 for key, value in row.items() if key.startswith(prefix)
+        })
+
+    return PeriodMetrics(windows=w, income=_kind(INCOME), expense=_kind(EXPENSE))
+
+
+def category_spike(user, windows):
+    """Find the expense category that grew most this month vs last month.
+
+    Both months are grouped in one query. Returns ``{'category', 'change'}``
+    or None.
+    """
+    rows = rollups_for(user, EXPENSE, windows.prev_month_start, windows.month_end).values('category').annotate(
+        cur=Sum('total', filter=_window(windows.month_start, windows.month_end)),
+        prev=Sum('total', filter=_window(windows.prev_month_start, windows.month_start)),
+    )
+
+    spike = None
+    for row in rows:
+        cat = row['category'] or 'Other'
+        cur = row['cur'] or 0
+        prev = row['prev'] or 0
+        if prev > 0:
+            change = ((cur - prev) / prev) * 100
+            if change >= 10 and (not spike or change > spike['change']):
+                spike = {'category': cat, 'change': change}
+        elif cur > 0 and not spike:
+            # Newly appearing category with spend
+            spike = {'category': cat, 'change': 100}
+    return spike
+
+
+EXPENSE_BUDGET = 2500  # monthly expense budget shared by dashboard and notifications
+
+
+def build_insights(metrics, spike):
+    """Turn period metrics into the insight cards shown in notifications."""
+    insights = []
+    w = metrics.windows
+    weekly_expense = metrics.expense.week
+    prev_week_expense = metrics.expense.prev_week
+
+    # 1) Week-over-week spending change
+    if prev_week_expense and prev_week_expense > 0:
+        wo_w_change_pct = ((weekly_expense - prev_week_expense) / prev_week_expense) * 100
+        if wo_w_change_pct > 5:
+            insights.append({'level': 'info', 'icon': 'bi-lightbulb', 'title': f"This week you spent {wo_w_change_pct:.0f}% more than last week", 'subtitle': 'Consider reviewing your expenses'})
+        elif wo_w_change_pct < -5:
+            insights.append({'level': 'success', 'icon': 'bi-graph-up-arrow', 'title': f"Great! You spent {-wo_w_change_pct:.0f}% less than last week", 'subtitle': 'Nice savings trend'})
+    elif weekly_expense > 0:
+        insights.append({'level': 'info', 'icon': 'bi-lightbulb', 'title': 'Spending started this week', 'subtitle': 'No spend was recorded last week for comparison'})
+
+    # 2) Budget pacing vs month progress
+    expense_progress_percentage = min(int((metrics.expense.month / EXPENSE_BUDGET) * 100), 100)
+    days_in_month = calendar.monthrange(w.now.year, w.now.month)[1]
+    expected_expense_pct = (w.now.day / days_in_month) * 100
+    if expense_progress_percentage <= expected_expense_pct + 5:
+        insights.append({'level': 'success', 'icon': 'bi-check-circle', 'title': "You're on track with your budget goals!", 'subtitle': 'Keep up the good work'})
+    else:
+        over_pct = max(0, expense_progress_percentage - expected_expense_pct)
+        insights.append({'level': 'warning', 'icon': 'bi-exclamation-triangle', 'title': f'Your spending pace is {over_pct:.0f}% ahead of budget', 'subtitle': 'Reduce discretionary expenses to stay on target'})
+
+    # 3) Category spike this month vs previous month
+    if spike:
+        insights.append({'level': 'warning', 'icon': 'bi-exclamation-triangle', 'title': f"{spike['category']} expenses increased by {spike['change']:.0f}%", 'subtitle': 'Review recent purchases in this category'})
+
+    return insights
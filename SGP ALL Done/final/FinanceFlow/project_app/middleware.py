@@ -0,0 +1,159 @@
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Registration
+
+logger = logging.getLogger('financeflow.requests')
+
+# Requests slower than this (milliseconds) are logged with their SQL
+DEFAULT_SLOW_REQUEST_MS = 500
+# At most this many statements are kept per request for the slow log
+MAX_CAPTURED_QUERIES = 200
+
+# Session key caching the logged-in Registration's primary key
+SESSION_USER_ID = 'finance_user_id'
+
+
+def get_finance_user(request):
+    """Return the Registration of the logged-in user, or None.
+
+    The login session stores ``entry_email``; the matching primary key is
+    cached next to it so later requests resolve the user by primary key.
+    """
+    session = request.session
+    email = session.get('entry_email')
+    if not email:
+        return None
+
+    user_id = session.get(SESSION_USER_ID)
+    if user_id is not None:
+        user = Registration.objects.filter(pk=user_id, email=email).first()
+        if user:
+            return user
+
+    user = Registration.objects.filter(email=email).first()
+    if user:
+        session[SESSION_USER_ID] = user.pk
+    else:
+        # The account is gone (deleted elsewhere): log the session out
+        for key in ('entry_email', SESSION_USER_ID):
+            session.pop(key, None)
+    return user
+
+
+def clear_finance_user(request):
+    """Forget the logged-in user (logout / account deletion)."""
+    for key in ('entry_email', SESSION_USER_ID):
+        request.session.pop(key, None)
+    request.finance_user = None
+
+
+class FinanceUserMiddleware:
+    """Resolve the current user once per request as ``request.finance_user``."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.finance_user = get_finance_user(request)
+        return self.get_response(request)
+
+
+class _QueryRecorder:
+    """``connection.execute_wrapper`` that times queries and counts fetched rows."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.rows = 0
+        self.queries = []
+
+    def _count_rows(self, cursor):
+        # Instance attributes take precedence over CursorWrapper.__getattr__
+        fetchone, fetchmany, fetchall = cursor.fetchone, cursor.fetchmany, cursor.fetchall
+
+        def counted_fetchone():
+            row = fetchone()
+            self.rows += row is not None
+            return row
+
+        def counted_fetchmany(*args, **kwargs):
+            rows = fetchmany(*args, **kwargs)
+            self.rows += len(rows)
+            return rows
+
+        def counted_fetchall():
+            rows = fetchall()
+            self.rows += len(rows)
+            return rows
+
+        cursor.fetchone, cursor.fetchmany, cursor.fetchall = counted_fetchone, counted_fetchmany, counted_fetchall
+        cursor._rows_counted = True
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if len(self.queries) < MAX_CAPTURED_QUERIES:
+                self.queries.append((elapsed, sql))
+            cursor = context['cursor']
+            if not getattr(cursor, '_rows_counted', False):
+                self._count_rows(cursor)
+
+
+class RequestTimingMiddleware:
+    """Measure each request's time, query count, DB time and rows fetched.
+
+    The numbers are sent back in a ``Server-Timing`` header (visible in the
+    browser's network panel) and logged as one JSON line on the
+    ``financeflow.requests`` logger. Requests slower than
+    FINANCEFLOW_SLOW_REQUEST_MS are logged as warnings with their SQL.
+    Disable with FINANCEFLOW_REQUEST_TIMING = False.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'FINANCEFLOW_REQUEST_TIMING', True):
+            return self.get_response(request)
+
+        recorder = _QueryRecorder()
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(recorder):
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match else None
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total_ms:.1f}',
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries, {recorder.rows} rows"',
+            f'app;dur={max(total_ms - db_ms, 0):.1f}',
+        ])
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(db_ms, 1),
+            'queries': recorder.count,
+            'rows': recorder.rows,
+        }
+        if total_ms >= getattr(settings, 'FINANCEFLOW_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS):
+            record['sql'] = [{'ms': round(elapsed * 1000, 2), 'sql': sql} for elapsed, sql in recorder.queries]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
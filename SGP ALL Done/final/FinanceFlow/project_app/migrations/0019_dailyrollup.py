@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    DailyRollup = apps.get_model('project_app', 'DailyRollup')
+    for kind, model_name in (('income', 'Income'), ('expense', 'Expense')):
+        model = apps.get_model('project_app', model_name)
+        grouped = model.objects.filter(user__isnull=False).annotate(
+            day=TruncDate('created_at')
+        ).values('user_id', 'day', 'category').annotate(total=Sum('amount'), count=Count('id')).order_by()
+        DailyRollup.objects.bulk_create([
+            DailyRollup(user_id=row['user_id'], day=row['day'], kind=kind,
+                        category=row['category'] or '', total=row['total'], count=row['count'])
+            for row in grouped
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0018_alter_registration_password'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='project_app.registration')),
+            ],
+            options={
+                'unique_together': {('user', 'day', 'kind', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0020_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='registration',
+            name='email',
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Full-text search index for transaction descriptions and categories:
+# an FTS5 table kept in sync by triggers on SQLite, GIN indexes on
+# PostgreSQL. The SQL is frozen here as it was when the index was added;
+# project_app/search.py keeps it installed and may evolve independently.
+
+from django.db import migrations
+
+FTS_TABLE = 'project_app_transaction_fts'
+TABLES = (('project_app_income', 0), ('project_app_expense', 1))
+SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(category, ''))"
+
+
+def _sqlite_install(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "owner, description, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    for table, bit in TABLES:
+        insert = (
+            f"INSERT INTO {FTS_TABLE}(rowid, owner, description, category) "
+            f"SELECT NEW.id * 2 + {bit}, 'u' || NEW.user_id, NEW.description, NEW.category "
+            "WHERE NEW.user_id IS NOT NULL;"
+        )
+        delete = f"DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id * 2 + {bit};"
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} "
+                       f"BEGIN {insert} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} "
+                       f"BEGIN {delete} END")
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update "
+                       f"AFTER UPDATE OF user_id, description, category ON {table} "
+                       f"BEGIN {delete} {insert} END")
+    # Index the rows that existed before the triggers
+    cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    for table, bit in TABLES:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, owner, description, category) "
+            f"SELECT id * 2 + {bit}, 'u' || user_id, description, category FROM {table} WHERE user_id IS NOT NULL"
+        )
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            _sqlite_install(cursor)
+        elif vendor == 'postgresql':
+            for table, _ in TABLES:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING GIN ({SEARCH_DOCUMENT})")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            for table, _ in TABLES:
+                for op in ('insert', 'delete', 'update'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{op}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif vendor == 'postgresql':
+            for table, _ in TABLES:
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0021_registration_email_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:33
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_group_balances(apps, schema_editor):
+    # Historical models only, so this keeps working when the live models
+    # change. Same rules as ledger.rebuild: a member owes their split rows,
+    # or an equal share (rounded half up to the cent) of expenses without any.
+    GroupExpense = apps.get_model('project_app', 'GroupExpense')
+    GroupExpenseSplit = apps.get_model('project_app', 'GroupExpenseSplit')
+    GroupBalance = apps.get_model('project_app', 'GroupBalance')
+    IncludedMember = GroupExpense.included_members.through
+
+    totals = defaultdict(lambda: [0, 0])  # (group_id, member_id) -> [paid cents, owed cents]
+    expenses = {}
+    for pk, group_id, paid_by_id, amount in GroupExpense.objects.values_list(
+            'pk', 'group_id', 'paid_by_id', 'amount').iterator():
+        cents = int(amount * 100)
+        expenses[pk] = (group_id, cents)
+        totals[group_id, paid_by_id][0] += cents
+
+    split_expenses = set()
+    for expense_id, member_id, amount in GroupExpenseSplit.objects.values_list(
+            'expense_id', 'member_id', 'amount').iterator():
+        split_expenses.add(expense_id)
+        totals[expenses[expense_id][0], member_id][1] += int(amount * 100)
+
+    included = defaultdict(list)
+    for expense_id, member_id in IncludedMember.objects.values_list('groupexpense_id', 'registration_id').iterator():
+        if expense_id not in split_expenses:
+            included[expense_id].append(member_id)
+    for expense_id, member_ids in included.items():
+        group_id, cents = expenses[expense_id]
+        share = (2 * cents + len(member_ids)) // (2 * len(member_ids))
+        for member_id in member_ids:
+            totals[group_id, member_id][1] += share
+
+    GroupBalance.objects.bulk_create([
+        GroupBalance(group_id=group_id, member_id=member_id,
+                     paid_total=Decimal(paid).scaleb(-2), owed_total=Decimal(owed).scaleb(-2))
+        for (group_id, member_id), (paid, owed) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0023_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('owed_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='project_app.group')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_balances', to='project_app.registration')),
+            ],
+            options={
+                'unique_together': {('group', 'member')},
+            },
+        ),
+        migrations.RunPython(populate_group_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:40
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+def populate_site_stats(apps, schema_editor):
+    # Historical models only; same values as sitestats.reconcile()
+    Registration = apps.get_model('project_app', 'Registration')
+    Income = apps.get_model('project_app', 'Income')
+    Expense = apps.get_model('project_app', 'Expense')
+    SiteStats = apps.get_model('project_app', 'SiteStats')
+
+    incomes = Income.objects.aggregate(count=Count('id'), total=Sum('amount'))
+    expenses = Expense.objects.aggregate(count=Count('id'), total=Sum('amount'))
+    SiteStats.objects.update_or_create(pk=1, defaults={
+        'user_count': Registration.objects.count(),
+        'income_count': incomes['count'],
+        'income_total': incomes['total'] or 0,
+        'expense_count': expenses['count'],
+        'expense_total': expenses['total'] or 0,
+        'reconciled_at': timezone.now(),
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0024_groupbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_count', models.IntegerField(default=0)),
+                ('income_count', models.IntegerField(default=0)),
+                ('income_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('expense_count', models.IntegerField(default=0)),
+                ('expense_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_site_stats, migrations.RunPython.noop),
+    ]
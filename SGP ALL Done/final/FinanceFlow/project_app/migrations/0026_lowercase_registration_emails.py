@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:40
+
+from django.db import migrations
+
+
+def lowercase_emails(apps, schema_editor):
+    # Registration.save() lowercases new emails; bring the existing rows in line.
+    # An address whose lowercase spelling already belongs to another account
+    # is left as it is rather than breaking the unique index.
+    Registration = apps.get_model('project_app', 'Registration')
+    taken = set(Registration.objects.values_list('email', flat=True))
+    for pk, email in Registration.objects.values_list('pk', 'email').order_by('pk'):
+        lowered = email.strip().lower()
+        if lowered == email or lowered in taken:
+            continue
+        Registration.objects.filter(pk=pk).update(email=lowered)
+        taken.discard(email)
+        taken.add(lowered)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project_app', '0025_sitestats'),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+    ]
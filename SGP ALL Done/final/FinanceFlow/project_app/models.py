@@ -3,14 +3,23 @@ from datetime import datetime
 from decimal import Decimal
 
 # Create your models here.
+def normalize_email(email):
+    """Emails are stored and looked up lowercased, so the unique index finds any spelling."""
+    return (email or '').strip().lower()
+
+
 # Registration model
 class Registration(models.Model):
     name=models.CharField(max_length=50)
-    email=models.EmailField()
+    email=models.EmailField(unique=True)
     phone_no=models.CharField(max_length=10)
     password=models.CharField(max_length=128)
     address=models.TextField()
 
+    def save(self, *args, **kwargs):
+        self.email = normalize_email(self.email)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.email
 
@@ -25,6 +34,13 @@ class Expense(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # created_by = models.ForeignKey(Registration, on_delete=models.CASCADE, related_name='created_expenses', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='expense_user_created_idx'),
+            models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+            models.Index(fields=['user', 'category', 'created_at'], name='expense_user_cat_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.amount} {self.currency} - {self.category}"
 
@@ -43,6 +59,13 @@ class Income(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     # created_by = models.ForeignKey(Registration, on_delete=models.CASCADE, related_name='created_incomes', null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='income_user_created_idx'),
+            models.Index(fields=['user', 'date'], name='income_user_date_idx'),
+            models.Index(fields=['user', 'category', 'created_at'], name='income_user_cat_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.amount} {self.currency} - {self.category}"
     
@@ -51,6 +74,49 @@ class Income(models.Model):
         return self.user.name if self.user else "Unknown"
 
 
+class SiteStats(models.Model):
+    """Site-wide counters shown on the landing page (a single row).
+
+    Kept up to date by the signal handlers in ``signals.py`` and reconciled
+    with ``python manage.py reconcile_site_stats``; see ``sitestats.py``.
+    """
+    user_count = models.IntegerField(default=0)
+    income_count = models.IntegerField(default=0)
+    income_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    expense_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_count} users, {self.income_count + self.expense_count} transactions"
+
+
+class DailyRollup(models.Model):
+    """Per-user daily totals of incomes/expenses by category.
+
+    Kept up to date by the signal handlers in ``signals.py`` so analytics can
+    aggregate days instead of raw transactions. Rebuild with
+    ``python manage.py rebuild_rollups``.
+    """
+    KIND_CHOICES = [
+        ('income', 'Income'),
+        ('expense', 'Expense'),
+    ]
+
+    user = models.ForeignKey(Registration, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    category = models.CharField(max_length=50)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'day', 'kind', 'category')
+
+    def __str__(self):
+        return f"{self.user_id} {self.day} {self.kind} {self.category}: {self.total}"
+
+
 # Group Split Money Models
 class Group(models.Model):
     GROUP_TYPE_CHOICES = [
@@ -74,29 +140,10 @@ class Group(models.Model):
 
     def get_member_balance(self, member):
         """Calculate the balance for a specific member in this group"""
-        # Get all expenses where this member was involved
-        member_expenses = GroupExpense.objects.filter(
-            group=self,
-            included_members=member
-        )
-        
-        # Calculate total amount this member owes (their share of expenses)
-        total_owed = sum(
-            expense.amount / expense.included_members.count()
-            for expense in member_expenses
-        )
-        
-        # Get all expenses paid by this member
-        paid_expenses = GroupExpense.objects.filter(
-            group=self,
-            paid_by=member
-        )
-        
-        # Calculate total amount this member paid
-        total_paid = sum(expense.amount for expense in paid_expenses)
-        
-        # Balance = amount paid - amount owed
-        return total_paid - total_owed
+        # Balances are computed for the whole group at once; use
+        # ledger.member_balances() directly when several are needed
+        from .ledger import member_balances
+        return member_balances(self, [member])[member.pk]
 
 
 class GroupMember(models.Model):
@@ -136,6 +183,71 @@ class GroupExpenseSplit(models.Model):
         return f"{self.member.name} owes {self.amount} for {self.expense.description}"
 
 
+class GroupBalance(models.Model):
+    """What a member has paid for and owes in a group, in total.
+
+    Kept up to date by the signal handlers in ``signals.py`` (and by
+    ``ledger.add_shares`` for splits written in bulk) so balance pages read
+    one row per member instead of the group's whole expense history.
+    Rebuild with ``python manage.py rebuild_group_balances``.
+    """
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='balances')
+    member = models.ForeignKey(Registration, on_delete=models.CASCADE, related_name='group_balances')
+    paid_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    owed_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('group', 'member')
+
+    @property
+    def balance(self):
+        return self.paid_total - self.owed_total
+
+    def __str__(self):
+        return f"{self.member_id} in {self.group_id}: {self.balance}"
+
+
 
  
-    
\ No newline at end of file
+    
+
+def report_job_upload_to(instance, filename):
+    return f'reports/{instance.user_id}/{filename}'
+
+
+class ReportJob(models.Model):
+    """A report rendered in the background (see ``jobs.py``).
+
+    Jobs are picked up by ``python manage.py run_report_worker`` or by the
+    web process's own worker threads; the rendered file is stored under
+    MEDIA_ROOT and served by the download view.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(Registration, on_delete=models.CASCADE, related_name='report_jobs')
+    kind = models.CharField(max_length=20)
+    params = models.JSONField(default=dict)
+    filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = models.FileField(upload_to=report_job_upload_to, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
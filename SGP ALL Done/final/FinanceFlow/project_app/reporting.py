@@ -0,0 +1,242 @@
+"""Report rows shared by the report views and the background report jobs."""
+import csv
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Cast, Length, TruncMonth
+from django.utils import timezone
+from django.utils.text import slugify
+
+from . import exports, filters
+from .caching import timeout_for, versioned_key
+from .models import Expense, Income
+
+REPORT_HEADER = ['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date']
+CUSTOM_REPORT_HEADER = ['Type', 'Amount', 'Category', 'Description', 'Date']
+# Form fields of the custom report generator
+CUSTOM_REPORT_FIELDS = ('start_date', 'end_date', 'category', 'type', 'amount_range', 'sort_by', 'group_by')
+# Sort choices of the custom report form, as union column orderings
+CUSTOM_REPORT_SORTS = {
+    'date_desc': ('-created_at',),
+    'date_asc': ('created_at',),
+    'amount_desc': ('-amount', '-created_at'),
+    'amount_asc': ('amount', '-created_at'),
+    'category': ('category', '-created_at'),
+}
+# Group-by choices of the custom report form and the column they group on
+CUSTOM_REPORT_GROUPS = {'Category': 'category', 'Date': 'month', 'Type': 'type'}
+
+DATE_RANGE_DAYS = {
+    'Last 7 days': 7,
+    'Last 30 days': 30,
+    'Last 3 months': 90,
+    'Last 6 months': 180,
+    'Last year': 365,
+}
+
+
+def report_start(date_range, end_date):
+    # Unknown ranges default to the last 7 days
+    return end_date - timedelta(days=DATE_RANGE_DAYS.get(date_range, 7))
+
+
+def report_preamble(report_type, date_range, generated_on):
+    """Heading rows written before the header of a CSV report."""
+    return [
+        ['Report Type', report_type],
+        ['Date Range', date_range],
+        ['Generated On', generated_on.strftime('%Y-%m-%d %H:%M')],
+        [],
+    ]
+
+
+def report_rows(user, report_type, start_date, end_date):
+    """Yield the rows of an Income/Expense/Balance report, newest first per type."""
+    incomes = Income.objects.filter(user=user, created_at__range=[start_date, end_date]).order_by('-created_at')
+    expenses = Expense.objects.filter(user=user, created_at__range=[start_date, end_date]).order_by('-created_at')
+    if report_type == 'Income Report':
+        sources = [('Income', incomes)]
+    elif report_type == 'Expense Report':
+        sources = [('Expense', expenses)]
+    else:  # Balance Report
+        sources = [('Income', incomes), ('Expense', expenses)]
+
+    for label, queryset in sources:
+        for amount, category, description, currency, created_at in exports.iter_rows(
+            queryset, 'amount', 'category', 'description', 'currency', 'created_at'
+        ):
+            yield [label, float(amount), category, description, currency, created_at.strftime('%Y-%m-%d %H:%M')]
+
+
+class Subtotal(namedtuple('Subtotal', ['group', 'count', 'income', 'expense'])):
+    """Totals of one group of a grouped custom report."""
+
+    @property
+    def net(self):
+        return self.income - self.expense
+
+
+def custom_report_transactions(user, params):
+    """Transactions matching the custom report form ``params`` (a dict of its fields).
+
+    Returns one lazy UNION ALL query: the filters, the grouping column and
+    the sort order are all applied by the database.
+    """
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    category = params.get('category', 'All')
+    transaction_type = params.get('type', 'All')
+    group = CUSTOM_REPORT_GROUPS.get(params.get('group_by'))
+
+    condition = Q(user=user) & filters.AMOUNT_RANGES.get(params.get('amount_range', 'All'), Q())
+    if start_date:
+        condition &= Q(created_at__gte=start_date)
+    if end_date:
+        condition &= Q(created_at__lte=end_date)
+    if category != 'All':
+        condition &= Q(category=category)
+
+    fields = ['amount', 'category', 'description', 'created_at', 'type']
+    parts = []
+    for label, model in (('Income', Income), ('Expense', Expense)):
+        queryset = model.objects.filter(condition).annotate(type=Value(label, output_field=CharField()))
+        if group == 'month':
+            queryset = queryset.annotate(month=TruncMonth('created_at'))
+        if transaction_type not in ('All', label):
+            queryset = queryset.none()
+        parts.append(queryset.values(*fields, *([group] if group == 'month' else [])))
+
+    ordering = CUSTOM_REPORT_SORTS.get(params.get('sort_by', 'date_desc'), ())
+    return parts[0].union(parts[1], all=True).order_by(*([group] if group else []), *ordering)
+
+
+def _group_label(group, value):
+    return value.strftime('%B %Y') if group == 'month' else value
+
+
+def custom_report_items(user, params):
+    """Stream the custom report's transactions, each group followed by its Subtotal.
+
+    Without a ``group_by`` only the transaction dicts are yielded.
+    """
+    group = CUSTOM_REPORT_GROUPS.get(params.get('group_by'))
+    transactions = custom_report_transactions(user, params).iterator(chunk_size=exports.CHUNK_SIZE)
+    if group is None:
+        yield from transactions
+        return
+
+    zero = Decimal('0.00')
+    current, count, totals = None, 0, {'Income': zero, 'Expense': zero}
+    for transaction in transactions:
+        # The month column only exists for grouping
+        key = transaction.pop('month') if group == 'month' else transaction[group]
+        if count and key != current:
+            yield Subtotal(_group_label(group, current), count, totals['Income'], totals['Expense'])
+            count, totals = 0, {'Income': zero, 'Expense': zero}
+        current = key
+        count += 1
+        totals[transaction['type']] += transaction['amount']
+        yield transaction
+    if count:
+        yield Subtotal(_group_label(group, current), count, totals['Income'], totals['Expense'])
+
+
+def _subtotal_description(subtotal):
+    noun = 'transaction' if subtotal.count == 1 else 'transactions'
+    return f'{subtotal.count} {noun} (income {subtotal.income}, expense {subtotal.expense})'
+
+
+def custom_report_rows(items):
+    """Rows under CUSTOM_REPORT_HEADER for ``custom_report_items``."""
+    for t in items:
+        if isinstance(t, Subtotal):
+            yield ['Subtotal', float(t.net), t.group, _subtotal_description(t), '']
+        else:
+            yield [t['type'], float(t['amount']), t['category'], t['description'], t['created_at'].strftime('%Y-%m-%d %H:%M')]
+
+
+def custom_report_csv_rows(items):
+    """Rows of the plain CSV export (Date, Type, Category, Description, Amount)."""
+    yield ['Date', 'Type', 'Category', 'Description', 'Amount']
+    for t in items:
+        if isinstance(t, Subtotal):
+            yield ['', 'Subtotal', t.group, _subtotal_description(t), f'₹{t.net}']
+        else:
+            yield [t['created_at'].strftime('%Y-%m-%d %H:%M'), t['type'], t['category'], t['description'], f"₹{t['amount']}"]
+
+
+def custom_report_json_items(items):
+    """JSON-serializable objects for ``custom_report_items``."""
+    for t in items:
+        if isinstance(t, Subtotal):
+            yield {'subtotal': t.group, 'count': t.count, 'income': str(t.income),
+                   'expense': str(t.expense), 'net': str(t.net)}
+        else:
+            yield dict(t, created_at=t['created_at'].strftime('%Y-%m-%d %H:%M:%S'), amount=str(t['amount']))
+
+
+# Report sizes.
+#
+# The Reports page shows the size of each report's CSV. The sizes are
+# estimated from per-category aggregates of one UNION ALL query instead of
+# writing the files. When a report is downloaded, its real size is cached
+# (under the user's data version, so any change invalidates it) and shown
+# instead.
+
+# Bytes of a CSV row besides its text columns: 5 commas, "\r\n" and a
+# "YYYY-MM-DD HH:MM" date
+_ROW_OVERHEAD = 5 + 2 + 16
+
+
+def _csv_bytes(rows):
+    writer = csv.writer(exports.Echo())
+    return sum(len(writer.writerow(row).encode('utf-8')) for row in rows)
+
+
+def _size_stats(model, label, user, start_date, end_date):
+    needs_quotes = Q(description__contains=',') | Q(description__contains='"') | Q(description__contains='\n')
+    return model.objects.filter(user=user, created_at__range=[start_date, end_date]).values('category').annotate(
+        kind=Value(label, output_field=CharField()),
+        rows=Count('id'),
+        total=Sum('amount'),
+        # Characters, not bytes: the estimate treats text as single-byte
+        text=Sum(Length('description') + Length('category') + Length('currency')
+                 + Length(Cast('amount', CharField()))),
+        quotes=Sum(Case(When(needs_quotes, then=Value(2)), default=Value(0), output_field=IntegerField())),
+    ).order_by()
+
+
+def size_statistics(user, start_date, end_date):
+    """Per (kind, category) row counts, totals and text lengths in one query."""
+    return list(_size_stats(Income, 'Income', user, start_date, end_date).union(
+        _size_stats(Expense, 'Expense', user, start_date, end_date), all=True
+    ))
+
+
+def estimate_csv_size(stats, kinds, category=None, preamble=()):
+    """Estimated bytes of a CSV report over the rows of ``stats`` matching ``kinds``/``category``."""
+    size = _csv_bytes(list(preamble) + [REPORT_HEADER])
+    for row in stats:
+        if row['kind'] in kinds and (category is None or row['category'] == category):
+            size += (row['text'] or 0) + (row['quotes'] or 0) + row['rows'] * (len(row['kind']) + _ROW_OVERHEAD)
+    return size
+
+
+def _size_key(user_id, report_type, date_range, format_type):
+    # Date ranges are relative to today, so the date is part of the key
+    today = timezone.localdate().isoformat()
+    # Slugs keep the key free of spaces, which memcached rejects
+    parts = ':'.join(slugify(part) for part in (report_type, date_range, format_type))
+    return versioned_key(user_id, f'report-size:{parts}:{today}')
+
+
+def remember_report_size(user_id, report_type, date_range, format_type, size):
+    cache.set(_size_key(user_id, report_type, date_range, format_type), size, timeout_for('report-size'))
+
+
+def known_report_size(user_id, report_type, date_range, format_type):
+    """The real size of this report when it was last downloaded, or None."""
+    return cache.get(_size_key(user_id, report_type, date_range, format_type))
@@ -0,0 +1,195 @@
+"""Incremental maintenance and queries for the DailyRollup table.
+
+Rows are keyed by (user, day, kind, category), where ``day`` is the local date
+of the transaction's ``created_at``. Writes go through ``add``/``remove`` from
+the signal handlers (``add_many`` after a bulk_create, which sends none);
+reads use the query helpers below so their cost grows
+with the number of days in range rather than the number of transactions.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from . import calendar_index
+from .caching import bump_data_version
+from .models import DailyRollup, Expense, Income, Registration
+
+INCOME = 'income'
+EXPENSE = 'expense'
+KIND_MODELS = {INCOME: Income, EXPENSE: Expense}
+
+_state = threading.local()
+
+
+def kind_for(model):
+    return INCOME if issubclass(model, Income) else EXPENSE
+
+
+def as_day(value):
+    """Convert a datetime (aware or naive) or date to the rollup day."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+@contextmanager
+def suspended(user_id):
+    """Skip per-row maintenance for ``user_id``.
+
+    Used by delete_account: the user's rollups are removed by the cascade,
+    so updating them once per deleted transaction would be wasted work.
+    """
+    user_ids = getattr(_state, 'suspended', set())
+    _state.suspended = user_ids | {user_id}
+    try:
+        yield
+    finally:
+        _state.suspended = user_ids
+
+
+def is_suspended(user_id):
+    return user_id in getattr(_state, 'suspended', ())
+
+
+def _apply(user_id, day, kind, category, amount, count):
+    rows = DailyRollup.objects.filter(user_id=user_id, day=day, kind=kind, category=category)
+    if rows.update(total=F('total') + amount, count=F('count') + count):
+        if count < 0:
+            rows.filter(count__lte=0).delete()
+        return
+    if count <= 0:
+        # Nothing to subtract from; the rollup is already out of sync and
+        # ``rebuild_rollups`` will repair it.
+        return
+    try:
+        with transaction.atomic():
+            DailyRollup.objects.create(user_id=user_id, day=day, kind=kind,
+                                       category=category, total=amount, count=count)
+    except IntegrityError:
+        # A concurrent request created the row first
+        rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def add(kind, user_id, created_at, category, amount):
+    """Record one new transaction in the rollup."""
+    if user_id is None or is_suspended(user_id):
+        return
+    _apply(user_id, as_day(created_at), kind, category or '', Decimal(str(amount)), 1)
+
+
+def remove(kind, user_id, created_at, category, amount):
+    """Remove one transaction from the rollup."""
+    if user_id is None or is_suspended(user_id):
+        return
+    _apply(user_id, as_day(created_at), kind, category or '', -Decimal(str(amount)), -1)
+
+
+def add_many(kind, transactions):
+    """Record transactions written with bulk_create, which sends no signals.
+
+    Transactions in the same (user, day, category) bucket are merged first,
+    so each bucket costs one update (or insert) however many rows it got.
+    """
+    buckets = {}
+    for obj in transactions:
+        if obj.user_id is None or is_suspended(obj.user_id):
+            continue
+        key = (obj.user_id, as_day(obj.created_at), obj.category or '')
+        amount, count = buckets.get(key, (Decimal('0'), 0))
+        buckets[key] = (amount + Decimal(str(obj.amount)), count + 1)
+    for (user_id, day, category), (amount, count) in buckets.items():
+        _apply(user_id, day, kind, category, amount, count)
+    for user_id in {user_id for user_id, _, _ in buckets}:
+        transaction.on_commit(lambda user_id=user_id: bump_data_version(user_id))
+
+
+def rebuild(user=None):
+    """Recompute rollups from the raw tables. Returns the number of rows written."""
+    created = 0
+    with transaction.atomic():
+        existing = DailyRollup.objects.all()
+        if user is not None:
+            existing = existing.filter(user=user)
+        existing.delete()
+        for kind, model in KIND_MODELS.items():
+            source = model.objects.filter(user__isnull=False)
+            if user is not None:
+                source = source.filter(user=user)
+            grouped = source.annotate(day=TruncDate('created_at')).values(
+                'user_id', 'day', 'category'
+            ).annotate(total=Sum('amount'), count=Count('id')).order_by()
+            rows = [
+                DailyRollup(user_id=row['user_id'], day=row['day'], kind=kind,
+                            category=row['category'] or '', total=row['total'], count=row['count'])
+                for row in grouped.iterator()
+            ]
+            DailyRollup.objects.bulk_create(rows, batch_size=1000)
+            created += len(rows)
+    # Anything cached from the old rollups is now stale
+    user_ids = [user.pk] if user is not None else Registration.objects.values_list('pk', flat=True)
+    for user_id in user_ids:
+        bump_data_version(user_id)
+    return created
+
+
+# Query helpers -------------------------------------------------------------
+
+def rollups_for(user, kind=None, start=None, end=None):
+    """Rollup rows of ``user`` with ``start <= day < end`` (either bound optional)."""
+    qs = DailyRollup.objects.filter(user=user)
+    if kind:
+        qs = qs.filter(kind=kind)
+    if start is not None:
+        qs = qs.filter(day__gte=as_day(start))
+    if end is not None:
+        qs = qs.filter(day__lt=as_day(end))
+    return qs
+
+
+def total(user, kind, start=None, end=None):
+    return rollups_for(user, kind, start, end).aggregate(total=Sum('total'))['total'] or 0
+
+
+def by_category(user, kind, start=None, end=None):
+    """Category totals (``category``, ``total``, ``count``), largest first."""
+    return rollups_for(user, kind, start, end).values('category').annotate(
+        total=Sum('total'), count=Sum('count')
+    ).order_by('-total')
+
+
+def by_month(user, kind, start=None, end=None):
+    """Monthly totals (``month``, ``total``) in calendar order."""
+    return rollups_for(user, kind, start, end).annotate(
+        month=TruncMonth('day')
+    ).values('month').annotate(total=Sum('total')).order_by('month')
+
+
+def by_bucket(user, granularity, start=None, end=None, fields=()):
+    """Totals of both kinds per calendar bucket in one query.
+
+    Rows have ``kind``, ``fields``, ``bucket`` (see ``calendar_index``),
+    ``total`` and ``count``, in calendar order.
+    """
+    return rollups_for(user, None, start, end).annotate(
+        bucket=calendar_index.trunc('day', granularity)
+    ).values('kind', *fields, 'bucket').annotate(total=Sum('total'), count=Sum('count')).order_by('bucket')
+
+
+def month_series(user, count, end):
+    """``(months, income, expense)`` for the ``count`` calendar months up to ``end``.
+
+    ``months`` are the first days of the months, oldest first; ``income``
+    and ``expense`` are the matching totals, zero for months without any.
+    """
+    months = calendar_index.trailing(end, count, calendar_index.MONTH)
+    rows = list(by_bucket(user, calendar_index.MONTH, start=months[0]))
+    totals = {kind: calendar_index.totals(row for row in rows if row['kind'] == kind) for kind in KIND_MODELS}
+    return months, calendar_index.dense(totals[INCOME], months), calendar_index.dense(totals[EXPENSE], months)
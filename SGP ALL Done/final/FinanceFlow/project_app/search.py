@@ -0,0 +1,145 @@
+"""Full-text search over transaction descriptions and categories.
+
+SQLite uses one FTS5 table for incomes and expenses. It is kept in sync by
+triggers, so bulk inserts and queryset updates are indexed too. A row's
+rowid encodes the transaction as ``id * 2`` (incomes) or ``id * 2 + 1``
+(expenses). Its ``owner`` column holds a ``u<user id>`` token, so a search
+only reads the index entries of one user.
+
+PostgreSQL uses a GIN index on each table's tsvector instead. Other backends
+are not indexed; ``available()`` is False there and callers fall back to
+``icontains``.
+
+Every search term is matched as a prefix ("gro" finds "Groceries"), all
+terms must match, and results are ranked best first.
+"""
+import re
+
+from django.db import connection
+
+FTS_TABLE = 'project_app_transaction_fts'
+TABLES = {'income': ('project_app_income', 0), 'expense': ('project_app_expense', 1)}
+KIND_BY_BIT = {bit: kind for kind, (_, bit) in TABLES.items()}
+SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(category, ''))"
+MAX_TERMS = 8
+
+_TERM = re.compile(r'\w+')
+
+
+def terms(q):
+    """The words of a search string, lower-cased (punctuation is dropped)."""
+    return _TERM.findall((q or '').lower())[:MAX_TERMS]
+
+
+def available(conn=None):
+    return (conn or connection).vendor in ('sqlite', 'postgresql')
+
+
+def install(conn):
+    """Create the search index and its triggers if they are missing.
+
+    Idempotent. It runs after every migrate because SQLite drops a table's
+    triggers when a migration rebuilds the table.
+    """
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "owner, description, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            for table, bit in TABLES.values():
+                insert = (
+                    f"INSERT INTO {FTS_TABLE}(rowid, owner, description, category) "
+                    f"SELECT NEW.id * 2 + {bit}, 'u' || NEW.user_id, NEW.description, NEW.category "
+                    "WHERE NEW.user_id IS NOT NULL;"
+                )
+                delete = f"DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id * 2 + {bit};"
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} "
+                               f"BEGIN {insert} END")
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} "
+                               f"BEGIN {delete} END")
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update "
+                               f"AFTER UPDATE OF user_id, description, category ON {table} "
+                               f"BEGIN {delete} {insert} END")
+        elif conn.vendor == 'postgresql':
+            for table, _ in TABLES.values():
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING GIN ({SEARCH_DOCUMENT})")
+
+
+def uninstall(conn):
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            for table, _ in TABLES.values():
+                for op in ('insert', 'delete', 'update'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{op}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        elif conn.vendor == 'postgresql':
+            for table, _ in TABLES.values():
+                cursor.execute(f"DROP INDEX IF EXISTS {table}_search_idx")
+
+
+def rebuild(conn=None):
+    """Re-index every transaction (SQLite). Returns the number of indexed rows."""
+    conn = conn or connection
+    if conn.vendor != 'sqlite':
+        # The PostgreSQL index is maintained by the database itself
+        return 0
+    install(conn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        for table, bit in TABLES.values():
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(rowid, owner, description, category) "
+                f"SELECT id * 2 + {bit}, 'u' || user_id, description, category FROM {table} WHERE user_id IS NOT NULL"
+            )
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def search(user, q, kinds=None, limit=50, after=None):
+    """Return up to ``limit`` matches as ``(kind, id, score, key)``, best first.
+
+    A lower ``score`` ranks higher. ``key`` breaks ties. Pass the last
+    match's ``(score, key)`` as ``after`` to get the next page.
+    """
+    words = terms(q)
+    if not words:
+        return []
+    kinds = list(kinds or TABLES)
+    if connection.vendor == 'sqlite':
+        sql, params = _sqlite_search(user, words, kinds)
+    else:
+        sql, params = _postgres_search(user, words, kinds)
+    if after:
+        sql += ' WHERE score > %s OR (score = %s AND key > %s)'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, key LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(KIND_BY_BIT[key % 2], key // 2, score, key) for key, score in cursor.fetchall()]
+
+
+def _sqlite_search(user, words, kinds):
+    # Only the description and category columns are searched (and ranked)
+    match = f'owner:u{user.pk} AND {{description category}} : (' + ' '.join(f'"{w}"*' for w in words) + ')'
+    bits = ', '.join(str(TABLES[kind][1]) for kind in kinds)
+    sql = (
+        f"SELECT key, score FROM (SELECT rowid AS key, bm25({FTS_TABLE}, 0.0, 1.0, 1.0) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid %% 2 IN ({bits}))"
+    )
+    return sql, [match]
+
+
+def _postgres_search(user, words, kinds):
+    query = ' & '.join(f'{w}:*' for w in words)
+    parts, params = [], []
+    for kind in kinds:
+        table, bit = TABLES[kind]
+        parts.append(
+            f"SELECT id * 2 + {bit} AS key, -ts_rank({SEARCH_DOCUMENT}, query) AS score "
+            f"FROM {table}, to_tsquery('simple', %s) query WHERE user_id = %s AND {SEARCH_DOCUMENT} @@ query"
+        )
+        params += [query, user.pk]
+    return 'SELECT key, score FROM (' + ' UNION ALL '.join(parts) + ') matches', params
@@ -0,0 +1,97 @@
+"""Settle a group's debts in as few transfers as possible.
+
+Works on net balances (see ``ledger.balance_vector``), not on who paid for
+whom: everyone who is owed money only needs to be paid their balance, by
+anyone. The greedy solver repeatedly pays the largest creditor from the
+largest debtor using two heaps, which settles n members in at most n - 1
+transfers in O(n log n). For small groups the exact solver finds the
+largest number of sub-groups whose balances cancel out, each of which
+settles on its own, giving the minimum possible number of transfers.
+"""
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+# Groups with at most this many non-zero balances are solved exactly
+EXACT_LIMIT = 12
+
+Transfer = namedtuple('Transfer', ['giver', 'receiver', 'cents'])
+
+
+def _greedy(ids, cents):
+    """Transfers settling ``cents`` (largest debtor pays largest creditor)."""
+    creditors = [(-int(c), int(i)) for i, c in zip(ids, cents) if c > 0]
+    debtors = [(int(c), int(i)) for i, c in zip(ids, cents) if c < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        owed, receiver = heapq.heappop(creditors)
+        owes, giver = heapq.heappop(debtors)
+        amount = min(-owed, -owes)
+        transfers.append(Transfer(giver, receiver, amount))
+        # At most one side is left with a remainder
+        if -owed > amount:
+            heapq.heappush(creditors, (owed + amount, receiver))
+        elif -owes > amount:
+            heapq.heappush(debtors, (owes + amount, giver))
+    return transfers
+
+
+def _zero_sum_groups(cents):
+    """Split indexes of ``cents`` into the most groups that each sum to 0."""
+    n = len(cents)
+    full = (1 << n) - 1
+    sums = np.zeros(1 << n, dtype=np.int64)
+    for i, c in enumerate(cents):
+        sums[1 << i:1 << (i + 1)] = sums[:1 << i] + c
+    zero = (sums == 0).tolist()
+
+    # best[mask]: most zero-sum groups the members in mask can be split into
+    best = [0] * (1 << n)
+    removed = [0] * (1 << n)
+    for mask in range(1, 1 << n):
+        rest = mask
+        best[mask] = -1
+        while rest:
+            bit = rest & -rest
+            if best[mask ^ bit] > best[mask]:
+                best[mask], removed[mask] = best[mask ^ bit], bit
+            rest ^= bit
+        best[mask] += zero[mask]
+
+    # Walk back from the full set; each zero-sum prefix closes a group
+    groups, mask, boundary = [], full, full
+    while mask:
+        mask ^= removed[mask]
+        if zero[mask]:
+            groups.append([i for i in range(n) if (boundary ^ mask) >> i & 1])
+            boundary = mask
+    return groups
+
+
+def settle(ids, cents, exact=None):
+    """Transfers that settle balances ``cents`` of members ``ids``.
+
+    ``cents`` are net balances in cents (positive: is owed money). When
+    ``exact`` is None the exact solver is used for groups with at most
+    EXACT_LIMIT non-zero balances that sum to zero. Largest transfers come
+    first.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    cents = np.asarray(cents, dtype=np.int64)
+    nonzero = cents != 0
+    ids, cents = ids[nonzero], cents[nonzero]
+
+    if exact is None:
+        exact = len(cents) <= EXACT_LIMIT
+    if exact and cents.sum() == 0:
+        transfers = []
+        for group in _zero_sum_groups(cents.tolist()):
+            transfers.extend(_greedy(ids[group], cents[group]))
+    else:
+        transfers = _greedy(ids, cents)
+    transfers.sort(key=lambda t: (-t.cents, t.giver, t.receiver))
+    return transfers
@@ -0,0 +1,215 @@
+import threading
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import ledger, rollups, sitestats
+from .caching import bump_data_version
+from .events import get_hub
+from .models import Expense, GroupExpense, GroupExpenseSplit, Income, Registration
+
+
+def _rollup_key(row):
+    return (row['user_id'], rollups.as_day(row['created_at']), row['category'] or '')
+
+
+@receiver(pre_save, sender=Income)
+@receiver(pre_save, sender=Expense)
+def remember_previous_transaction(sender, instance, **kwargs):
+    """Keep the stored values of an edited transaction so its old rollup can be corrected."""
+    instance._rollup_previous = None
+    if instance.pk:
+        instance._rollup_previous = sender.objects.filter(pk=instance.pk).values(
+            'user_id', 'created_at', 'category', 'amount'
+        ).first()
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    kind = rollups.kind_for(sender)
+    current = {
+        'user_id': instance.user_id,
+        'created_at': instance.created_at,
+        'category': instance.category,
+        'amount': instance.amount,
+    }
+    # Set again by remember_previous_transaction on every save
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        if _rollup_key(previous) == _rollup_key(current):
+            if str(previous['amount']) != str(current['amount']):
+                # Same bucket: only re-apply when the amount changed
+                rollups.remove(kind, **previous)
+                rollups.add(kind, **current)
+            return
+        rollups.remove(kind, **previous)
+    rollups.add(kind, **current)
+
+
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    rollups.remove(rollups.kind_for(sender), instance.user_id, instance.created_at,
+                   instance.category, instance.amount)
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def bump_user_data_version(sender, instance, **kwargs):
+    """Invalidate the user's cached insights and fragments once the change is committed.
+
+    Bumping earlier would let a concurrent request cache data read from
+    the pre-commit rows under the new version.
+    """
+    user_id = instance.user_id
+    if user_id is not None and not rollups.is_suspended(user_id):
+        transaction.on_commit(lambda: bump_data_version(user_id))
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def publish_transactions_changed(sender, instance, **kwargs):
+    """Wake the user's open notification streams once the change is committed."""
+    user_id = instance.user_id
+    if user_id is None or rollups.is_suspended(user_id):
+        return
+    event = {'type': 'transactions-changed', 'kind': rollups.kind_for(sender)}
+    transaction.on_commit(lambda: get_hub().publish(user_id, event))
+
+
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Expense)
+def update_site_stats_on_save(sender, instance, created, **kwargs):
+    if rollups.is_suspended(instance.user_id):
+        return
+    kind = rollups.kind_for(sender)
+    previous = getattr(instance, '_rollup_previous', None)
+    change = Decimal(str(instance.amount)) - (Decimal(str(previous['amount'])) if previous else 0)
+    deltas = {f'{kind}_count': 1 if created else 0, f'{kind}_total': change}
+    # After commit, so the shared row is locked only briefly
+    transaction.on_commit(lambda: sitestats.adjust(**deltas))
+
+
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Expense)
+def update_site_stats_on_delete(sender, instance, **kwargs):
+    # delete_account takes the user's transactions out in one go
+    if rollups.is_suspended(instance.user_id):
+        return
+    kind = rollups.kind_for(sender)
+    deltas = {f'{kind}_count': -1, f'{kind}_total': -Decimal(str(instance.amount))}
+    transaction.on_commit(lambda: sitestats.adjust(**deltas))
+
+
+@receiver(post_save, sender=Registration)
+def count_new_user(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: sitestats.adjust(user_count=1))
+
+
+@receiver(post_delete, sender=Registration)
+def count_deleted_user(sender, instance, **kwargs):
+    transaction.on_commit(lambda: sitestats.adjust(user_count=-1))
+
+
+@receiver(pre_save, sender=GroupExpense)
+def remember_previous_group_expense(sender, instance, **kwargs):
+    """Keep the stored payer and amount of an edited group expense."""
+    instance._ledger_previous = None
+    if instance.pk:
+        instance._ledger_previous = sender.objects.filter(pk=instance.pk).values(
+            'group_id', 'paid_by_id', 'amount'
+        ).first()
+
+
+@receiver(post_save, sender=GroupExpense)
+def update_group_balance_on_expense_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    instance._ledger_previous = None
+    current = {'group_id': instance.group_id, 'paid_by_id': instance.paid_by_id, 'amount': instance.amount}
+    if previous:
+        if previous['group_id'] != current['group_id']:
+            # Shares move to the new group along with the payment
+            for member_id, amount in instance.groupexpensesplit_set.values_list('member_id', 'amount'):
+                ledger.remove(previous['group_id'], member_id, owed=amount)
+                ledger.add(current['group_id'], member_id, owed=amount)
+        elif previous['paid_by_id'] == current['paid_by_id'] and str(previous['amount']) == str(current['amount']):
+            return
+        ledger.remove(previous['group_id'], previous['paid_by_id'], paid=previous['amount'])
+    ledger.add(current['group_id'], current['paid_by_id'], paid=current['amount'])
+
+
+# Group expenses being deleted on this thread. Their splits are taken off
+# the ledger together when the expense goes, not one at a time.
+_deleting = threading.local()
+
+
+def _deleting_expense_ids():
+    if not hasattr(_deleting, 'expense_ids'):
+        _deleting.expense_ids = set()
+    return _deleting.expense_ids
+
+
+@receiver(pre_delete, sender=GroupExpense)
+def collect_group_expense_shares(sender, instance, **kwargs):
+    """Sum the expense's splits per member before the cascade deletes them."""
+    if ledger.is_suspended(instance.group_id):
+        return
+    instance._ledger_shares = dict(
+        instance.groupexpensesplit_set.values('member_id').annotate(total=Sum('amount'))
+        .values_list('member_id', 'total').order_by()
+    )
+    _deleting_expense_ids().add(instance.pk)
+
+
+@receiver(post_delete, sender=GroupExpense)
+def update_group_balance_on_expense_delete(sender, instance, **kwargs):
+    _deleting_expense_ids().discard(instance.pk)
+    ledger.remove(instance.group_id, instance.paid_by_id, paid=instance.amount)
+    shares = getattr(instance, '_ledger_shares', None)
+    if shares:
+        ledger.add_shares(instance.group_id, {member_id: -amount for member_id, amount in shares.items()})
+
+
+def _split_group_id(split):
+    return GroupExpense.objects.filter(pk=split.expense_id).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=GroupExpenseSplit)
+def remember_previous_split(sender, instance, **kwargs):
+    """Keep the stored member and amount of an edited split."""
+    instance._ledger_previous = None
+    if instance.pk:
+        instance._ledger_previous = sender.objects.filter(pk=instance.pk).values(
+            'expense__group_id', 'member_id', 'amount'
+        ).first()
+
+
+@receiver(post_save, sender=GroupExpenseSplit)
+def update_group_balance_on_split_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    instance._ledger_previous = None
+    group_id = instance.expense.group_id
+    if previous:
+        if (previous['expense__group_id'], previous['member_id'], str(previous['amount'])) == (
+                group_id, instance.member_id, str(instance.amount)):
+            return
+        ledger.remove(previous['expense__group_id'], previous['member_id'], owed=previous['amount'])
+    ledger.add(group_id, instance.member_id, owed=instance.amount)
+
+
+@receiver(post_delete, sender=GroupExpenseSplit)
+def update_group_balance_on_split_delete(sender, instance, **kwargs):
+    if instance.expense_id in _deleting_expense_ids():
+        # Removed with the other shares once the expense is deleted
+        return
+    group_id = _split_group_id(instance)
+    ledger.remove(group_id, instance.member_id, owed=instance.amount)
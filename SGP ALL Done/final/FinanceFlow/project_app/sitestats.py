@@ -0,0 +1,91 @@
+"""Site-wide statistics for the landing page.
+
+The counts and totals live in a single SiteStats row that the signal
+handlers adjust as users and transactions come and go, so the landing
+page reads one row instead of counting and summing the transaction
+tables. Bulk writes bypass the signals; ``reconcile`` (run by
+``python manage.py reconcile_site_stats``, e.g. from cron) recomputes
+the row from scratch.
+
+Each process also keeps the last value it read for
+FINANCEFLOW_SITE_STATS_TTL seconds (default 60), so most landing page
+hits don't query the database at all.
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Expense, Income, Registration, SiteStats
+
+STATS_ID = 1
+DEFAULT_TTL = 60
+FIELDS = ('user_count', 'income_count', 'income_total', 'expense_count', 'expense_total')
+
+_lock = threading.Lock()
+_cached = None      # (expires_at, values)
+
+
+def _totals(queryset):
+    totals = queryset.aggregate(count=Count('id'), total=Sum('amount'))
+    return totals['count'], totals['total'] or Decimal('0')
+
+
+def reconcile():
+    """Recompute the counters from the raw tables. Returns the new values."""
+    income_count, income_total = _totals(Income.objects.all())
+    expense_count, expense_total = _totals(Expense.objects.all())
+    values = {
+        'user_count': Registration.objects.count(),
+        'income_count': income_count,
+        'income_total': income_total,
+        'expense_count': expense_count,
+        'expense_total': expense_total,
+    }
+    SiteStats.objects.update_or_create(pk=STATS_ID, defaults=dict(values, reconciled_at=timezone.now()))
+    invalidate()
+    return values
+
+
+def adjust(**deltas):
+    """Add ``deltas`` (e.g. ``income_count=1, income_total=amount``) to the counters."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if not SiteStats.objects.filter(pk=STATS_ID).update(**{name: F(name) + delta for name, delta in deltas.items()}):
+        # No row yet: computing it from the tables includes this change
+        reconcile()
+
+
+def forget_user_transactions(user):
+    """Take a user's transactions out of the counters before they are deleted in bulk."""
+    income_count, income_total = _totals(Income.objects.filter(user=user))
+    expense_count, expense_total = _totals(Expense.objects.filter(user=user))
+    adjust(income_count=-income_count, income_total=-income_total,
+           expense_count=-expense_count, expense_total=-expense_total)
+
+
+def invalidate():
+    """Drop this process's cached copy."""
+    global _cached
+    _cached = None
+
+
+def current():
+    """The counters as a dict, cached in process for FINANCEFLOW_SITE_STATS_TTL seconds."""
+    global _cached
+    cached = _cached
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    with _lock:
+        if _cached is not None and _cached[0] > time.monotonic():
+            return _cached[1]
+        values = SiteStats.objects.filter(pk=STATS_ID).values(*FIELDS).first()
+        if values is None:
+            values = reconcile()
+        ttl = getattr(settings, 'FINANCEFLOW_SITE_STATS_TTL', DEFAULT_TTL)
+        _cached = (time.monotonic() + ttl, values)
+        return values
@@ -0,0 +1,84 @@
+"""Splitting a group expense between members.
+
+An expense can be split equally, by exact amounts, by percentages or by
+shares (e.g. 2:1:1). Whatever the mode, the shares are whole cents that
+add up to exactly the expense amount: the amount is divided in proportion
+and the cents left over by rounding down go to the members with the
+largest remainders (largest remainder method).
+"""
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+
+EQUAL = 'equal'
+UNEQUAL = 'unequal'
+PERCENTAGE = 'percentage'
+SHARES = 'shares'
+
+MODE_CHOICES = [
+    (EQUAL, 'Equally'),
+    (UNEQUAL, 'By exact amounts'),
+    (PERCENTAGE, 'By percentages'),
+    (SHARES, 'By shares'),
+]
+MODES = {mode for mode, _label in MODE_CHOICES}
+
+
+class SplitError(ValueError):
+    """The split values don't describe a valid split; the message is shown to the user."""
+
+
+def allocate(amount, weights):
+    """Divide ``amount`` in proportion to ``weights`` into cents summing to ``amount``."""
+    total_cents = int(Decimal(amount) * 100)
+    weights = [Fraction(str(w)) for w in weights]
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        raise SplitError('The split must give a positive part to at least one member.')
+
+    exact = [total_cents * w / weight_sum for w in weights]
+    cents = [int(x) for x in exact]  # weights are >= 0, so this rounds down
+    leftover = total_cents - sum(cents)
+    # Earlier members win ties, so the result is stable
+    by_remainder = sorted(range(len(exact)), key=lambda i: exact[i] - cents[i], reverse=True)
+    for i in by_remainder[:leftover]:
+        cents[i] += 1
+    return [Decimal(c).scaleb(-2) for c in cents]
+
+
+def _parse(value, label):
+    try:
+        number = Decimal(str(value).strip() or '0')
+    except InvalidOperation:
+        raise SplitError(f'Please enter a valid {label}.')
+    if not number.is_finite() or number < 0:
+        raise SplitError(f'Please enter a valid {label}.')
+    return number
+
+
+def compute(mode, amount, member_ids, values=None):
+    """``{member_id: Decimal}`` shares of ``amount`` for ``member_ids``.
+
+    ``values`` maps member ids to the amount, percentage or number of
+    shares entered for them (unused for equal splits). Members whose share
+    comes out as zero are left out.
+    """
+    values = values or {}
+    if mode == EQUAL:
+        weights = [1] * len(member_ids)
+    elif mode == UNEQUAL:
+        weights = [_parse(values.get(m), 'amount') for m in member_ids]
+        if sum(weights) != amount:
+            raise SplitError(f'The amounts add up to {sum(weights)}, not {amount}.')
+        if any(w != w.quantize(Decimal('0.01')) for w in weights):
+            raise SplitError('Amounts can have at most two decimal places.')
+    elif mode == PERCENTAGE:
+        weights = [_parse(values.get(m), 'percentage') for m in member_ids]
+        if sum(weights) != 100:
+            raise SplitError(f'The percentages add up to {sum(weights)}%, not 100%.')
+    elif mode == SHARES:
+        weights = [_parse(values.get(m), 'number of shares') for m in member_ids]
+    else:
+        raise SplitError('Please choose how to split the expense.')
+
+    shares = dict(zip(member_ids, allocate(amount, weights)))
+    return {m: share for m, share in shares.items() if share}
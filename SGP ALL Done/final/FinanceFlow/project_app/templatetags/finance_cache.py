@@ -0,0 +1,33 @@
+from django import template
+
+from ..caching import cached_fragment
+
+register = template.Library()
+
+
+class UserFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary = vary
+
+    def render(self, context):
+        user = getattr(context.get('request'), 'finance_user', None)
+        if user is None:
+            return self.nodelist.render(context)
+        vary = [var.resolve(context) for var in self.vary]
+        return cached_fragment(user.pk, self.name.resolve(context), lambda: self.nodelist.render(context), vary)
+
+
+@register.tag
+def userfragment(parser, token):
+    """Cache the enclosed block per user until their data changes.
+
+    Usage: ``{% userfragment "name" [vary_on ...] %} ... {% enduserfragment %}``
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('enduserfragment',))
+    parser.delete_first_token()
+    return UserFragmentNode(nodelist, parser.compile_filter(bits[1]), [parser.compile_filter(b) for b in bits[2:]])
@@ -1,3 +1,1105 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib.util
+import json
+import os
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.fields.files import FieldFile
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import calendar_index, exports, history, jobs, ledger, membership, reporting, rollups, search, settlement, sitestats, splits
+from . import metrics as metrics_module
+from .models import (Registration, Income, Expense, ReportJob, Group, GroupMember, GroupExpense,
+                     GroupExpenseSplit, SiteStats, DailyRollup)
+from .middleware import SESSION_USER_ID, get_finance_user
+from .views import _notification_payload
+
+
+# The tests never touch the cache configured by FINANCEFLOW_CACHE_URL
+TEST_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'financeflow-tests'}}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FinanceFlowTestCase(TestCase):
+    """Base of the tests below: a private in-memory cache, emptied for each class."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+
+
+class RollupMaintenanceTests(FinanceFlowTestCase):
+    """The incremental rollup updates leave the same rows as a full rebuild."""
+
+    def setUp(self):
+        self.user = Registration.objects.create(name='Rolled', email='rolled@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+
+    def assertMatchesRebuild(self):
+        def snapshot():
+            return sorted(DailyRollup.objects.values_list('user_id', 'day', 'kind', 'category', 'total', 'count'))
+        incremental = snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, snapshot())
+
+    def test_create_update_and_delete(self):
+        lunch = Expense.objects.create(user=self.user, amount=40, description='Lunch', currency='INR', category='Food')
+        Expense.objects.create(user=self.user, amount=15, description='Tea', currency='INR', category='Food')
+        salary = Income.objects.create(user=self.user, amount=5000, description='Pay', currency='INR', category='Salary')
+        self.assertMatchesRebuild()
+
+        lunch.amount = Decimal('42.50')
+        lunch.save()
+        self.assertMatchesRebuild()
+
+        lunch.created_at = lunch.created_at - timedelta(days=40)
+        lunch.save()
+        self.assertMatchesRebuild()
+
+        lunch.category = 'Dining'
+        lunch.save()
+        salary.created_at = salary.created_at - timedelta(days=1)
+        salary.category = 'Bonus'
+        salary.save()
+        self.assertMatchesRebuild()
+
+        lunch.delete()
+        Income.objects.filter(user=self.user).delete()
+        self.assertMatchesRebuild()
+        self.assertFalse(DailyRollup.objects.filter(kind=rollups.INCOME).exists())
+
+    def test_bulk_create(self):
+        Expense.objects.create(user=self.user, amount=10, description='Bus', currency='INR', category='Travel')
+        rows = Expense.objects.bulk_create([
+            Expense(user=self.user, amount=amount, description='Bulk', currency='INR', category=category)
+            for amount, category in ((5, 'Travel'), (7, 'Travel'), (20, 'Food'), (Decimal('0.10'), ''))
+        ])
+        # Per bucket, not per row: an UPDATE for Travel, then for each of the
+        # two new buckets an UPDATE and an INSERT inside a savepoint
+        with self.assertNumQueries(9):
+            rollups.add_many(rollups.EXPENSE, rows)
+        self.assertMatchesRebuild()
+
+
+class FinanceUserMiddlewareTests(FinanceFlowTestCase):
+    """request.finance_user is resolved once per request from the session."""
+
+    def setUp(self):
+        self.ann = Registration.objects.create(name='Ann', email='ann@example.com', phone_no='9999999999',
+                                               password='Secret#123', address='')
+        self.bob = Registration.objects.create(name='Bob', email='bob@example.com', phone_no='9999999999',
+                                               password='Secret#123', address='')
+
+    def log_in(self, user):
+        return self.client.post('/login/', {'email': user.email.upper(), 'password': 'Secret#123'})
+
+    def registration_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [q for q in queries if 'project_app_registration' in q['sql']]
+
+    def test_one_registration_query_per_request(self):
+        self.assertRedirects(self.log_in(self.ann), '/dashboard/', fetch_redirect_response=False)
+        for _ in range(2):
+            response, queries = self.registration_queries('/notifications-data/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries), 1, queries)
+            self.assertIn('"id" =', queries[0]['sql'])
+
+    def test_deleted_user_falls_back_to_anonymous(self):
+        self.log_in(self.ann)
+        Registration.objects.filter(pk=self.ann.pk).delete()
+        self.assertRedirects(self.client.get('/reports/'), '/login/', fetch_redirect_response=False)
+        self.assertNotIn('entry_email', self.client.session)
+        self.assertNotIn(SESSION_USER_ID, self.client.session)
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_login_and_logout_replace_the_cached_user(self):
+        self.log_in(self.ann)
+        self.assertEqual(self.client.session[SESSION_USER_ID], self.ann.pk)
+        self.client.get('/logout/')
+        self.assertNotIn(SESSION_USER_ID, self.client.session)
+        self.assertRedirects(self.client.get('/reports/'), '/login/', fetch_redirect_response=False)
+
+        self.log_in(self.bob)
+        self.assertEqual(self.client.session[SESSION_USER_ID], self.bob.pk)
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        self.assertEqual(get_finance_user(request), self.bob)
+
+
+@override_settings(TIME_ZONE='Asia/Kolkata')
+class PeriodMetricsTests(FinanceFlowTestCase):
+    """The conditional aggregates match a plain filter-and-aggregate per window."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Registration.objects.create(name='Metrics', email='metrics@example.com',
+                                               phone_no='9999999999', password='Secret#123', address='')
+        rng = random.Random(7)
+        tz = timezone.get_current_timezone()
+        start = datetime(2023, 11, 1, tzinfo=tz)
+        for model in (Income, Expense):
+            # Just after and just before local midnight, to catch day-boundary slips
+            stamps = [start + timedelta(days=day, hours=hour, minutes=minute)
+                      for day in range(500) for hour, minute in ((0, 5), (13, 0), (23, 55))
+                      if rng.random() < 0.6]
+            rows = model.objects.bulk_create([
+                model(user=cls.user, amount=Decimal(rng.randrange(1, 900000)) / 100, description='Seed',
+                      currency='INR', category=rng.choice(['Food', 'Rent', 'Travel', 'Bills']))
+                for _ in stamps
+            ])
+            # auto_now_add stamps bulk_create rows with the current time
+            for row, stamp in zip(rows, stamps):
+                row.created_at = stamp
+            model.objects.bulk_update(rows, ['created_at'])
+        rollups.rebuild()
+
+    def reference(self, model, start=None, end=None):
+        qs = model.objects.filter(user=self.user)
+        if start is not None:
+            qs = qs.filter(created_at__gte=start, created_at__lt=end)
+        row = qs.aggregate(total=Sum('amount'), count=Count('id'))
+        return row['total'] or 0, row['count']
+
+    def test_windows_match_plain_filters_across_boundaries(self):
+        tz = timezone.get_current_timezone()
+        moments = [datetime(2024, 1, 1, 0, 1, tzinfo=tz),    # new year, week spans both years
+                   datetime(2024, 12, 31, 23, 59, tzinfo=tz),
+                   datetime(2025, 1, 3, 12, 0, tzinfo=tz),
+                   datetime(2024, 3, 1, 9, 0, tzinfo=tz),     # after a leap February
+                   datetime(2024, 7, 31, 18, 0, tzinfo=tz)]
+        for now in moments:
+            with self.subTest(now=now):
+                with self.assertNumQueries(1):
+                    metrics = metrics_module.compute_period_metrics(self.user, now)
+                w = metrics.windows
+                self.assertGreater(metrics.expense.month_count, 0)
+                for model, kind in ((Income, metrics.income), (Expense, metrics.expense)):
+                    self.assertEqual(kind.all_time, self.reference(model)[0])
+                    for name, start, end in (('today', w.today_start, w.today_end),
+                                             ('week', w.week_start, w.week_end),
+                                             ('prev_week', w.prev_week_start, w.week_start),
+                                             ('month', w.month_start, w.month_end),
+                                             ('prev_month', w.prev_month_start, w.month_start)):
+                        total, count = self.reference(model, start, end)
+                        self.assertEqual(getattr(kind, name), total, name)
+                        if name in ('today', 'week', 'month'):
+                            self.assertEqual(getattr(kind, f'{name}_count'), count, name)
+
+    def test_category_spike_matches_plain_filters(self):
+        tz = timezone.get_current_timezone()
+        for now in (datetime(2024, 1, 15, tzinfo=tz), datetime(2024, 3, 1, tzinfo=tz)):
+            with self.subTest(now=now):
+                windows = metrics_module.PeriodWindows.for_date(now)
+                with self.assertNumQueries(1):
+                    spike = metrics_module.category_spike(self.user, windows)
+                changes = {}
+                for category in ('Food', 'Rent', 'Travel', 'Bills'):
+                    expenses = Expense.objects.filter(user=self.user, category=category)
+                    cur = expenses.filter(created_at__gte=windows.month_start,
+                                          created_at__lt=windows.month_end).aggregate(t=Sum('amount'))['t'] or 0
+                    prev = expenses.filter(created_at__gte=windows.prev_month_start,
+                                           created_at__lt=windows.month_start).aggregate(t=Sum('amount'))['t'] or 0
+                    if prev > 0:
+                        changes[category] = (cur - prev) / prev * 100
+                best = max(changes, key=changes.get)
+                if changes[best] >= 10:
+                    self.assertEqual(spike, {'category': best, 'change': changes[best]})
+                else:
+                    self.assertIsNone(spike)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(FinanceFlowTestCase):
+    """The main view querysets must use an index, never a full table scan.
+
+    Set FINANCEFLOW_PLAN_SEED_ROWS=1000000 to check the plans against a
+    million-row table (the default keeps the suite fast).
+    """
+    seed_rows = int(os.environ.get('FINANCEFLOW_PLAN_SEED_ROWS', 5000))
+    scanned_tables = ('project_app_income', 'project_app_expense', 'project_app_dailyrollup',
+                      'project_app_registration')
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            Registration.objects.create(name=f'User {i}', email=f'user{i}@example.com',
+                                        phone_no='9999999999', password='Secret#123', address='')
+            for i in range(20)
+        ]
+        cls.user = users[0]
+        rng = random.Random(42)
+        today = timezone.now().date()
+        categories = ['Food', 'Rent', 'Travel', 'Salary', 'Shopping', 'Bills']
+        for model in (Income, Expense):
+            batch = []
+            for i in range(cls.seed_rows):
+                batch.append(model(user=rng.choice(users), amount=Decimal(rng.randrange(1, 50000)),
+                                   description=f'Transaction {i}', date=today - timedelta(days=rng.randrange(730)),
+                                   currency='INR', category=rng.choice(categories)))
+                if len(batch) == 10000:
+                    model.objects.bulk_create(batch)
+                    batch = []
+            model.objects.bulk_create(batch)
+        rollups.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertNoFullScan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        scans = [step for step in plan
+                 if step.startswith('SCAN') and step.split()[1] in self.scanned_tables]
+        self.assertEqual(scans, [], f'Full table scan in plan {plan} for {sql}')
+
+    def test_recent_transactions(self):
+        self.assertNoFullScan(Income.objects.filter(user=self.user).order_by('-created_at')[:5])
+        self.assertNoFullScan(Expense.objects.filter(user=self.user).order_by('-created_at')[:5])
+
+    def test_created_at_window(self):
+        end = timezone.now()
+        start = end - timedelta(days=30)
+        for model in (Income, Expense):
+            self.assertNoFullScan(model.objects.filter(user=self.user, created_at__range=[start, end]).order_by('-created_at'))
+            self.assertNoFullScan(model.objects.filter(user=self.user, created_at__gte=start).values('user').annotate(total=Sum('amount')))
+
+    def test_date_and_category_filters(self):
+        today = timezone.now().date()
+        for model in (Income, Expense):
+            self.assertNoFullScan(model.objects.filter(user=self.user, date__gte=today - timedelta(days=7)))
+            self.assertNoFullScan(model.objects.filter(user=self.user, category='Food', created_at__gte=timezone.now() - timedelta(days=90)))
+            self.assertNoFullScan(model.objects.filter(user=self.user).values('category').annotate(total=Sum('amount')))
+
+    def test_rollup_queries(self):
+        start = timezone.now() - timedelta(days=365)
+        self.assertNoFullScan(rollups.by_month(self.user, rollups.EXPENSE, start))
+        self.assertNoFullScan(rollups.by_category(self.user, rollups.INCOME))
+
+    def test_history_pages(self):
+        self.assertNoFullScan(history.history_queryset(self.user)[:51])
+        _, cursor = history.history_page(self.user)
+        self.assertNoFullScan(history.history_queryset(self.user, cursor=history.decode_cursor(cursor))[:51])
+
+    def test_member_email_lookup(self):
+        self.assertNoFullScan(Registration.objects.filter(email__in=[f'user{i}@example.com' for i in range(3)]))
+
+
+@skipUnless(search.available(), 'No full-text index on this database backend')
+class SearchIndexTests(FinanceFlowTestCase):
+    """The search index follows inserts, edits and deletes, including bulk ones."""
+
+    def setUp(self):
+        self.user = Registration.objects.create(name='Searcher', email='search@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        self.other = Registration.objects.create(name='Other', email='other@example.com',
+                                                 phone_no='9999999999', password='Secret#123', address='')
+
+    def found(self, q, user=None):
+        return [(kind, pk) for kind, pk, _, _ in search.search(user or self.user, q)]
+
+    def test_prefix_match_and_ranking(self):
+        weekly = Expense.objects.create(user=self.user, amount=10, description='Weekly groceries',
+                                        currency='INR', category='Food')
+        both = Expense.objects.create(user=self.user, amount=10, description='Groceries for the groceries party',
+                                      currency='INR', category='Groceries')
+        Expense.objects.create(user=self.other, amount=10, description='Groceries', currency='INR', category='Food')
+        Income.objects.bulk_create([Income(user=self.user, amount=5, description='Grocery refund',
+                                           currency='INR', category='Other')])
+        refund = Income.objects.get(description='Grocery refund')
+
+        # Matches in both columns rank first; the other user's row is never returned
+        self.assertEqual(self.found('groc')[0], ('expense', both.pk))
+        self.assertCountEqual(self.found('gro'), [('expense', both.pk), ('expense', weekly.pk), ('income', refund.pk)])
+        self.assertEqual(self.found('groceries weekly'), [('expense', weekly.pk)])
+        self.assertEqual(self.found('rent'), [])
+
+    def test_edits_and_deletes(self):
+        income = Income.objects.create(user=self.user, amount=100, description='Salary', currency='INR', category='Job')
+        income.description = 'Freelance invoice'
+        income.save()
+        self.assertEqual(self.found('salary'), [])
+        self.assertEqual(self.found('invoice'), [('income', income.pk)])
+
+        Income.objects.filter(pk=income.pk).update(user=self.other)
+        self.assertEqual(self.found('invoice'), [])
+        self.assertEqual(self.found('invoice', self.other), [('income', income.pk)])
+
+        income.delete()
+        self.assertEqual(self.found('invoice', self.other), [])
+
+    def test_paged_results(self):
+        Expense.objects.bulk_create([
+            Expense(user=self.user, amount=i, description=f'Taxi ride {i}', currency='INR', category='Travel')
+            for i in range(7)
+        ])
+        rows, cursor = history.history_page(self.user, q='tax', limit=3)
+        seen = rows
+        while cursor:
+            rows, cursor = history.history_page(self.user, q='tax', cursor=cursor, limit=3)
+            seen = seen + rows
+        self.assertEqual(sorted(row['amount'] for row in seen), list(range(7)))
+
+
+@mock.patch.object(exports, 'FLUSH_BYTES', 256)
+@mock.patch.object(exports, 'CHUNK_SIZE', 7)
+class StreamingExportTests(FinanceFlowTestCase):
+    """Exports stream in several chunks and still parse as one document."""
+
+    def setUp(self):
+        self.user = Registration.objects.create(name='Exporter', email='exporter@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+
+    def seed(self, incomes=23, expenses=30):
+        Income.objects.bulk_create([Income(user=self.user, amount=100 + i, description=f'Pay, part "{i}"',
+                                           currency='INR', category='Salary') for i in range(incomes)])
+        Expense.objects.bulk_create([Expense(user=self.user, amount=i + 1, description=f'Item {i}',
+                                             currency='INR', category='Food') for i in range(expenses)])
+
+    def download(self, path, params=None):
+        response = self.client.get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        return chunks, b''.join(chunks).decode('utf-8')
+
+    def test_profile_csv(self):
+        self.seed()
+        chunks, body = self.download('/profile/export/')
+        self.assertGreater(len(chunks), 1)
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(rows[:3], [['FinanceFlow Export'], ['Name', 'Exporter'], ['Email', 'exporter@example.com']])
+        header = ['Date', 'Amount', 'Currency', 'Category', 'Description']
+        self.assertEqual([i for i, row in enumerate(rows) if row == header], [5, 31])
+        self.assertEqual(rows[4], ['Incomes'])
+        self.assertEqual(rows[30], ['Expenses'])
+        self.assertEqual(sum(row[3:4] == ['Salary'] for row in rows), 23)
+        self.assertEqual(sum(row[3:4] == ['Food'] for row in rows), 30)
+        self.assertIn('Pay, part "0"', [row[4] for row in rows if len(row) == 5])
+
+    def test_report_csv_and_json(self):
+        self.seed()
+        params = {'report_type': 'Balance Report', 'date_range': 'Last 30 days'}
+        chunks, body = self.download('/generate-report/', dict(params, format='CSV'))
+        self.assertGreater(len(chunks), 1)
+        rows = list(csv.reader(StringIO(body)))
+        self.assertEqual(rows[4], reporting.REPORT_HEADER)
+        self.assertEqual(len(rows[5:]), 53)
+
+        chunks, body = self.download('/generate-report/', dict(params, format='JSON'))
+        self.assertGreater(len(chunks), 1)
+        document = json.loads(body)
+        self.assertEqual(document['columns'], reporting.REPORT_HEADER)
+        self.assertEqual(len(document['rows']), 53)
+        self.assertEqual(document['rows'][0][0], 'Income')
+
+    def test_empty_json_exports(self):
+        _, body = self.download('/generate-report/', {'report_type': 'Income Report', 'format': 'JSON'})
+        self.assertEqual(json.loads(body)['rows'], [])
+        for items in ([], [1], [{'a': 'b'}, 2, 'three']):
+            self.assertEqual(json.loads(''.join(exports.json_array(iter(items)))), items)
+            self.assertEqual(json.loads(''.join(exports.json_document({'n': 1}, 'items', iter(items))))['items'], items)
+
+
+class ReportSizeTests(FinanceFlowTestCase):
+    """The aggregate-based size estimate tracks the real CSV; downloads replace it until data changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = Registration.objects.create(name='Sized', email='sized@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        rng = random.Random(11)
+        descriptions = ['Groceries', 'Dinner, drinks', 'Said "thanks"', 'Rent for the flat', 'Fuel']
+        for model, categories in ((Income, ['Salary', 'Freelance']), (Expense, ['Food', 'Rent', 'Travel'])):
+            model.objects.bulk_create([
+                model(user=self.user, amount=Decimal(rng.randrange(100, 10000000)) / 100, currency='INR',
+                      description=rng.choice(descriptions), category=rng.choice(categories))
+                for _ in range(150)
+            ])
+
+    def download(self, report_type):
+        response = self.client.get('/generate-report/', {'report_type': report_type, 'date_range': 'Last 30 days',
+                                                         'format': 'CSV'})
+        return len(b''.join(response.streaming_content))
+
+    def test_estimate_is_close_to_the_real_csv(self):
+        now = timezone.now()
+        stats = reporting.size_statistics(self.user, now - timedelta(days=30), now)
+        for report_type, kinds in (('Income Report', ['Income']), ('Expense Report', ['Expense']),
+                                   ('Balance Report', ['Income', 'Expense'])):
+            with self.subTest(report_type=report_type):
+                preamble = reporting.report_preamble(report_type, 'Last 30 days', now)
+                estimate = reporting.estimate_csv_size(stats, kinds, preamble=preamble)
+                actual = self.download(report_type)
+                self.assertLess(abs(estimate - actual) / actual, 0.02, (estimate, actual))
+
+    def test_downloaded_size_is_cached_until_data_changes(self):
+        self.assertIsNone(reporting.known_report_size(self.user.pk, 'Expense Report', 'Last 30 days', 'CSV'))
+        actual = self.download('Expense Report')
+        self.assertEqual(reporting.known_report_size(self.user.pk, 'Expense Report', 'Last 30 days', 'CSV'), actual)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(user=self.user, amount=5, description='Tea', currency='INR', category='Food')
+        self.assertIsNone(reporting.known_report_size(self.user.pk, 'Expense Report', 'Last 30 days', 'CSV'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), FINANCEFLOW_REPORT_JOBS_IN_PROCESS=False)
+class ReportJobTests(FinanceFlowTestCase):
+    def setUp(self):
+        self.user = Registration.objects.create(name='Reporter', email='report@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+
+    def test_job_is_claimed_once(self):
+        job = jobs.enqueue(self.user, 'report', {'report_type': 'Income Report', 'date_range': 'Last 7 days',
+                                                 'end_date': timezone.now().isoformat()}, 'report.pdf')
+        self.assertEqual(jobs.claim_next(), job.pk)
+        self.assertIsNone(jobs.claim_next())
+        self.assertFalse(jobs.claim(job.pk))
+
+    def test_failed_render_or_save_marks_job_failed(self):
+        params = {'report_type': 'Income Report', 'date_range': 'Last 7 days', 'end_date': timezone.now().isoformat()}
+
+        def broken_render(job):
+            raise RuntimeError('Renderer crashed')
+
+        cases = [(broken_render, None, 'Renderer crashed'), (lambda job: b'%PDF', OSError('Disk full'), 'Disk full')]
+        for render, save_error, error in cases:
+            with self.subTest(error=error), mock.patch.dict(jobs.RENDERERS, {'report': render}), \
+                    mock.patch.object(FieldFile, 'save', side_effect=save_error), \
+                    self.assertLogs('project_app.jobs', level='ERROR'):
+                job = jobs.enqueue(self.user, 'report', params, 'report.pdf')
+                jobs.run_job(job.pk)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.error), (ReportJob.FAILED, error))
+            self.assertIsNotNone(job.finished_at)
+
+    @override_settings(FINANCEFLOW_REPORT_JOBS_IN_PROCESS=True)
+    def test_enqueue_resumes_orphaned_jobs(self):
+        params = {'report_type': 'Income Report', 'date_range': 'Last 7 days', 'end_date': timezone.now().isoformat()}
+        orphan = ReportJob.objects.create(user=self.user, kind='report', params=params, filename='old.pdf',
+                                          status=ReportJob.RUNNING,
+                                          started_at=timezone.now() - timedelta(hours=2))
+        pool = mock.Mock()
+        with mock.patch.object(jobs, 'executor', return_value=pool), self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue(self.user, 'report', params, 'report.pdf')
+        orphan.refresh_from_db()
+        self.assertEqual(orphan.status, ReportJob.PENDING)
+        self.assertEqual(pool.submit.call_args_list, [mock.call(jobs.run_job, orphan.pk), mock.call(jobs.run_job, job.pk)])
+
+    @skipUnless(importlib.util.find_spec('xhtml2pdf'), 'xhtml2pdf is not installed')
+    def test_pdf_request_returns_job(self):
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        Income.objects.create(user=self.user, amount=100, description='Salary', currency='INR', category='Salary')
+
+        response = self.client.post('/generate-report/', {'report_type': 'Income Report', 'format': 'PDF'},
+                                    HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 202)
+        job = ReportJob.objects.get(pk=response.json()['id'])
+        self.assertEqual(job.status, ReportJob.PENDING)
+
+        jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.DONE, job.error)
+        response = self.client.get(self.client.get(f'/reports/jobs/{job.pk}/').json()['download_url'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_custom_report_groups_and_sorts_in_the_database(self):
+        for model, amount, category in [(Income, 5000, 'Salary'), (Expense, 300, 'Food'),
+                                        (Expense, 700, 'Food'), (Expense, 20000, 'Rent'), (Income, 800, 'Food')]:
+            model.objects.create(user=self.user, amount=amount, description=f'{category} {amount}',
+                                 currency='INR', category=category)
+        params = {'category': 'All', 'type': 'All', 'amount_range': '0-1000',
+                  'sort_by': 'amount_desc', 'group_by': 'Type'}
+        with CaptureQueriesContext(connection) as queries:
+            items = list(reporting.custom_report_items(self.user, params))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([item['amount'] if isinstance(item, dict) else item for item in items], [
+            Decimal('700.00'), Decimal('300.00'), reporting.Subtotal('Expense', 2, Decimal('0.00'), Decimal('1000.00')),
+            Decimal('800.00'), reporting.Subtotal('Income', 1, Decimal('800.00'), Decimal('0.00')),
+        ])
+
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        response = self.client.post('/generate-custom-report/', dict(params, group_by='Category', export_format='CSV'))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(',')[-1] for line in lines[1:4]], ['₹800.00', '₹700.00', '₹300.00'])
+        self.assertEqual(lines[4:], [',Subtotal,Food,"3 transactions (income 800.00, expense 1000.00)",₹-200.00'])
+
+
+class GroupLedgerTests(FinanceFlowTestCase):
+    def setUp(self):
+        self.members = [
+            Registration.objects.create(name=name, email=f'{name.lower()}@example.com',
+                                        phone_no='9999999999', password='Secret#123', address='')
+            for name in ('Asha', 'Ben', 'Chen', 'Dev')
+        ]
+        self.group = Group.objects.create(name='Trip', created_by=self.members[0])
+        for member in self.members:
+            GroupMember.objects.create(group=self.group, member=member)
+
+    def expense(self, payer, amount, included, splits=True):
+        expense = GroupExpense.objects.create(group=self.group, paid_by=payer, description='Dinner',
+                                              amount=Decimal(amount), date=timezone.now().date())
+        expense.included_members.add(*included)
+        if splits:
+            for m in included:
+                GroupExpenseSplit.objects.create(expense=expense, member=m, amount=Decimal(amount) / len(included))
+        return expense
+
+    def test_balances_follow_expenses(self):
+        asha, ben, chen, dev = self.members
+        dinner = self.expense(asha, '90.00', [asha, ben, chen])
+        taxi = self.expense(ben, '40.00', [asha, ben])
+        self.expense(chen, '10.00', [chen, dev])
+        # Edits and deletes are applied too
+        dinner.amount = Decimal('120.00')
+        dinner.save()
+        for split in dinner.groupexpensesplit_set.all():
+            split.amount = Decimal('40.00')
+            split.save()
+        taxi.delete()
+
+        with self.assertNumQueries(1):
+            balances = ledger.member_balances(self.group, self.members)
+        self.assertEqual(balances, {asha.pk: Decimal('80.00'), ben.pk: Decimal('-40.00'),
+                                    chen.pk: Decimal('-35.00'), dev.pk: Decimal('-5.00')})
+        ledger.rebuild(self.group)
+        self.assertEqual(ledger.member_balances(self.group, self.members), balances)
+        self.assertEqual(self.group.get_member_balance(dev), Decimal('-5.00'))
+
+    def test_deleting_an_expense_removes_its_splits_at_once(self):
+        asha, ben, chen, dev = self.members
+        self.expense(chen, '30.00', [ben, chen, dev])
+
+        def delete_queries(included):
+            expense = self.expense(asha, '120.00', included)
+            with CaptureQueriesContext(connection) as queries:
+                expense.delete()
+            return len(queries)
+
+        self.assertEqual(delete_queries([asha, ben]), delete_queries(self.members))
+        balances = ledger.member_balances(self.group, self.members)
+        self.assertEqual(balances, {asha.pk: Decimal('0.00'), ben.pk: Decimal('-10.00'),
+                                    chen.pk: Decimal('20.00'), dev.pk: Decimal('-10.00')})
+        ledger.rebuild(self.group)
+        self.assertEqual(ledger.member_balances(self.group, self.members), balances)
+
+    def test_rebuild_shares_unsplit_expenses(self):
+        asha, ben, chen, dev = self.members
+        self.expense(asha, '90.00', [asha, ben, chen])
+        # Recorded before splits existed: shared equally between included members
+        self.expense(chen, '30.00', [ben, chen, dev], splits=False)
+        self.assertEqual(ledger.rebuild(), 4)
+        self.assertEqual(ledger.member_balances(self.group), {asha.pk: Decimal('60.00'), ben.pk: Decimal('-40.00'),
+                                                              chen.pk: Decimal('-10.00'), dev.pk: Decimal('-10.00')})
+
+    def test_settlement_instructions(self):
+        asha, ben, chen, dev = self.members
+        self.expense(asha, '90.00', [asha, ben, chen])
+        self.expense(ben, '40.00', [asha, ben])
+        self.expense(chen, '30.00', [ben, chen, dev])
+        session = self.client.session
+        session['entry_email'] = asha.email
+        session.save()
+
+        response = self.client.get(f'/group/{self.group.pk}/balances/')
+        instructions = [(s['giver'], s['receiver'], s['amount']) for s in response.context['settlement_instructions']]
+        self.assertEqual(instructions, [(ben, asha, 20.0), (chen, asha, 10.0), (dev, asha, 10.0)])
+
+    def test_groups_page_query_count(self):
+        asha, ben, chen, dev = self.members
+        self.expense(asha, '90.00', [asha, ben, chen])
+        session = self.client.session
+        session['entry_email'] = asha.email
+        session.save()
+
+        def page_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/groups/')
+            return response, len(queries)
+
+        page_queries()  # the first request also sets up the session
+        response, one_group = page_queries()
+        for i in range(5):
+            group = Group.objects.create(name=f'Group {i}', created_by=ben)
+            GroupMember.objects.create(group=group, member=asha)
+            GroupMember.objects.create(group=group, member=dev)
+        response, six_groups = page_queries()
+
+        self.assertEqual(one_group, six_groups)
+        self.assertLessEqual(six_groups, 3)  # session, user, groups
+        self.assertEqual(response.context['total_groups'], 6)
+        self.assertEqual(response.context['total_members'], 4 + 5 * 2)
+        self.assertEqual(response.context['total_group_expenses'], Decimal('90.00'))
+        self.assertEqual(response.context['pending_settlements'], Decimal('60.00'))
+
+    def test_add_expense_with_many_members(self):
+        asha = self.members[0]
+        others = [
+            Registration(name=f'Member {i}', email=f'member{i}@example.com', phone_no='9999999999',
+                         password='Secret#123', address='')
+            for i in range(46)
+        ]
+        others = Registration.objects.bulk_create(others)
+        GroupMember.objects.bulk_create([GroupMember(group=self.group, member=m) for m in others])
+        everyone = self.members + others
+        session = self.client.session
+        session['entry_email'] = asha.email
+        session.save()
+
+        data = {'payer': asha.pk, 'description': 'Hotel', 'amount': '1000.00', 'date': '2026-10-01',
+                'included_members': [m.pk for m in everyone], 'split_mode': splits.SHARES,
+                **{f'split_{m.pk}': 2 if m == asha else 1 for m in everyone}}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/group/{self.group.pk}/add-expense/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertLess(len(queries), 20)
+
+        expense = GroupExpense.objects.get(description='Hotel')
+        shares = dict(expense.groupexpensesplit_set.values_list('member_id', 'amount'))
+        self.assertEqual(len(shares), 50)
+        self.assertEqual(sum(shares.values()), Decimal('1000.00'))
+        self.assertEqual(shares[asha.pk], Decimal('39.21'))
+        self.assertEqual(expense.included_members.count(), 50)
+        balances = ledger.member_balances(self.group)
+        self.assertEqual(balances[asha.pk], Decimal('960.79'))
+        self.assertEqual(sum(balances.values()), 0)
+
+    def test_zero_shares_keep_included_members(self):
+        asha, ben, chen = self.members[:3]
+        session = self.client.session
+        session['entry_email'] = asha.email
+        session.save()
+        response = self.client.post(f'/group/{self.group.pk}/add-expense/', {
+            'payer': asha.pk, 'description': 'Mint', 'amount': '0.01', 'date': '2026-10-01',
+            'included_members': [asha.pk, ben.pk, chen.pk], 'split_mode': splits.EQUAL,
+        })
+        self.assertEqual(response.status_code, 302)
+        expense = GroupExpense.objects.get(description='Mint')
+        self.assertEqual(set(expense.included_members.values_list('pk', flat=True)), {asha.pk, ben.pk, chen.pk})
+        self.assertEqual(list(expense.groupexpensesplit_set.values_list('member_id', 'amount')),
+                         [(asha.pk, Decimal('0.01'))])
+
+    def test_invalid_split_is_rejected(self):
+        asha, ben = self.members[:2]
+        session = self.client.session
+        session['entry_email'] = asha.email
+        session.save()
+        response = self.client.post(f'/group/{self.group.pk}/add-expense/', {
+            'payer': asha.pk, 'description': 'Taxi', 'amount': '30.00', 'date': '2026-10-01',
+            'included_members': [asha.pk, ben.pk], 'split_mode': splits.PERCENTAGE,
+            f'split_{asha.pk}': '60', f'split_{ben.pk}': '30',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('100%', response.context['error'])
+        self.assertFalse(GroupExpense.objects.exists())
+
+
+class GroupMembershipTests(FinanceFlowTestCase):
+    def setUp(self):
+        self.owner = Registration.objects.create(name='Owner', email='owner@example.com',
+                                                 phone_no='9999999999', password='Secret#123', address='')
+        self.group = Group.objects.create(name='Office', created_by=self.owner)
+        GroupMember.objects.create(group=self.group, member=self.owner)
+
+    def test_bulk_invite(self):
+        Registration.objects.bulk_create([
+            Registration(name=f'Staff {i}', email=f'staff{i}@example.com', phone_no='9999999999',
+                         password='Secret#123', address='')
+            for i in range(200)
+        ])
+        pasted = 'name,email\n' + '\n'.join(f'Staff {i},Staff{i}@example.com' for i in range(200))
+        emails = membership.parse_emails(pasted) + ['owner@example.com', 'nobody@example.com', 'staff1@example.com',
+                                                    'not-an-email@']
+        with self.assertNumQueries(3):
+            report = membership.invite(self.group, emails)
+
+        statuses = [r.status for r in report]
+        self.assertEqual(statuses.count(membership.ADDED), 200)
+        self.assertEqual(statuses[200:], [membership.ALREADY_MEMBER, membership.NOT_FOUND, membership.DUPLICATE,
+                                          membership.INVALID])
+        self.assertEqual(self.group.members.count(), 201)
+
+    def test_invite_matches_stored_email_case_insensitively(self):
+        pat = Registration.objects.create(name='Pat', email='Pat@Example.com', phone_no='9999999999',
+                                          password='Secret#123', address='')
+        Registration.objects.create(name='Sam', email='SAM@example.com', phone_no='9999999999',
+                                    password='Secret#123', address='')
+        self.assertEqual(pat.email, 'pat@example.com')
+        with self.assertNumQueries(3):
+            report = membership.invite(self.group, ['Pat@Example.com', 'sam@EXAMPLE.com', 'PAT@example.com'])
+        self.assertEqual([r.email for r in report], ['Pat@Example.com', 'sam@EXAMPLE.com', 'PAT@example.com'])
+        self.assertEqual([r.status for r in report], [membership.ADDED, membership.ADDED, membership.DUPLICATE])
+        self.assertEqual(report[0].member, pat)
+        self.assertEqual(self.group.members.count(), 3)
+
+    def test_add_member_page_reports_failures(self):
+        Registration.objects.create(name='Ben', email='ben@example.com', phone_no='9999999999',
+                                    password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.owner.email
+        session.save()
+
+        response = self.client.post(f'/group/{self.group.pk}/add-member/',
+                                    {'member_emails': 'ben@example.com; ghost@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(r.email, r.status) for r in response.context['report']],
+                         [('ben@example.com', membership.ADDED), ('ghost@example.com', membership.NOT_FOUND)])
+        response = self.client.post(f'/group/{self.group.pk}/add-member/', {'member_email': 'Ben@Example.com'})
+        self.assertEqual(response.context['report'][0].status, membership.ALREADY_MEMBER)
+
+
+class SettlementTests(FinanceFlowTestCase):
+    def settled(self, cents, transfers):
+        balances = dict(enumerate(cents))
+        for giver, receiver, amount in transfers:
+            balances[giver] += amount
+            balances[receiver] -= amount
+        return not any(balances.values())
+
+    def test_exact_beats_greedy(self):
+        cents = [400, 300, 300, -600, -400]
+        greedy = settlement.settle(range(5), cents, exact=False)
+        exact = settlement.settle(range(5), cents)
+        self.assertTrue(self.settled(cents, greedy) and self.settled(cents, exact))
+        self.assertEqual((len(greedy), len(exact)), (4, 3))
+
+    def test_large_group(self):
+        rng = random.Random(1)
+        cents = [rng.randint(-50_000, 50_000) for _ in range(599)]
+        cents.append(-sum(cents))
+        transfers = settlement.settle(range(600), cents)
+        self.assertTrue(self.settled(cents, transfers))
+        self.assertLess(len(transfers), 600)
+
+
+class SplitTests(FinanceFlowTestCase):
+    def test_remainders_are_distributed(self):
+        self.assertEqual(splits.compute(splits.EQUAL, Decimal('100.00'), [1, 2, 3]),
+                         {1: Decimal('33.34'), 2: Decimal('33.33'), 3: Decimal('33.33')})
+        self.assertEqual(splits.compute(splits.PERCENTAGE, Decimal('10.00'), [1, 2, 3], {1: '33.3', 2: '33.3', 3: '33.4'}),
+                         {1: Decimal('3.33'), 2: Decimal('3.33'), 3: Decimal('3.34')})
+        self.assertEqual(splits.compute(splits.SHARES, Decimal('0.05'), [1, 2], {1: '1', 2: '0'}), {1: Decimal('0.05')})
+
+    def test_unequal_amounts_must_add_up(self):
+        self.assertEqual(splits.compute(splits.UNEQUAL, Decimal('50.00'), [1, 2], {1: '20', 2: '30.00'}),
+                         {1: Decimal('20.00'), 2: Decimal('30.00')})
+        with self.assertRaises(splits.SplitError):
+            splits.compute(splits.UNEQUAL, Decimal('50.00'), [1, 2], {1: '20', 2: '20'})
+        with self.assertRaises(splits.SplitError):
+            splits.compute(splits.SHARES, Decimal('50.00'), [1, 2], {1: '-1', 2: '2'})
+
+
+class SiteStatsTests(FinanceFlowTestCase):
+    def test_counters_follow_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = Registration.objects.create(name='Stats', email='stats@example.com',
+                                               phone_no='9999999999', password='Secret#123', address='')
+            income = Income.objects.create(user=user, amount=100, description='Salary', currency='INR', category='Job')
+            Expense.objects.create(user=user, amount=30, description='Food', currency='INR', category='Food')
+            Expense.objects.create(user=user, amount=20, description='Bus', currency='INR', category='Travel')
+        with self.captureOnCommitCallbacks(execute=True):
+            income.amount = 150
+            income.save()
+            Expense.objects.get(description='Bus').delete()
+
+        stats = dict(SiteStats.objects.values(*sitestats.FIELDS).get())
+        self.assertEqual(stats, {'user_count': 1, 'income_count': 1, 'income_total': Decimal('150'),
+                                 'expense_count': 1, 'expense_total': Decimal('30')})
+        self.assertEqual(sitestats.reconcile(), stats)
+
+    def test_landing_page_uses_cached_counters(self):
+        sitestats.invalidate()
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/')
+        self.assertEqual(response.context['total_transactions'], 0)
+
+
+class CacheTests(FinanceFlowTestCase):
+    def setUp(self):
+        self.user = Registration.objects.create(name='Cached', email='cached@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+
+    def test_chart_data_is_cached_until_data_changes(self):
+        Expense.objects.create(user=self.user, amount=40, description='Lunch', currency='INR', category='Food')
+        first = self.client.get('/chart-data/', {'type': 'category'}).json()
+        with self.assertNumQueries(2):  # session and user only
+            self.assertEqual(self.client.get('/chart-data/', {'type': 'category'}).json(), first)
+
+        # The version is bumped when the change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(user=self.user, amount=10, description='Bus', currency='INR', category='Travel')
+        self.assertEqual(self.client.get('/chart-data/', {'type': 'category'}).json()['labels'], ['Food', 'Travel'])
+
+    def test_user_fragment_and_purge(self):
+        template = Template('{% load finance_cache %}{% userfragment "greeting" %}{{ value }}{% enduserfragment %}')
+        request = RequestFactory().get('/')
+        request.finance_user = self.user
+        self.assertEqual(template.render(Context({'request': request, 'value': 'first'})), 'first')
+        self.assertEqual(template.render(Context({'request': request, 'value': 'second'})), 'first')
+
+        call_command('finance_cache', 'purge', '--user', self.user.email, stdout=StringIO())
+        self.assertEqual(template.render(Context({'request': request, 'value': 'second'})), 'second')
+
+
+class NotificationConditionalGetTests(FinanceFlowTestCase):
+    """notifications-data answers 304 until the user's own data changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = Registration.objects.create(name='Notified', email='notified@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        self.other = Registration.objects.create(name='Other', email='other@example.com',
+                                                 phone_no='9999999999', password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        Expense.objects.create(user=self.user, amount=40, description='Lunch', currency='INR', category='Food')
+
+    def fetch(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/notifications-data/', headers=headers)
+
+    def test_repeat_request_with_etag_is_not_modified(self):
+        first = self.fetch()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'])
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(2):  # session and user only
+            repeat = self.fetch(first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.content, b'')
+
+    def test_own_write_changes_etag_and_payload(self):
+        first = self.fetch()
+        for model in (Income, Expense):
+            with self.captureOnCommitCallbacks(execute=True):
+                model.objects.create(user=self.user, amount=100, description='Change', currency='INR', category='Misc')
+            fresh = self.fetch(first['ETag'])
+            self.assertEqual(fresh.status_code, 200)
+            self.assertNotEqual(fresh['ETag'], first['ETag'])
+            first = fresh
+        self.assertIn('items', first.json())
+        self.assertEqual(_notification_payload(self.user)['total_income'], 100.0)
+        self.assertEqual(_notification_payload(self.user)['total_expense'], 140.0)
+
+    def test_other_users_write_keeps_cache(self):
+        first = self.fetch()
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(user=self.other, amount=75, description='Taxi', currency='INR', category='Travel')
+        self.assertEqual(self.fetch(first['ETag']).status_code, 304)
+        with self.assertNumQueries(0):
+            self.assertEqual(_notification_payload(self.user)['total_expense'], 40.0)
+
+
+class NotificationStreamTests(FinanceFlowTestCase):
+    """The SSE stream pushes an update when the user's transactions change."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = Registration.objects.create(name='Streamed', email='streamed@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        self.async_client.cookies = self.client.cookies
+
+    def add_expense(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Expense.objects.create(user=self.user, amount=60, description='Cab', currency='INR', category='Travel')
+
+    async def test_update_frame_after_write(self):
+        response = await self.async_client.get('/notifications-stream/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = aiter(response.streaming_content)
+        try:
+            self.assertTrue((await anext(frames)).startswith(b'retry: '))
+            first = await anext(frames)
+            self.assertTrue(first.startswith(b'event: update\n'))
+            self.assertEqual(json.loads(first.split(b'data: ', 1)[1])['total_expense'], 0)
+
+            await sync_to_async(self.add_expense)()
+            frame = await asyncio.wait_for(anext(frames), timeout=5)
+            self.assertTrue(frame.startswith(b'event: update\n'))
+            self.assertEqual(json.loads(frame.split(b'data: ', 1)[1])['total_expense'], 60)
+        finally:
+            await frames.aclose()
+
+    def test_wsgi_and_anonymous_fallbacks(self):
+        self.assertEqual(self.client.get('/notifications-stream/').status_code, 204)
+        self.client.get('/logout/')
+        self.assertEqual(self.client.get('/notifications-stream/').status_code, 401)
+
+
+class RequestTimingTests(FinanceFlowTestCase):
+    def setUp(self):
+        self.user = Registration.objects.create(name='Timed', email='timed@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        Expense.objects.create(user=self.user, amount=40, description='Lunch', currency='INR', category='Food')
+
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs('financeflow.requests', level='INFO') as logs:
+            response = self.client.get('/chart-data/', {'type': 'category'})
+        self.assertRegex(response['Server-Timing'], r'total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries, \d+ rows"')
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['view'], 'chart_data')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['rows'], 0)
+        self.assertNotIn('sql', record)
+
+    @override_settings(FINANCEFLOW_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('financeflow.requests', level='WARNING') as logs:
+            self.client.get('/chart-data/', {'type': 'category'})
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(len(record['sql']), record['queries'])
+        self.assertTrue(any('project_app_registration' in query['sql'] for query in record['sql']))
+
+
+class CalendarIndexTests(FinanceFlowTestCase):
+    def test_keys_are_exact_calendar_buckets(self):
+        self.assertEqual(calendar_index.keys(date(2024, 11, 15), date(2025, 2, 3), calendar_index.MONTH),
+                         [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)])
+        self.assertEqual(calendar_index.trailing(date(2025, 3, 5), 2, calendar_index.WEEK),
+                         [date(2025, 2, 24), date(2025, 3, 3)])
+        self.assertEqual(calendar_index.shift(date(2024, 1, 31), calendar_index.MONTH, -2), date(2023, 11, 1))
+
+    def test_dense_and_rebucket(self):
+        by_day = {date(2025, 3, 2): 5, date(2025, 3, 3): 7, date(2025, 3, 9): 1}
+        weeks = calendar_index.trailing(date(2025, 3, 10), 3, calendar_index.WEEK)
+        self.assertEqual(calendar_index.dense(calendar_index.rebucket(by_day, calendar_index.WEEK), weeks), [5, 8, 0])
+
+    def test_analytics_series_from_bucketed_queries(self):
+        user = Registration.objects.create(name='Charts', email='charts@example.com',
+                                           phone_no='9999999999', password='Secret#123', address='')
+        now = timezone.now()
+        for days_ago, amount in [(0, 10), (1, 20), (1, 5), (3, 40), (200, 99)]:
+            expense = Expense.objects.create(user=user, amount=amount, description='x', currency='INR', category='Food')
+            Expense.objects.filter(pk=expense.pk).update(created_at=now - timedelta(days=days_ago))
+        Income.objects.create(user=user, amount=500, description='Pay', currency='INR', category='Salary')
+        rollups.rebuild(user)
+
+        session = self.client.session
+        session['entry_email'] = user.email
+        session.save()
+        self.client.get('/dashboard/')  # settle session bookkeeping
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/analytics/')
+        self.assertLess(len(queries), 6)
+
+        context = response.context
+        self.assertEqual(context['daily_expense'], [0, 0, 0, 40, 0, 25, 10])
+        self.assertEqual(context['daily_income'], [0, 0, 0, 0, 0, 0, 500])
+        self.assertEqual(sum(context['weekly_expense']), 75)
+        self.assertEqual(context['total_expense'], Decimal('174'))
+        self.assertEqual(context['expense_categories'][0]['total'], Decimal('174'))
+        self.assertEqual(len(context['monthly_expense']), 13)
+
+    @override_settings(FINANCEFLOW_CACHE_POLICIES={'chart-data': 0})
+    def test_monthly_and_balance_charts_share_calendar_months(self):
+        user = Registration.objects.create(name='Months', email='months@example.com',
+                                           phone_no='9999999999', password='Secret#123', address='')
+        today = timezone.localdate()
+        two_months_ago = calendar_index.shift(today, calendar_index.MONTH, -2)
+        income = Income.objects.create(user=user, amount=300, description='Pay', currency='INR', category='Salary')
+        Income.objects.filter(pk=income.pk).update(created_at=timezone.make_aware(
+            datetime.combine(two_months_ago, datetime.min.time())))
+        Expense.objects.create(user=user, amount=120, description='Rent', currency='INR', category='Rent')
+        rollups.rebuild(user)
+
+        session = self.client.session
+        session['entry_email'] = user.email
+        session.save()
+        self.client.get('/chart-data/', {'type': 'category'})
+        with CaptureQueriesContext(connection) as queries:
+            monthly = self.client.get('/chart-data/', {'type': 'monthly'}).json()
+        self.assertEqual(len([q for q in queries if 'dailyrollup' in q['sql']]), 1)
+        balance = self.client.get('/chart-data/', {'type': 'balance'}).json()
+
+        self.assertEqual(monthly['labels'][-1], today.strftime('%B %Y'))
+        self.assertEqual(monthly['labels'][-3], two_months_ago.strftime('%B %Y'))
+        self.assertEqual(monthly['datasets'][0]['data'][-3:], [300, 0, 0])
+        self.assertEqual(monthly['datasets'][1]['data'][-3:], [0, 0, 120])
+        self.assertEqual(balance['labels'], [label[:3] + label[label.index(' '):] for label in monthly['labels']])
+        self.assertEqual(balance['datasets'][0]['data'][-3:], [300, 0, -120])
+
+
+@override_settings(FINANCEFLOW_CACHE_POLICIES={'chart-data': 0})
+class ChartBatchTests(FinanceFlowTestCase):
+    def setUp(self):
+        self.user = Registration.objects.create(name='Batch', email='batch@example.com',
+                                                phone_no='9999999999', password='Secret#123', address='')
+        Expense.objects.create(user=self.user, amount=40, description='Lunch', currency='INR', category='Food')
+        Income.objects.create(user=self.user, amount=900, description='Pay', currency='INR', category='Salary')
+        session = self.client.session
+        session['entry_email'] = self.user.email
+        session.save()
+        self.client.get('/chart-data/', {'type': 'category'})
+
+    def test_batch_matches_single_charts_with_shared_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            batch = self.client.get('/chart-data/batch/', {'charts': 'monthly,category,balance,spending_categories'}).json()
+        # One monthly query and one category query, however many charts use them
+        self.assertEqual(len([q for q in queries if 'dailyrollup' in q['sql']]), 2)
+        for chart_type in ('monthly', 'category', 'balance', 'spending_categories'):
+            self.assertEqual(batch[chart_type], self.client.get('/chart-data/', {'type': chart_type}).json())
+
+    def test_unknown_charts_are_reported_per_chart(self):
+        batch = self.client.get('/chart-data/batch/', {'charts': 'category,nope'}).json()
+        self.assertEqual(batch['category']['labels'], ['Food'])
+        self.assertEqual(batch['nope'], {'error': 'Invalid chart type'})
+        self.assertEqual(self.client.get('/chart-data/batch/').status_code, 400)
+        self.assertEqual(self.client.get('/chart-data/', {'type': 'nope'}).status_code, 400)
+
+    def test_filtered_counters_and_recent_list(self):
+        Expense.objects.create(user=self.user, amount=4000, description='Phone', currency='INR', category='Food')
+        old = Expense.objects.create(user=self.user, amount=60, description='Old lunch', currency='INR', category='Food')
+        Expense.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=60))
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/chart-data/', {'type': 'filtered', 'category': 'Food',
+                                                    'amount_range': '0-1000'}).json()
+        # Session and user, one aggregate per table and one UNION ALL
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(data['transaction_counts']['today'], {'total': 1, 'income': 0.0, 'expense': 40.0})
+        self.assertEqual(data['transaction_counts']['monthly']['total'], 1)
+        self.assertEqual([row['description'] for row in data['recent_transactions']], ['Lunch', 'Old lunch'])
+
+        data = self.client.get('/chart-data/', {'type': 'filtered', 'date_range': 'this_month'}).json()
+        self.assertEqual([row['type'] for row in data['recent_transactions']].count('expense'), 2)
+        self.assertEqual(data['transaction_counts']['today']['income'], 900.0)
@@ -1,28 +1,35 @@
-import csv
+import asyncio
 import json
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.core.paginator import Paginator
 from django.db.models import Sum, Q
-from django.http import JsonResponse, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.db.models import Sum, Count, Value, CharField
-from django.db.models.functions import TruncMonth
-from .models import Registration, Expense, Income, Group, GroupMember, GroupExpense, GroupExpenseSplit
+from django.db.models import Sum, Count, Value, DecimalField, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from .models import (Registration, Expense, Income, Group, GroupMember, GroupExpense, GroupExpenseSplit, GroupBalance,
+                     ReportJob, normalize_email)
+from . import calendar_index, charts, exports, history, jobs, ledger, membership, reporting, rollups, settlement, sitestats, splits
+from .caching import cache_per_user, cached_for_user, data_version, version_timestamp
+from .events import get_hub
+from .middleware import SESSION_USER_ID, clear_finance_user
+from .metrics import compute_period_metrics, category_spike, build_insights, EXPENSE_BUDGET
+from collections import defaultdict
 from itertools import chain
-from operator import attrgetter
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_protect
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import require_http_methods, condition
+from django.utils.cache import patch_cache_control
 from datetime import datetime, date, timedelta
 from django.utils import timezone
 from django.template.loader import render_to_string
-from io import BytesIO
 from functools import wraps
-from django.db import OperationalError
+from django.db import OperationalError, transaction
 from decimal import Decimal
 import calendar
 
@@ -30,7 +37,7 @@ import calendar
 def login_required(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        if 'entry_email' not in request.session:
+        if request.finance_user is None:
             return redirect('login')
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -147,7 +154,7 @@ def lending(request):
 @csrf_protect
 def login(request):
     if request.method == 'POST':
-        email = request.POST.get('email', '').strip()
+        email = normalize_email(request.POST.get('email'))
         password = request.POST.get('password', '')
         
         # Basic validation
@@ -159,6 +166,7 @@ def login(request):
             check_register = Registration.objects.get(email=email)
             if check_register.password == password:
                 request.session['entry_email'] = check_register.email
+                request.session[SESSION_USER_ID] = check_register.pk
                 return redirect('dashboard')
             else:
                 return render(request, 'authentication/login.html', 
@@ -172,8 +180,7 @@ def login(request):
 
 # logout
 def logout(request):
-    if 'entry_email' in request.session:
-        del request.session['entry_email']
+    clear_finance_user(request)
     return redirect('landing')
 
 
@@ -182,12 +189,11 @@ def landing(request):
     if 'entry_email' in request.session:
         return redirect('dashboard')
     
-    # Dynamic stats
-    user_count = Registration.objects.count()
-    total_income_sum = Income.objects.aggregate(total=Sum('amount'))['total'] or 0
-    total_expense_sum = Expense.objects.aggregate(total=Sum('amount'))['total'] or 0
-    money_managed = float(total_income_sum) + float(total_expense_sum)
-    total_transactions = Income.objects.count() + Expense.objects.count()
+    # Dynamic stats, from the SiteStats counters (cached in process)
+    stats = sitestats.current()
+    user_count = stats['user_count']
+    money_managed = float(stats['income_total']) + float(stats['expense_total'])
+    total_transactions = stats['income_count'] + stats['expense_count']
     satisfaction_rate = 90  # default static unless you want to compute from feedback later
 
     context = {
@@ -265,63 +271,35 @@ def dashboard(request):
     recent_transactions = []
     
     if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+        user = request.finance_user
         
         if user:
-            # Calculate total income
-            income_sum = Income.objects.filter(user=user).aggregate(total=Sum('amount'))
-            total_income = income_sum['total'] or 0
-            
-            # Calculate total expense
-            expense_sum = Expense.objects.filter(user=user).aggregate(total=Sum('amount'))
-            total_expense = expense_sum['total'] or 0
-            
-            # Calculate net balance
-            net_balance = total_income - total_expense
+            # All period windows (today/week/month/previous) in one query per table
+            current_date = timezone.localtime()
+            current_month = current_date.strftime('%B %Y')
+            metrics = compute_period_metrics(user, current_date)
+            inc = metrics.income
+            exp = metrics.expense
+
+            total_income = inc.all_time
+            total_expense = exp.all_time
+            net_balance = metrics.net_balance
             
             # Calculate max income and expense for the chart stats
-            max_income = Income.objects.filter(user=user).aggregate(max_amount=Sum('amount'))['max_amount'] or 20239
-            max_expense = Expense.objects.filter(user=user).aggregate(max_amount=Sum('amount'))['max_amount'] or 20239
+            max_income = inc.all_time or 20239
+            max_expense = exp.all_time or 20239
             
-            # Progress tracking calculations
-            current_date = datetime.now()
-            current_month = current_date.strftime('%B %Y')
-            
-            # Get current month's income and expenses
-            current_month_income = Income.objects.filter(
-                user=user,
-                created_at__year=current_date.year,
-                created_at__month=current_date.month
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            current_month_expense = Expense.objects.filter(
-                user=user,
-                created_at__year=current_date.year,
-                created_at__month=current_date.month
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-
-            # Get previous month's income
-            previous_month = current_date.month - 1 if current_date.month > 1 else 12
-            previous_year = current_date.year if current_date.month > 1 else current_date.year - 1
-            previous_income = Income.objects.filter(
-                user=user,
-                created_at__year=previous_year,
-                created_at__month=previous_month
-            ).aggregate(total=Sum('amount'))['total'] or 0
+            # Current and previous month's income and expenses
+            current_month_income = inc.month
+            current_month_expense = exp.month
+            previous_income = inc.prev_month
+            previous_expenses = exp.prev_month
 
             # Calculate income change percent
             income_change_percent = 0.0
             if previous_income and previous_income > 0:
                 income_change_percent = ((total_income - previous_income) / previous_income) * 100
 
-            # Get previous month's expenses
-            previous_expenses = Expense.objects.filter(
-                user=user,
-                created_at__year=previous_year,
-                created_at__month=previous_month
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
             # Calculate expense change percent
             expense_change_percent = 0.0
             if previous_expenses and previous_expenses > 0:
@@ -336,7 +314,7 @@ def dashboard(request):
             
             # Set goals/budgets (you can make these configurable later)
             income_goal = 3100  # $3100 monthly income goal
-            expense_budget = 2500  # $2500 monthly expense budget
+            expense_budget = EXPENSE_BUDGET
             
             # Calculate progress percentages
             income_progress_percentage = min(int((current_month_income / income_goal) * 100), 100)
@@ -360,92 +338,16 @@ def dashboard(request):
             previous_savings_rate = _rate(previous_income, previous_expenses)
             savings_rate_change = savings_rate - previous_savings_rate
 
-            # Get last update timestamps
-            last_income = Income.objects.filter(user=user).order_by('-created_at').first()
-            last_expense = Expense.objects.filter(user=user).order_by('-created_at').first()
-            
-            last_income_update = last_income.created_at if last_income else current_date
-            last_expense_update = last_expense.created_at if last_expense else current_date
-            
             # Transaction calculations for dashboard cards
-            # Today's transactions
-            today_start = current_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            today_end = today_start + timedelta(days=1)
-            
-            today_income = Income.objects.filter(
-                user=user,
-                created_at__gte=today_start,
-                created_at__lt=today_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            today_expense = Expense.objects.filter(
-                user=user,
-                created_at__gte=today_start,
-                created_at__lt=today_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            today_transactions = Income.objects.filter(
-                user=user,
-                created_at__gte=today_start,
-                created_at__lt=today_end
-            ).count() + Expense.objects.filter(
-                user=user,
-                created_at__gte=today_start,
-                created_at__lt=today_end
-            ).count()
-            
-            # Weekly transactions
-            week_start = current_date - timedelta(days=current_date.weekday())
-            week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-            week_end = week_start + timedelta(days=7)
-            
-            weekly_income = Income.objects.filter(
-                user=user,
-                created_at__gte=week_start,
-                created_at__lt=week_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            weekly_expense = Expense.objects.filter(
-                user=user,
-                created_at__gte=week_start,
-                created_at__lt=week_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            weekly_transactions = Income.objects.filter(
-                user=user,
-                created_at__gte=week_start,
-                created_at__lt=week_end
-            ).count() + Expense.objects.filter(
-                user=user,
-                created_at__gte=week_start,
-                created_at__lt=week_end
-            ).count()
-            
-            # Monthly transactions
-            month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            month_end = (month_start + timedelta(days=32)).replace(day=1)
-            
-            monthly_income = Income.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            monthly_expense = Expense.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            monthly_transactions = Income.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).count() + Expense.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).count()
+            today_income = inc.today
+            today_expense = exp.today
+            today_transactions = inc.today_count + exp.today_count
+            weekly_income = inc.week
+            weekly_expense = exp.week
+            weekly_transactions = inc.week_count + exp.week_count
+            monthly_income = inc.month
+            monthly_expense = exp.month
+            monthly_transactions = inc.month_count + exp.month_count
             
             # Sales Report calculations (keeping existing code)
             # Today's sales (income)
@@ -468,8 +370,12 @@ def dashboard(request):
             month_sales_percentage = min(int((month_sales / month_planned_sales) * 100), 100) if month_planned_sales > 0 else 0
             
             # Get recent transactions (last 10)
-            recent_income = Income.objects.filter(user=user).order_by('-created_at')[:5]
-            recent_expense = Expense.objects.filter(user=user).order_by('-created_at')[:5]
+            recent_income = list(Income.objects.filter(user=user).order_by('-created_at')[:5])
+            recent_expense = list(Expense.objects.filter(user=user).order_by('-created_at')[:5])
+
+            # Last update timestamps come from the newest recent rows
+            last_income_update = recent_income[0].created_at if recent_income else current_date
+            last_expense_update = recent_expense[0].created_at if recent_expense else current_date
             
             # Combine and sort recent transactions
             recent_transactions = []
@@ -495,99 +401,8 @@ def dashboard(request):
             # Sort by date (most recent first) and limit to 10
             recent_transactions = sorted(recent_transactions, key=lambda x: x['date'], reverse=True)[:10]
 
-            # Dynamic Insights
-            # 1) Week-over-week spending change
-            prev_week_start = week_start - timedelta(days=7)
-            prev_week_end = week_start
-            prev_week_expense = Expense.objects.filter(
-                user=user,
-                created_at__gte=prev_week_start,
-                created_at__lt=prev_week_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            if prev_week_expense and prev_week_expense > 0:
-                wo_w_change_pct = ((weekly_expense - prev_week_expense) / prev_week_expense) * 100
-                if wo_w_change_pct > 5:
-                    insights.append({
-                        'level': 'info',
-                        'icon': 'bi-lightbulb',
-                        'title': f"This week you spent {wo_w_change_pct:.0f}% more than last week",
-                        'subtitle': 'Consider reviewing your expenses'
-                    })
-                elif wo_w_change_pct < -5:
-                    insights.append({
-                        'level': 'success',
-                        'icon': 'bi-graph-up-arrow',
-                        'title': f"Great! You spent {-wo_w_change_pct:.0f}% less than last week",
-                        'subtitle': 'Nice savings trend'
-                    })
-            else:
-                if weekly_expense > 0:
-                    insights.append({
-                        'level': 'info',
-                        'icon': 'bi-lightbulb',
-                        'title': 'Spending started this week',
-                        'subtitle': 'No spend was recorded last week for comparison'
-                    })
-
-            # 2) Budget pacing vs month progress
-            days_in_month = calendar.monthrange(current_date.year, current_date.month)[1]
-            day_of_month = current_date.day
-            month_progress_pct = (day_of_month / days_in_month) * 100 if days_in_month else 0
-            expected_expense_pct = month_progress_pct
-            if expense_progress_percentage <= expected_expense_pct + 5:
-                insights.append({
-                    'level': 'success',
-                    'icon': 'bi-check-circle',
-                    'title': "You're on track with your budget goals!",
-                    'subtitle': 'Keep up the good work'
-                })
-            else:
-                over_pct = max(0, expense_progress_percentage - expected_expense_pct)
-                insights.append({
-                    'level': 'warning',
-                    'icon': 'bi-exclamation-triangle',
-                    'title': f'Your spending pace is {over_pct:.0f}% ahead of budget',
-                    'subtitle': 'Reduce discretionary expenses to stay on target'
-                })
-
-            # 3) Category spike this month vs previous month
-            current_cat_totals = Expense.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).values('category').annotate(total=Sum('amount'))
-
-            prev_month_start = (month_start - timedelta(days=1)).replace(day=1)
-            prev_month_end = month_start
-            prev_cat_totals = Expense.objects.filter(
-                user=user,
-                created_at__gte=prev_month_start,
-                created_at__lt=prev_month_end
-            ).values('category').annotate(total=Sum('amount'))
-
-            prev_map = {row['category']: row['total'] for row in prev_cat_totals}
-            spike = None
-            for row in current_cat_totals:
-                cat = row['category'] or 'Other'
-                cur = row['total'] or 0
-                prev = prev_map.get(cat, 0) or 0
-                if prev > 0:
-                    change = ((cur - prev) / prev) * 100
-                    if change >= 10 and (not spike or change > spike['change']):
-                        spike = {'category': cat, 'change': change}
-                elif cur > 0 and prev == 0:
-                    # Newly appearing category with spend
-                    if not spike:
-                        spike = {'category': cat, 'change': 100}
-
-            if spike:
-                insights.append({
-                    'level': 'warning',
-                    'icon': 'bi-exclamation-triangle',
-                    'title': f"{spike['category']} expenses increased by {spike['change']:.0f}%",
-                    'subtitle': 'Review recent purchases in this category'
-                })
+            # Dynamic Insights (week-over-week, budget pacing, category spike)
+            insights = build_insights(metrics, category_spike(user, metrics.windows))
     
     context = {
             'user': user,
@@ -647,9 +462,7 @@ def dashboard(request):
 @login_required
 @csrf_protect
 def expense(request):
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if request.method == 'POST':
         amount = request.POST.get('amount')
@@ -713,167 +526,205 @@ def expense(request):
 
 @login_required
 def transaction_history(request):
-    user = None
-    transactions = []
+    """Newest-first income/expense history, one keyset page at a time.
+
+    ``?format=json`` (used for infinite scroll) returns the next page as
+    rendered cards plus ``next_cursor``; pass that back as ``?cursor=``.
+    """
+    user = request.finance_user
     q = (request.GET.get('q') or '').strip()
-    
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
-        
-        if user:
-            # Base querysets
-            incomes_qs = Income.objects.filter(user=user)
-            expenses_qs = Expense.objects.filter(user=user)
-
-            # Apply search filter if provided
-            if q:
-                incomes_qs = incomes_qs.filter(Q(description__icontains=q) | Q(category__icontains=q))
-                expenses_qs = expenses_qs.filter(Q(description__icontains=q) | Q(category__icontains=q))
-
-            # Prepare values for rendering
-            incomes = incomes_qs.annotate(
-                type=Value('income', output_field=CharField())
-            ).values('id', 'amount', 'description', 'date', 'category', 'created_at', 'type', 'user__name')
-            
-            expenses = expenses_qs.annotate(
-                type=Value('expense', output_field=CharField())
-            ).values('id', 'amount', 'description', 'date', 'category', 'created_at', 'type', 'user__name')
-            
-            # Combine and sort by date
-            all_transactions = list(chain(incomes, expenses))
-            
-            # Add author_name field and sort by created_at
-            for transaction in all_transactions:
-                transaction['author_name'] = transaction.get('user__name', user.name)
-            
-            transactions = sorted(all_transactions, key=lambda x: x['created_at'], reverse=True)
-    
+    kind = request.GET.get('type')
+    kinds = [kind] if kind in history.KINDS else None
+    wants_json = request.GET.get('format') == 'json'
+
+    try:
+        transactions, next_cursor = history.history_page(user, q=q, kinds=kinds, cursor=request.GET.get('cursor'))
+    except history.InvalidCursor:
+        if wants_json:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+        transactions, next_cursor = history.history_page(user, q=q, kinds=kinds)
+
+    for row in transactions:
+        # Every row belongs to the logged-in user
+        row['author_name'] = user.name
+
+    if wants_json:
+        return JsonResponse({
+            'transactions': [
+                {
+                    'id': t['id'],
+                    'type': t['type'],
+                    'amount': str(t['amount']),
+                    'description': t['description'],
+                    'category': t['category'],
+                    'date': t['date'].isoformat() if t['date'] else None,
+                    'created_at': t['created_at'].isoformat(),
+                }
+                for t in transactions
+            ],
+            'html': render_to_string('transactions/history_items.html', {'transactions': transactions}, request=request),
+            'next_cursor': next_cursor,
+        })
+
     context = {
         'user': user,
-        'transactions': transactions
+        'transactions': transactions,
+        'next_cursor': next_cursor,
     }
-    
+
     return render(request, 'transactions/history.html', context)
 
 
+def _notifications_etag(request):
+    user = request.finance_user
+    if not user:
+        return None
+    # Insights are relative to today's week/month, so the date is part of the tag
+    return f'"{user.pk}-{data_version(user.pk)}-{timezone.localdate().isoformat()}"'
+
+
+def _notifications_last_modified(request):
+    user = request.finance_user
+    if not user:
+        return None
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(version_timestamp(data_version(user.pk)), today_start)
+
+
+def _notification_payload(user):
+    """Insights plus the dashboard's headline totals, cached under the user's data version."""
+    def _build():
+        # Same period metrics and insights as the dashboard
+        metrics = compute_period_metrics(user)
+        items = build_insights(metrics, category_spike(user, metrics.windows))
+        income, expense = metrics.income, metrics.expense
+        return {
+            'count': len(items),
+            'items': items,
+            'transaction_counts': {
+                'today': {
+                    'total': income.today_count + expense.today_count,
+                    'income': float(income.today),
+                    'expense': float(expense.today),
+                },
+                'weekly': {
+                    'total': income.week_count + expense.week_count,
+                    'income': float(income.week),
+                    'expense': float(expense.week),
+                },
+                'monthly': {
+                    'total': income.month_count + expense.month_count,
+                    'income': float(income.month),
+                    'expense': float(expense.month),
+                },
+            },
+            'total_income': float(income.all_time),
+            'total_expense': float(expense.all_time),
+            'net_balance': float(metrics.net_balance),
+        }
+
+    return cached_for_user(user.pk, f'notification-payload:{timezone.localdate().isoformat()}', _build)
+
+
 @login_required
+@condition(etag_func=_notifications_etag, last_modified_func=_notifications_last_modified)
 def notifications_data(request):
     """Return dynamic insights as notifications for the current user.
     Shape: { count: int, items: [{level, icon, title, subtitle}] }
-    """
-    user = None
-    items = []
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
 
+    Insights are cached under the user's data version and the response
+    carries an ETag/Last-Modified, so unchanged data answers 304.
+    """
+    user = request.finance_user
     if not user:
         return JsonResponse({'count': 0, 'items': []})
 
-    # Compute minimal data needed to generate insights
-    current_date = datetime.now()
-
-    # Weekly expense vs last week
-    week_start = current_date - timedelta(days=current_date.weekday())
-    week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_end = week_start + timedelta(days=7)
-    weekly_expense = Expense.objects.filter(user=user, created_at__gte=week_start, created_at__lt=week_end).aggregate(total=Sum('amount'))['total'] or 0
-    prev_week_start = week_start - timedelta(days=7)
-    prev_week_end = week_start
-    prev_week_expense = Expense.objects.filter(user=user, created_at__gte=prev_week_start, created_at__lt=prev_week_end).aggregate(total=Sum('amount'))['total'] or 0
-    if prev_week_expense and prev_week_expense > 0:
-        wo_w_change_pct = ((weekly_expense - prev_week_expense) / prev_week_expense) * 100
-        if wo_w_change_pct > 5:
-            items.append({'level': 'info', 'icon': 'bi-lightbulb', 'title': f"This week you spent {wo_w_change_pct:.0f}% more than last week", 'subtitle': 'Consider reviewing your expenses'})
-        elif wo_w_change_pct < -5:
-            items.append({'level': 'success', 'icon': 'bi-graph-up-arrow', 'title': f"Great! You spent {-wo_w_change_pct:.0f}% less than last week", 'subtitle': 'Nice savings trend'})
-    elif weekly_expense > 0:
-        items.append({'level': 'info', 'icon': 'bi-lightbulb', 'title': 'Spending started this week', 'subtitle': 'No spend was recorded last week for comparison'})
-
-    # Budget pacing vs month progress
-    # Monthly totals and simple budget constants (keep in sync with dashboard)
-    month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    if current_date.month == 12:
-        month_end = month_start.replace(year=current_date.year + 1, month=1)
-    else:
-        month_end = month_start.replace(month=current_date.month + 1)
-    current_month_expense = Expense.objects.filter(user=user, created_at__gte=month_start, created_at__lt=month_end).aggregate(total=Sum('amount'))['total'] or 0
-    expense_budget = 2500  # same as dashboard
-    expense_progress_percentage = min(int(((current_month_expense or 0) / expense_budget) * 100), 100) if expense_budget > 0 else 0
-    days_in_month = calendar.monthrange(current_date.year, current_date.month)[1]
-    day_of_month = current_date.day
-    month_progress_pct = (day_of_month / days_in_month) * 100 if days_in_month else 0
-    expected_expense_pct = month_progress_pct
-    if expense_progress_percentage <= expected_expense_pct + 5:
-        items.append({'level': 'success', 'icon': 'bi-check-circle', 'title': "You're on track with your budget goals!", 'subtitle': 'Keep up the good work'})
-    else:
-        over_pct = max(0, expense_progress_percentage - expected_expense_pct)
-        items.append({'level': 'warning', 'icon': 'bi-exclamation-triangle', 'title': f'Your spending pace is {over_pct:.0f}% ahead of budget', 'subtitle': 'Reduce discretionary expenses to stay on target'})
-
-    # Category spike vs previous month
-    current_cat_totals = Expense.objects.filter(user=user, created_at__gte=month_start, created_at__lt=month_end).values('category').annotate(total=Sum('amount'))
-    prev_month_start = (month_start - timedelta(days=1)).replace(day=1)
-    prev_month_end = month_start
-    prev_cat_totals = Expense.objects.filter(user=user, created_at__gte=prev_month_start, created_at__lt=prev_month_end).values('category').annotate(total=Sum('amount'))
-    prev_map = {row['category']: row['total'] for row in prev_cat_totals}
-    spike = None
-    for row in current_cat_totals:
-        cat = row['category'] or 'Other'
-        cur = row['total'] or 0
-        prev = prev_map.get(cat, 0) or 0
-        if prev > 0:
-            change = ((cur - prev) / prev) * 100
-            if change >= 10 and (not spike or change > spike['change']):
-                spike = {'category': cat, 'change': change}
-        elif cur > 0 and prev == 0 and not spike:
-            spike = {'category': cat, 'change': 100}
-    if spike:
-        items.append({'level': 'warning', 'icon': 'bi-exclamation-triangle', 'title': f"{spike['category']} expenses increased by {spike['change']:.0f}%", 'subtitle': 'Review recent purchases in this category'})
-
-    return JsonResponse({'count': len(items), 'items': items})
+    payload = _notification_payload(user)
+    response = JsonResponse({'count': payload['count'], 'items': payload['items']})
+    # Let the browser keep the response but revalidate it on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+NOTIFICATION_STREAM_KEEPALIVE = 25  # seconds; below common proxy idle timeouts
+NOTIFICATION_STREAM_RETRY_MS = 5000
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def notifications_stream(request):
+    """Server-Sent Events stream of notifications and dashboard totals.
+
+    One connection per open tab. The first ``update`` event carries the
+    current payload; later ones are sent only when the user's transactions
+    change (published through the event hub by ``signals.py``) or the day
+    rolls over. Served under ASGI (``project/asgi.py``).
+    """
+    user = request.finance_user
+    if user is None:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI an open stream would hold a worker thread per tab. 204
+        # tells EventSource not to reconnect; the page then loads once.
+        return HttpResponse(status=204)
+
+    hub = get_hub()
+    payload_for = sync_to_async(_notification_payload)
+
+    async def events():
+        queue = hub.subscribe(user.pk)
+        try:
+            yield f'retry: {NOTIFICATION_STREAM_RETRY_MS}\n\n'
+            day = timezone.localdate()
+            yield _sse('update', await payload_for(user))
+            while True:
+                try:
+                    await asyncio.wait_for(queue.get(), NOTIFICATION_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if timezone.localdate() == day:
+                        # Comment line keeps proxies from closing an idle connection
+                        yield ': keepalive\n\n'
+                        continue
+                # Collapse a burst of changes (e.g. several deletes) into one update
+                while not queue.empty():
+                    queue.get_nowait()
+                day = timezone.localdate()
+                yield _sse('update', await payload_for(user))
+        finally:
+            hub.unsubscribe(user.pk, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
 def export_profile_data(request):
     """Export the current user's incomes and expenses as a CSV file."""
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     if not user:
         return redirect('login')
 
-    # Prepare CSV response
-    from io import StringIO
-    buffer = StringIO()
-    writer = csv.writer(buffer)
-
-    # Basic user info
-    writer.writerow(['FinanceFlow Export'])
-    writer.writerow(['Name', user.name])
-    writer.writerow(['Email', user.email])
-    writer.writerow([])
-
-    # Incomes
-    writer.writerow(['Incomes'])
-    writer.writerow(['Date', 'Amount', 'Currency', 'Category', 'Description'])
-    for inc in Income.objects.filter(user=user).order_by('-created_at'):
-        writer.writerow([getattr(inc, 'date', getattr(inc, 'created_at', '')),
-                         inc.amount, getattr(inc, 'currency', ''), inc.category, inc.description])
-    writer.writerow([])
-
-    # Expenses
-    writer.writerow(['Expenses'])
-    writer.writerow(['Date', 'Amount', 'Currency', 'Category', 'Description'])
-    for exp in Expense.objects.filter(user=user).order_by('-created_at'):
-        writer.writerow([getattr(exp, 'date', getattr(exp, 'created_at', '')),
-                         exp.amount, getattr(exp, 'currency', ''), exp.category, exp.description])
-
-    content = buffer.getvalue()
-    buffer.close()
-
-    from django.http import HttpResponse
-    resp = HttpResponse(content, content_type='text/csv')
-    resp['Content-Disposition'] = f'attachment; filename="financeflow_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
-    return resp
+    def rows():
+        # Basic user info
+        yield ['FinanceFlow Export']
+        yield ['Name', user.name]
+        yield ['Email', user.email]
+        yield []
+
+        # Incomes, then expenses, read from the database in chunks
+        for title, model in (('Incomes', Income), ('Expenses', Expense)):
+            yield [title]
+            yield ['Date', 'Amount', 'Currency', 'Category', 'Description']
+            yield from exports.iter_rows(model.objects.filter(user=user).order_by('-created_at'),
+                                         'date', 'amount', 'currency', 'category', 'description')
+            yield []
+
+    return exports.stream_csv(rows(), f'financeflow_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
 
 
 @login_required
@@ -883,23 +734,22 @@ def delete_account(request):
     # Detect AJAX vs normal form
     is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     if not user:
         if is_ajax:
             return JsonResponse({'success': False, 'message': 'User not authenticated'}, status=401)
         return redirect('login')
 
     try:
-        # Delete user-related data
-        Income.objects.filter(user=user).delete()
-        Expense.objects.filter(user=user).delete()
-        # Finally delete Registration record
-        user.delete()
+        # Delete user-related data; the daily rollups go with the Registration
+        with transaction.atomic(), rollups.suspended(user.id):
+            sitestats.forget_user_transactions(user)
+            Income.objects.filter(user=user).delete()
+            Expense.objects.filter(user=user).delete()
+            # Finally delete Registration record
+            user.delete()
         # Clear session
-        if 'entry_email' in request.session:
-            del request.session['entry_email']
+        clear_finance_user(request)
 
         if is_ajax:
             return JsonResponse({'success': True, 'message': 'Account deleted successfully.'})
@@ -913,9 +763,7 @@ def delete_account(request):
 @login_required
 @csrf_protect
 def income(request):
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if request.method == 'POST':
         amount = request.POST.get('amount')
@@ -985,7 +833,7 @@ def profile(request):
     net_balance = 0
     
     if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+        user = request.finance_user
         
         if user:
             # Calculate total income
@@ -1084,30 +932,28 @@ def reports(request):
     net_balance = 0
     message = None
     message_type = None
+    report_job = None
     
     if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+        user = request.finance_user
         
         if user:
+            job_id = request.GET.get('job')
+            if job_id and job_id.isdigit():
+                report_job = ReportJob.objects.filter(pk=job_id, user=user).first()
+
             # Get all expenses and incomes for the user
             expenses = Expense.objects.filter(user=user).order_by('-created_at')
             incomes = Income.objects.filter(user=user).order_by('-created_at')
             
-            # Calculate totals
-            total_income = incomes.aggregate(total=Sum('amount'))['total'] or 0
-            total_expense = expenses.aggregate(total=Sum('amount'))['total'] or 0
+            # Calculate totals (from the daily rollups)
+            total_income = rollups.total(user, rollups.INCOME)
+            total_expense = rollups.total(user, rollups.EXPENSE)
             net_balance = total_income - total_expense
             
             # Get category-wise breakdowns
-            expense_categories = expenses.values('category').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('-total')
-            
-            income_categories = incomes.values('category').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('-total')
+            expense_categories = rollups.by_category(user, rollups.EXPENSE)
+            income_categories = rollups.by_category(user, rollups.INCOME)
             
             # Calculate current and previous 30-day periods for dynamic KPIs
             end_date = timezone.now()
@@ -1116,24 +962,12 @@ def reports(request):
             prev_end = current_start - timedelta(seconds=1)
 
             # Current period sums (last 30 days)
-            current_income_sum = Income.objects.filter(
-                user=user,
-                created_at__range=[current_start, end_date]
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            current_expense_sum = Expense.objects.filter(
-                user=user,
-                created_at__range=[current_start, end_date]
-            ).aggregate(total=Sum('amount'))['total'] or 0
+            current_income_sum = rollups.total(user, rollups.INCOME, current_start)
+            current_expense_sum = rollups.total(user, rollups.EXPENSE, current_start)
 
             # Previous period sums (30-60 days ago)
-            previous_income = Income.objects.filter(
-                user=user,
-                created_at__range=[prev_start, prev_end]
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            previous_expenses = Expense.objects.filter(
-                user=user,
-                created_at__range=[prev_start, prev_end]
-            ).aggregate(total=Sum('amount'))['total'] or 0
+            previous_income = rollups.total(user, rollups.INCOME, prev_start, current_start)
+            previous_expenses = rollups.total(user, rollups.EXPENSE, prev_start, current_start)
 
             # Dynamic KPIs
             def _rate(income, expense):
@@ -1159,24 +993,15 @@ def reports(request):
             # Calculate previous period data for comparison
             end_date = timezone.now()
             previous_period_start = end_date - timedelta(days=30)
-            previous_period_end = end_date - timedelta(days=1)
-            
-            previous_income = Income.objects.filter(
-                user=user,
-                created_at__range=[previous_period_start, previous_period_end]
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            previous_expenses = Expense.objects.filter(
-                user=user,
-                created_at__range=[previous_period_start, previous_period_end]
-            ).aggregate(total=Sum('amount'))['total'] or 0
+
+            # Up to (and including) yesterday
+            previous_income = rollups.total(user, rollups.INCOME, previous_period_start, end_date)
+            previous_expenses = rollups.total(user, rollups.EXPENSE, previous_period_start, end_date)
             
             # Calculate balance for comparison
             balance = net_balance
 
-            # Build dynamic recent reports with computed sizes (CSV simulation)
-            import io as _io
-
+            # Recent report cards with their CSV sizes, estimated from aggregates
             def _format_size(n_bytes: int) -> str:
                 try:
                     if n_bytes >= 1024 * 1024:
@@ -1187,47 +1012,28 @@ def reports(request):
                 except Exception:
                     return "-"
 
-            def _csv_size_for(queryset, kind: str) -> int:
-                # Build a CSV in-memory similar to generate_report()
-                header = ['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date']
-                buf = _io.StringIO()
-                w = csv.writer(buf)
-                w.writerow(header)
-                for obj in queryset:
-                    w.writerow([
-                        kind,
-                        float(obj.amount),
-                        obj.category,
-                        obj.description,
-                        obj.currency,
-                        obj.created_at.strftime('%Y-%m-%d %H:%M')
-                    ])
-                return len(buf.getvalue().encode('utf-8'))
-
             # time windows for these sample recent reports
             gen_dt = timezone.now()
             last30_start = gen_dt - timedelta(days=30)
-            last30_incomes = Income.objects.filter(user=user, created_at__range=[last30_start, gen_dt]).order_by('-created_at')
-            last30_expenses = Expense.objects.filter(user=user, created_at__range=[last30_start, gen_dt]).order_by('-created_at')
-
-            income_csv_bytes = _csv_size_for(last30_incomes, 'Income')
-            expense_csv_bytes = _csv_size_for(last30_expenses, 'Expense')
-
-            # Balance report uses both incomes and expenses
-            buf_bal = _io.StringIO()
-            w_bal = csv.writer(buf_bal)
-            w_bal.writerow(['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date'])
-            for obj in last30_incomes:
-                w_bal.writerow(['Income', float(obj.amount), obj.category, obj.description, obj.currency, obj.created_at.strftime('%Y-%m-%d %H:%M')])
-            for obj in last30_expenses:
-                w_bal.writerow(['Expense', float(obj.amount), obj.category, obj.description, obj.currency, obj.created_at.strftime('%Y-%m-%d %H:%M')])
-            balance_csv_bytes = len(buf_bal.getvalue().encode('utf-8'))
+            size_stats = reporting.size_statistics(user, last30_start, gen_dt)
+
+            def _report_size(report_type, kinds):
+                # Real size of the last download of this report, else an estimate
+                known = reporting.known_report_size(user.pk, report_type, 'Last 30 days', 'CSV')
+                if known is not None:
+                    return known
+                preamble = reporting.report_preamble(report_type, 'Last 30 days', gen_dt)
+                return reporting.estimate_csv_size(size_stats, kinds, preamble=preamble)
+
+            income_csv_bytes = _report_size('Income Report', ['Income'])
+            expense_csv_bytes = _report_size('Expense Report', ['Expense'])
+            balance_csv_bytes = _report_size('Balance Report', ['Income', 'Expense'])
 
             # Custom report example: top expense category in last 30 days
-            top_cat_row = last30_expenses.values('category').annotate(total=Sum('amount')).order_by('-total').first()
+            expense_stats = [row for row in size_stats if row['kind'] == 'Expense']
+            top_cat_row = max(expense_stats, key=lambda row: row['total'] or 0, default=None)
             top_cat = (top_cat_row or {}).get('category', 'All')
-            custom_qs = last30_expenses if top_cat == 'All' else last30_expenses.filter(category=top_cat)
-            custom_csv_bytes = _csv_size_for(custom_qs, 'Expense')
+            custom_csv_bytes = reporting.estimate_csv_size(size_stats, ['Expense'], None if top_cat == 'All' else top_cat)
 
             recent_reports = [
                 {
@@ -1272,6 +1078,8 @@ def reports(request):
         'message': message,
         'message_type': message_type,
         'recent_reports': recent_reports if 'recent_reports' in locals() else [],
+        # Background PDF render the user is waiting for (?job=<id>)
+        'report_job': report_job,
         # Dynamic KPIs for Reports page
         'savings_rate_report': savings_rate_report if 'savings_rate_report' in locals() else 0,
         'savings_rate_change_report': savings_rate_change_report if 'savings_rate_change_report' in locals() else 0,
@@ -1286,9 +1094,7 @@ def generate_report(request):
     if request.method not in ('POST', 'GET'):
         return redirect('reports')
     
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if not user:
         return HttpResponse('Unauthorized', status=401)
@@ -1300,271 +1106,180 @@ def generate_report(request):
     
     # Calculate date range based on selection
     end_date = timezone.now()
-    if date_range == 'Last 7 days':
-        start_date = end_date - timedelta(days=7)
-    elif date_range == 'Last 30 days':
-        start_date = end_date - timedelta(days=30)
-    elif date_range == 'Last 3 months':
-        start_date = end_date - timedelta(days=90)
-    elif date_range == 'Last 6 months':
-        start_date = end_date - timedelta(days=180)
-    elif date_range == 'Last year':
-        start_date = end_date - timedelta(days=365)
-    else:
-        start_date = end_date - timedelta(days=7)  # Default to last 7 days
-    
-    # Filter data based on date range
-    incomes = Income.objects.filter(
-        user=user,
-        created_at__range=[start_date, end_date]
-    ).order_by('-created_at')
-    
-    expenses = Expense.objects.filter(
-        user=user,
-        created_at__range=[start_date, end_date]
-    ).order_by('-created_at')
-    
-    # Build rows once, reuse for CSV/Excel/JSON
-    rows = []
-    header = ['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date']
-    if report_type == 'Income Report':
-        for income in incomes:
-            rows.append([
-                'Income',
-                float(income.amount),
-                income.category,
-                income.description,
-                income.currency,
-                income.created_at.strftime('%Y-%m-%d %H:%M')
-            ])
-    elif report_type == 'Expense Report':
-        for expense in expenses:
-            rows.append([
-                'Expense',
-                float(expense.amount),
-                expense.category,
-                expense.description,
-                expense.currency,
-                expense.created_at.strftime('%Y-%m-%d %H:%M')
-            ])
-    else:  # Balance Report
-        for income in incomes:
-            rows.append([
-                'Income',
-                float(income.amount),
-                income.category,
-                income.description,
-                income.currency,
-                income.created_at.strftime('%Y-%m-%d %H:%M')
-            ])
-        for expense in expenses:
-            rows.append([
-                'Expense',
-                float(expense.amount),
-                expense.category,
-                expense.description,
-                expense.currency,
-                expense.created_at.strftime('%Y-%m-%d %H:%M')
-            ])
+    start_date = reporting.report_start(date_range, end_date)
+    header = reporting.REPORT_HEADER
+
+    def report_rows():
+        # Rows are produced lazily so CSV/Excel/JSON can stream them
+        return reporting.report_rows(user, report_type, start_date, end_date)
 
     if format_type == 'CSV':
         # Generate CSV report
-        response = HttpResponse(content_type='text/csv')
         filename = f"{report_type.replace(' ', '_')}_{date_range.replace(' ', '_')}_{end_date.strftime('%Y%m%d')}.csv"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(['Report Type', report_type])
-        writer.writerow(['Date Range', date_range])
-        writer.writerow(['Generated On', end_date.strftime('%Y-%m-%d %H:%M')])
-        writer.writerow([])
-        writer.writerow(header)
-        writer.writerows(rows)
-        return response
+
+        def csv_rows():
+            yield from reporting.report_preamble(report_type, date_range, end_date)
+            yield header
+            yield from report_rows()
+
+        def remember_size(size):
+            # Shown on the Reports page instead of the estimate
+            reporting.remember_report_size(user.pk, report_type, date_range, 'CSV', size)
+
+        return exports.stream_csv(csv_rows(), filename, on_complete=remember_size)
 
     elif format_type == 'Excel':
         # Return Excel-friendly CSV (Excel opens CSV natively)
-        response = HttpResponse(content_type='application/vnd.ms-excel')
         filename = f"{report_type.replace(' ', '_')}_{date_range.replace(' ', '_')}_{end_date.strftime('%Y%m%d')}.csv"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        writer = csv.writer(response)
-        writer.writerow(header)
-        writer.writerows(rows)
-        return response
+        return exports.stream_csv(chain([header], report_rows()), filename, content_type='application/vnd.ms-excel')
 
     elif format_type == 'JSON':
-        payload = {
+        fields = {
             'report_type': report_type,
             'date_range': date_range,
             'generated_on': end_date.strftime('%Y-%m-%d %H:%M'),
             'columns': header,
-            'rows': rows,
         }
-        data = json.dumps(payload, indent=2)
-        response = HttpResponse(data, content_type='application/json')
         filename = f"{report_type.replace(' ', '_')}_{date_range.replace(' ', '_')}_{end_date.strftime('%Y%m%d')}.json"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
-
+        return exports.stream_json(exports.json_document(fields, 'rows', report_rows()), filename)
 
-    
     elif format_type == 'PDF':
         # Attempt to generate a real PDF using xhtml2pdf (pisa)
         try:
-            from xhtml2pdf import pisa
+            from xhtml2pdf import pisa  # noqa: F401
         except Exception:
             html = render_to_string('reports/pdf_report.html', {
                 'user': user,
                 'report_type': report_type,
                 'date_range': date_range,
                 'generated_on': end_date,
-                'header': ['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date'],
-                'rows': rows,
+                'header': header,
+                'rows': list(report_rows()),
                 'pdf_notice': 'xhtml2pdf is not installed. Please install it to enable direct PDF download.'
             })
             return HttpResponse(html)
 
-        html = render_to_string('reports/pdf_report.html', {
-            'user': user,
+        # Rendering takes seconds on large reports: hand it to the job queue
+        filename = f"{report_type.replace(' ', '_')}_{date_range.replace(' ', '_')}_{end_date.strftime('%Y%m%d')}.pdf"
+        job = jobs.enqueue(user, 'report', {
             'report_type': report_type,
             'date_range': date_range,
-            'generated_on': end_date,
-            'header': ['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date'],
-            'rows': rows,
-            'pdf_notice': ''
-        })
-        result = BytesIO()
-        pdf = pisa.CreatePDF(src=html, dest=result)
-        if pdf.err:
-            return HttpResponse('Failed to generate PDF.', content_type='text/plain', status=500)
-        filename = f"{report_type.replace(' ', '_')}_{date_range.replace(' ', '_')}_{end_date.strftime('%Y%m%d')}.pdf"
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+            'end_date': end_date.isoformat(),
+        }, filename)
+        return _report_job_accepted(request, job)
     
     else:
         # PDF or other non-implemented formats
         return HttpResponse('PDF generation is not yet implemented. Please choose CSV, Excel or JSON.', content_type='text/plain')
 
 
+def _report_job_payload(job):
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'filename': job.filename,
+        'error': job.error,
+        'status_url': reverse('report_job_status', args=[job.pk]),
+        'download_url': reverse('report_job_download', args=[job.pk]) if job.status == ReportJob.DONE else None,
+    }
+
+
+def _report_job_accepted(request, job):
+    """Answer a queued render: JSON for scripts, else back to Reports to wait for it."""
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse(_report_job_payload(job), status=202)
+    return redirect(f"{reverse('reports')}?job={job.pk}")
+
+
+@login_required
+def report_job_status(request, job_id):
+    """Status of a queued report render."""
+    job = get_object_or_404(ReportJob, pk=job_id, user=request.finance_user)
+    return JsonResponse(_report_job_payload(job))
+
+
+@login_required
+def report_job_download(request, job_id):
+    """Download a rendered report."""
+    job = get_object_or_404(ReportJob, pk=job_id, user=request.finance_user, status=ReportJob.DONE)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename)
+
+
 @login_required
 def export_report(request):
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     if not user:
         return HttpResponse('Unauthorized', status=401)
 
-    # Prepare CSV
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="finance_report.csv"'
-    writer = csv.writer(response)
-
-    # Write headers
-    writer.writerow(['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date'])
-
-    # Write incomes
-    incomes = Income.objects.filter(user=user).order_by('-created_at')
-    for income in incomes:
-        writer.writerow([
-            'Income',
-            income.amount,
-            income.category,
-            income.description,
-            income.currency,
-            income.created_at.strftime('%Y-%m-%d %H:%M')
-        ])
-
-    # Write expenses
-    expenses = Expense.objects.filter(user=user).order_by('-created_at')
-    for expense in expenses:
-        writer.writerow([
-            'Expense',
-            expense.amount,
-            expense.category,
-            expense.description,
-            expense.currency,
-            expense.created_at.strftime('%Y-%m-%d %H:%M')
-        ])
-
-    return response
-
+    def rows():
+        yield ['Type', 'Amount', 'Category', 'Description', 'Currency', 'Date']
+        # Incomes, then expenses, read from the database in chunks
+        for label, model in (('Income', Income), ('Expense', Expense)):
+            for amount, category, description, currency, created_at in exports.iter_rows(
+                model.objects.filter(user=user).order_by('-created_at'),
+                'amount', 'category', 'description', 'currency', 'created_at'
+            ):
+                yield [label, amount, category, description, currency, created_at.strftime('%Y-%m-%d %H:%M')]
 
+    return exports.stream_csv(rows(), 'finance_report.csv')
 
 
 @login_required
 def analytics(request):
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
-    
-    # Get date range (last 12 months)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365)
-    
-    # Monthly income and expense data
-    monthly_income = Income.objects.filter(
-        user=user,
-        created_at__range=[start_date, end_date]
-    ).annotate(
-        month=TruncMonth('created_at')
-    ).values('month').annotate(
-        total=Sum('amount')
-    ).order_by('month')
-    
-    monthly_expense = Expense.objects.filter(
-        user=user,
-        created_at__range=[start_date, end_date]
-    ).annotate(
-        month=TruncMonth('created_at')
-    ).values('month').annotate(
-        total=Sum('amount')
-    ).order_by('month')
+    user = request.finance_user
     
-    # Category breakdown
-    income_categories = Income.objects.filter(user=user).values('category').annotate(
-        total=Sum('amount')
-    ).order_by('-total')
+    today = datetime.now().date()
+    MONTH, WEEK, DAY = calendar_index.MONTH, calendar_index.WEEK, calendar_index.DAY
+    current_month_start = calendar_index.floor(today, MONTH)
+    previous_month_start = calendar_index.shift(current_month_start, MONTH, -1)
+
+    # Every (kind, category, month) total in one query: the monthly series,
+    # summary figures and category breakdowns below are all sums of these rows
+    month_rows = list(rollups.by_bucket(user, MONTH, fields=['category']))
+
+    def monthly_totals(kind):
+        return calendar_index.totals(row for row in month_rows if row['kind'] == kind)
+
+    def category_totals(kind, month=None):
+        """Category totals (``category``, ``total``, ``count``), largest first."""
+        totals = {}
+        for row in month_rows:
+            if row['kind'] == kind and (month is None or calendar_index.as_key(row['bucket']) == month):
+                entry = totals.setdefault(row['category'], {'category': row['category'], 'total': 0, 'count': 0})
+                entry['total'] += row['total']
+                entry['count'] += row['count']
+        return sorted(totals.values(), key=lambda entry: entry['total'], reverse=True)
+
+    income_by_month = monthly_totals(rollups.INCOME)
+    expense_by_month = monthly_totals(rollups.EXPENSE)
+
+    # Monthly income and expense data (last 12 months and this one)
+    months = calendar_index.keys(today - timedelta(days=365), today, MONTH)
+    monthly_income = [{'month': month, 'total': income_by_month.get(month, 0)} for month in months]
+    monthly_expense = [{'month': month, 'total': expense_by_month.get(month, 0)} for month in months]
     
-    expense_categories = Expense.objects.filter(user=user).values('category').annotate(
-        total=Sum('amount')
-    ).order_by('-total')
+    # Category breakdown
+    income_categories = category_totals(rollups.INCOME)
+    expense_categories = category_totals(rollups.EXPENSE)
     
     # Recent transactions
     recent_income = Income.objects.filter(user=user).order_by('-created_at')[:5]
     recent_expense = Expense.objects.filter(user=user).order_by('-created_at')[:5]
     
     # Summary statistics
-    total_income = Income.objects.filter(user=user).aggregate(total=Sum('amount'))['total'] or 0
-    total_expense = Expense.objects.filter(user=user).aggregate(total=Sum('amount'))['total'] or 0
+    total_income = sum(income_by_month.values())
+    total_expense = sum(expense_by_month.values())
     net_balance = total_income - total_expense
     
     # Previous month data for comparison
-    previous_month = end_date.replace(day=1) - timedelta(days=1)
-    previous_month_start = previous_month.replace(day=1)
-    
-    previous_income = Income.objects.filter(
-        user=user,
-        created_at__range=[previous_month_start, previous_month]
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    previous_expenses = Expense.objects.filter(
-        user=user,
-        created_at__range=[previous_month_start, previous_month]
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    previous_income = income_by_month.get(previous_month_start, 0)
+    previous_expenses = expense_by_month.get(previous_month_start, 0)
     
     previous_balance = previous_income - previous_expenses
     
     # Current month data
-    current_month_start = end_date.replace(day=1)
-    current_income = Income.objects.filter(
-        user=user,
-        created_at__range=[current_month_start, end_date]
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    current_expenses = Expense.objects.filter(
-        user=user,
-        created_at__range=[current_month_start, end_date]
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    current_income = income_by_month.get(current_month_start, 0)
+    current_expenses = expense_by_month.get(current_month_start, 0)
     
     balance = current_income - current_expenses
 
@@ -1584,18 +1299,10 @@ def analytics(request):
 
     # Build dynamic Expense Analysis & Saving Tips using current vs previous month
     # Current month category totals
-    current_cats = Expense.objects.filter(
-        user=user,
-        created_at__gte=current_month_start,
-        created_at__lt=end_date
-    ).values('category').annotate(total=Sum('amount')).order_by('-total')
+    current_cats = category_totals(rollups.EXPENSE, current_month_start)
 
     # Previous month category totals
-    prev_cats = Expense.objects.filter(
-        user=user,
-        created_at__gte=previous_month_start,
-        created_at__lt=previous_month
-    ).values('category').annotate(total=Sum('amount')).order_by('-total')
+    prev_cats = category_totals(rollups.EXPENSE, previous_month_start)
 
     prev_map = {row['category'] or 'Other': float(row['total'] or 0) for row in prev_cats}
     cur_map = {row['category'] or 'Other': float(row['total'] or 0) for row in current_cats}
@@ -1653,57 +1360,25 @@ def analytics(request):
                 'lines': ['Freelance opportunities', 'Skill development', 'Investment income']
             })
 
-    # Daily data (last 7 days)
-    today = datetime.now().date()
-    daily_income = []
-    daily_expense = []
-    
-    for i in range(7):
-        day = today - timedelta(days=6-i)
-        day_income = Income.objects.filter(
-            user=user,
-            created_at__date=day
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        day_expense = Expense.objects.filter(
-            user=user,
-            created_at__date=day
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        daily_income.append(float(day_income))
-        daily_expense.append(float(day_expense))
-    
-    # Weekly data (last 4 weeks)
-    weekly_income = []
-    weekly_expense = []
-    
-    for i in range(4):
-        week_end = today - timedelta(days=7*i)
-        week_start = week_end - timedelta(days=6)
-        
-        week_income = Income.objects.filter(
-            user=user,
-            created_at__date__range=[week_start, week_end]
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        week_expense = Expense.objects.filter(
-            user=user,
-            created_at__date__range=[week_start, week_end]
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        weekly_income.insert(0, float(week_income))
-        weekly_expense.insert(0, float(week_expense))
+    # Daily data (last 7 days) and weekly data (last 4 weeks, Monday to
+    # Sunday), both from one query of daily totals
+    days = calendar_index.trailing(today, 7, DAY)
+    weeks = calendar_index.trailing(today, 4, WEEK)
+    day_rows = list(rollups.by_bucket(user, DAY, start=weeks[0]))
+    income_by_day = calendar_index.totals(row for row in day_rows if row['kind'] == rollups.INCOME)
+    expense_by_day = calendar_index.totals(row for row in day_rows if row['kind'] == rollups.EXPENSE)
+
+    daily_income = [float(total) for total in calendar_index.dense(income_by_day, days)]
+    daily_expense = [float(total) for total in calendar_index.dense(expense_by_day, days)]
+    weekly_income = [float(total) for total in
+                     calendar_index.dense(calendar_index.rebucket(income_by_day, WEEK), weeks)]
+    weekly_expense = [float(total) for total in
+                      calendar_index.dense(calendar_index.rebucket(expense_by_day, WEEK), weeks)]
 
     # Simple ML-like predictions based on recent monthly trends
-    # Build last 6 month expense totals (floats)
-    recent_months = []
-    recent_expenses_list = []
-    for i in range(1, 7):
-        m_end = end_date.replace(day=1) - timedelta(days=30*(i-1))
-        m_start = (m_end - timedelta(days=1)).replace(day=1)
-        total_m_exp = Expense.objects.filter(user=user, created_at__gte=m_start, created_at__lt=m_end).aggregate(total=Sum('amount'))['total'] or 0
-        recent_months.append(m_start.strftime('%b %Y'))
-        recent_expenses_list.append(float(total_m_exp))
+    # Last 6 complete months of expenses, most recent first (floats)
+    prediction_months = [calendar_index.shift(current_month_start, MONTH, -i) for i in range(1, 7)]
+    recent_expenses_list = [float(total) for total in calendar_index.dense(expense_by_month, prediction_months)]
 
     # Prediction = average of last 3 months (fallback to 0)
     last3 = recent_expenses_list[:3] if recent_expenses_list else []
@@ -1792,372 +1467,71 @@ def analytics(request):
     return render(request, 'analytics/analytics.html', context)
 
 
+@cache_per_user('chart-data')
 def chart_data(request):
     """API endpoint to get chart data"""
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if not user:
         return JsonResponse({'error': 'User not authenticated'}, status=401)
     
     chart_type = request.GET.get('type', 'monthly')
-    
-    if chart_type == 'monthly':
-        # Get last 12 months data
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        
-        monthly_income = Income.objects.filter(
-            user=user,
-            created_at__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('created_at')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        
-        monthly_expense = Expense.objects.filter(
-            user=user,
-            created_at__range=[start_date, end_date]
-        ).annotate(
-            month=TruncMonth('created_at')
-        ).values('month').annotate(
-            total=Sum('amount')
-        ).order_by('month')
-        
-        # Format data for Chart.js
-        months = []
-        income_data = []
-        expense_data = []
-        
-        # Create a complete 12-month dataset
-        for i in range(12):
-            date = end_date - timedelta(days=30*i)
-            month_key = date.strftime('%Y-%m')
-            months.insert(0, date.strftime('%B %Y'))
-            
-            # Find income for this month
-            income_amount = 0
-            for item in monthly_income:
-                if item['month'].strftime('%Y-%m') == month_key:
-                    income_amount = float(item['total'])
-                    break
-            income_data.insert(0, income_amount)
-            
-            # Find expense for this month
-            expense_amount = 0
-            for item in monthly_expense:
-                if item['month'].strftime('%Y-%m') == month_key:
-                    expense_amount = float(item['total'])
-                    break
-            expense_data.insert(0, expense_amount)
-        
-        return JsonResponse({
-            'labels': months,
-            'datasets': [
-                {
-                    'label': 'Income',
-                    'data': income_data,
-                    'borderColor': '#10b981',
-                    'backgroundColor': 'rgba(16, 185, 129, 0.1)',
-                    'tension': 0.4
-                },
-                {
-                    'label': 'Expense',
-                    'data': expense_data,
-                    'borderColor': '#ef4444',
-                    'backgroundColor': 'rgba(239, 68, 68, 0.1)',
-                    'tension': 0.4
-                }
-            ]
-        })
-    
-    elif chart_type == 'category' or chart_type == 'categories':
-        # Category breakdown data
-        income_categories = Income.objects.filter(user=user).values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        expense_categories = Expense.objects.filter(user=user).values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        # Return data in the format expected by the dashboard chart
-        if expense_categories:
-            return JsonResponse({
-                'labels': [item['category'] for item in expense_categories],
-                'datasets': [{
-                    'data': [float(item['total']) for item in expense_categories]
-                }]
-            })
-        else:
-            # Return empty data if no expenses found
-            return JsonResponse({
-                'labels': ['No Data'],
-                'datasets': [{
-                    'data': [0]
-                }]
-            })
-    
-    elif chart_type == 'income_sources':
-        # Income sources breakdown data
-        income_sources = Income.objects.filter(user=user).values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        return JsonResponse({
-            'labels': [item['category'] for item in income_sources],
-            'data': [float(item['total']) for item in income_sources]
-        })
-    
-    elif chart_type == 'spending_categories':
-        # Spending categories breakdown data
-        spending_categories = Expense.objects.filter(user=user).values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
-        
-        return JsonResponse({
-            'labels': [item['category'] for item in spending_categories],
-            'data': [float(item['total']) for item in spending_categories]
-        })
-    
-    elif chart_type == 'balance':
-        # Balance trend data - calculate monthly balance (income - expenses)
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)
-        
-        # Get monthly data for the last 12 months
-        monthly_data = []
-        labels = []
-        
-        for i in range(12):
-            month_start = (end_date.replace(day=1) - timedelta(days=30*i)).replace(day=1)
-            if month_start.month == 12:
-                month_end = month_start.replace(year=month_start.year + 1, month=1)
-            else:
-                month_end = month_start.replace(month=month_start.month + 1)
-            
-            # Calculate income for this month
-            monthly_income = Income.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            # Calculate expenses for this month
-            monthly_expense = Expense.objects.filter(
-                user=user,
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).aggregate(total=Sum('amount'))['total'] or 0
-            
-            # Calculate balance
-            balance = float(monthly_income) - float(monthly_expense)
-            monthly_data.insert(0, balance)
-            labels.insert(0, month_start.strftime('%b %Y'))
-        
-        return JsonResponse({
-            'labels': labels,
-            'datasets': [{
-                'label': 'Balance',
-                'data': monthly_data,
-                'borderColor': '#3B82F6',
-                'backgroundColor': 'rgba(59, 130, 246, 0.1)',
-                'tension': 0.4,
-                'fill': True
-            }]
-        })
-    
-    elif chart_type == 'filtered':
-        # Handle filtered dashboard data
-        date_range = request.GET.get('date_range', 'all')
-        category = request.GET.get('category', 'all')
-        amount_range = request.GET.get('amount_range', 'all')
-        
-        # Build filters
-        income_filters = {'user': user}
-        expense_filters = {'user': user}
-        
-        # Apply date range filter
-        current_date = datetime.now()
-        if date_range == 'today':
-            start_date = current_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=1)
-            income_filters['created_at__gte'] = start_date
-            income_filters['created_at__lt'] = end_date
-            expense_filters['created_at__gte'] = start_date
-            expense_filters['created_at__lt'] = end_date
-        elif date_range == 'this_week':
-            start_date = current_date - timedelta(days=current_date.weekday())
-            start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=7)
-            income_filters['created_at__gte'] = start_date
-            income_filters['created_at__lt'] = end_date
-            expense_filters['created_at__gte'] = start_date
-            expense_filters['created_at__lt'] = end_date
-        elif date_range == 'this_month':
-            start_date = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            if current_date.month == 12:
-                end_date = start_date.replace(year=current_date.year + 1, month=1)
-            else:
-                end_date = start_date.replace(month=current_date.month + 1)
-            income_filters['created_at__gte'] = start_date
-            income_filters['created_at__lt'] = end_date
-            expense_filters['created_at__gte'] = start_date
-            expense_filters['created_at__lt'] = end_date
-        elif date_range == 'last_3_months':
-            end_date = current_date
-            start_date = current_date - timedelta(days=90)
-            income_filters['created_at__gte'] = start_date
-            income_filters['created_at__lte'] = end_date
-            expense_filters['created_at__gte'] = start_date
-            expense_filters['created_at__lte'] = end_date
-        
-        # Apply category filter
-        if category != 'all':
-            income_filters['category'] = category
-            expense_filters['category'] = category
-        
-        # Get filtered data
-        filtered_income = Income.objects.filter(**income_filters)
-        filtered_expense = Expense.objects.filter(**expense_filters)
-        
-        # Apply amount range filter
-        if amount_range != 'all':
-            if amount_range == '0-1000':
-                filtered_income = filtered_income.filter(amount__gte=0, amount__lte=1000)
-                filtered_expense = filtered_expense.filter(amount__gte=0, amount__lte=1000)
-            elif amount_range == '1000-5000':
-                filtered_income = filtered_income.filter(amount__gt=1000, amount__lte=5000)
-                filtered_expense = filtered_expense.filter(amount__gt=1000, amount__lte=5000)
-            elif amount_range == '5000-10000':
-                filtered_income = filtered_income.filter(amount__gt=5000, amount__lte=10000)
-                filtered_expense = filtered_expense.filter(amount__gt=5000, amount__lte=10000)
-            elif amount_range == '10000+':
-                filtered_income = filtered_income.filter(amount__gt=10000)
-                filtered_expense = filtered_expense.filter(amount__gt=10000)
-        
-        # Calculate transaction counts
-        today_income_count = filtered_income.filter(created_at__date=current_date.date()).count()
-        today_expense_count = filtered_expense.filter(created_at__date=current_date.date()).count()
-        today_income_sum = filtered_income.filter(created_at__date=current_date.date()).aggregate(total=Sum('amount'))['total'] or 0
-        today_expense_sum = filtered_expense.filter(created_at__date=current_date.date()).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Weekly data
-        week_start = current_date - timedelta(days=current_date.weekday())
-        week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_end = week_start + timedelta(days=7)
-        
-        weekly_income_count = filtered_income.filter(created_at__gte=week_start, created_at__lt=week_end).count()
-        weekly_expense_count = filtered_expense.filter(created_at__gte=week_start, created_at__lt=week_end).count()
-        weekly_income_sum = filtered_income.filter(created_at__gte=week_start, created_at__lt=week_end).aggregate(total=Sum('amount'))['total'] or 0
-        weekly_expense_sum = filtered_expense.filter(created_at__gte=week_start, created_at__lt=week_end).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Monthly data
-        month_start = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if current_date.month == 12:
-            month_end = month_start.replace(year=current_date.year + 1, month=1)
-        else:
-            month_end = month_start.replace(month=current_date.month + 1)
-            
-        monthly_income_count = filtered_income.filter(created_at__gte=month_start, created_at__lt=month_end).count()
-        monthly_expense_count = filtered_expense.filter(created_at__gte=month_start, created_at__lt=month_end).count()
-        monthly_income_sum = filtered_income.filter(created_at__gte=month_start, created_at__lt=month_end).aggregate(total=Sum('amount'))['total'] or 0
-        monthly_expense_sum = filtered_expense.filter(created_at__gte=month_start, created_at__lt=month_end).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Get recent transactions
-        recent_income = filtered_income.order_by('-created_at')[:5]
-        recent_expense = filtered_expense.order_by('-created_at')[:5]
-        
-        recent_transactions = []
-        for income in recent_income:
-            recent_transactions.append({
-                'description': income.description,
-                'category': income.category,
-                'amount': float(income.amount),
-                'date': income.created_at.strftime('%Y-%m-%d'),
-                'type': 'income'
-            })
-        
-        for expense in recent_expense:
-            recent_transactions.append({
-                'description': expense.description,
-                'category': expense.category,
-                'amount': float(expense.amount),
-                'date': expense.created_at.strftime('%Y-%m-%d'),
-                'type': 'expense'
-            })
-        
-        # Sort by date (most recent first) and limit to 10
-        recent_transactions = sorted(recent_transactions, key=lambda x: x['date'], reverse=True)[:10]
-        
-        return JsonResponse({
-            'transaction_counts': {
-                'today': {
-                    'total': today_income_count + today_expense_count,
-                    'income': float(today_income_sum),
-                    'expense': float(today_expense_sum)
-                },
-                'weekly': {
-                    'total': weekly_income_count + weekly_expense_count,
-                    'income': float(weekly_income_sum),
-                    'expense': float(weekly_expense_sum)
-                },
-                'monthly': {
-                    'total': monthly_income_count + monthly_expense_count,
-                    'income': float(monthly_income_sum),
-                    'expense': float(monthly_expense_sum)
-                }
-            },
-            'recent_transactions': recent_transactions
-        })
-    
-    return JsonResponse({'error': 'Invalid chart type'}, status=400)
+    try:
+        return JsonResponse(charts.build(chart_type, charts.ChartData(user), request.GET))
+    except charts.UnknownChart:
+        return JsonResponse({'error': 'Invalid chart type'}, status=400)
+
+
+@cache_per_user('chart-data:batch')
+def chart_data_batch(request):
+    """Several charts in one response: ``?charts=monthly,category,balance``.
+
+    The charts share their aggregates, and the other query parameters are
+    passed to every chart (e.g. the filters for ``filtered``). Returns
+    ``{chart_type: payload}``.
+    """
+    user = request.finance_user
+
+    if not user:
+        return JsonResponse({'error': 'User not authenticated'}, status=401)
+
+    chart_types = [name.strip() for name in request.GET.get('charts', '').split(',') if name.strip()]
+    if not chart_types:
+        return JsonResponse({'error': 'No charts requested'}, status=400)
+    return JsonResponse(charts.build_many(chart_types, charts.ChartData(user), request.GET))
 
 
 # Group Split Money Views
 @login_required
 def groups(request):
-    user = Registration.objects.get(email=request.session['entry_email'])
-    user_groups = Group.objects.filter(members=user)
-    created_groups = Group.objects.filter(created_by=user)
-    
-    # Combine and remove duplicates
-    all_groups = list(user_groups) + list(created_groups)
-    unique_groups = list({group.id: group for group in all_groups}.values())
-    
+    user = request.finance_user
+
+    # Groups the user belongs to or created, with their statistics, in one query
+    def per_group(queryset, value):
+        return Subquery(queryset.filter(group=OuterRef('pk')).order_by().values('group').annotate(v=value).values('v'))
+
+    decimal = DecimalField(max_digits=14, decimal_places=2)
+    unique_groups = list(
+        Group.objects.filter(Q(created_by=user) | Q(pk__in=GroupMember.objects.filter(member=user).values('group')))
+        .annotate(
+            member_count=Coalesce(per_group(GroupMember.objects, Count('*')), 0),
+            expense_total=Coalesce(per_group(GroupExpense.objects, Sum('amount')), Value(Decimal('0')),
+                                   output_field=decimal),
+            # What members who are owed money are still waiting for
+            pending_total=Coalesce(per_group(GroupBalance.objects.filter(paid_total__gt=F('owed_total')),
+                                             Sum(F('paid_total') - F('owed_total'))),
+                                   Value(Decimal('0')), output_field=decimal),
+        )
+        .order_by('pk')
+    )
+
     # Calculate statistics with default values of 0
     total_groups = len(unique_groups)
-    
-    # Calculate total members across all groups
-    total_members = 0
-    for group in unique_groups:
-        total_members += group.members.count()
-    
-    # Calculate total group expenses (all time) and individual group expenses
-    total_group_expenses = 0
-    group_expenses_dict = {}
-    
-    for group in unique_groups:
-        group_expenses = GroupExpense.objects.filter(group=group).aggregate(total=Sum('amount'))['total'] or 0
-        total_group_expenses += group_expenses
-        group_expenses_dict[group.id] = group_expenses
-    
-    # Calculate pending settlements (simplified calculation)
-    pending_settlements = 0
-    for group in unique_groups:
-        # Get all expenses for this group
-        group_expenses = GroupExpense.objects.filter(group=group)
-        for expense in group_expenses:
-            # Calculate what each member owes
-            included_count = expense.included_members.count()
-            if included_count > 0:
-                per_person_amount = expense.amount / included_count
-                # If someone other than the payer is included, they owe money
-                if expense.paid_by not in expense.included_members.all():
-                    pending_settlements += per_person_amount
-    
+    total_members = sum(group.member_count for group in unique_groups)
+    total_group_expenses = sum(group.expense_total for group in unique_groups)
+    group_expenses_dict = {group.id: group.expense_total for group in unique_groups}
+    pending_settlements = sum(group.pending_total for group in unique_groups)
+
     context = {
         'groups': unique_groups,
         'user': user,
@@ -2173,7 +1547,7 @@ def groups(request):
 @login_required
 @ensure_csrf_cookie
 def create_group(request):
-    user = Registration.objects.get(email=request.session['entry_email'])
+    user = request.finance_user
     
     if request.method == 'POST':
         group_name = request.POST.get('name')  # Changed from 'group_name' to 'name'
@@ -2198,22 +1572,16 @@ def create_group(request):
         # Add creator as a member
         GroupMember.objects.create(group=group, member=user, joined_at=datetime.now())
         
-        # Add other members
-        member_emails = []
-        for i in range(1, 11):  # Support up to 10 members
-            email = request.POST.get(f'member_email_{i}')
-            if email and email.strip():
-                member_emails.append(email.strip())
-        
-        # Add members to the group
-        for email in member_emails:
-            try:
-                member = Registration.objects.get(email=email)
-                if member != user:  # Don't add creator again
-                    GroupMember.objects.create(group=group, member=member, joined_at=datetime.now())
-            except Registration.DoesNotExist:
-                # Handle case where email doesn't exist
-                pass
+        # Add other members: any number of member_email_<n> fields plus a pasted list
+        member_emails = [
+            value for key, value in request.POST.items()
+            if key.startswith('member_email_') and value.strip() and value.strip().lower() != user.email.lower()
+        ]
+        member_emails += membership.parse_emails(request.POST.get('member_emails'))
+        report = membership.invite(group, member_emails)
+        not_added = [r.email for r in report if r.status in (membership.NOT_FOUND, membership.INVALID)]
+        if not_added:
+            messages.warning(request, f"Not added (no FinanceFlow account or invalid address): {', '.join(not_added)}")
         
         return redirect('group_detail', group_id=group.id)
     
@@ -2225,7 +1593,7 @@ def create_group(request):
 
 @login_required
 def group_detail(request, group_id):
-    user = Registration.objects.get(email=request.session['entry_email'])
+    user = request.finance_user
     
     try:
         group = Group.objects.get(id=group_id)
@@ -2237,10 +1605,9 @@ def group_detail(request, group_id):
         expenses = GroupExpense.objects.filter(group=group).order_by('-date')
         
         # Calculate member balances
-        member_balances = {}
-        for member in group.members.all():
-            balance = group.get_member_balance(member)
-            member_balances[member] = balance
+        members = list(group.members.all())
+        balances = ledger.member_balances(group, members)
+        member_balances = {member: balances[member.id] for member in members}
         
         context = {
             'group': group,
@@ -2257,7 +1624,7 @@ def group_detail(request, group_id):
 @login_required
 @ensure_csrf_cookie
 def add_group_expense(request, group_id):
-    user = Registration.objects.get(email=request.session['entry_email'])
+    user = request.finance_user
     
     try:
         group = Group.objects.get(id=group_id)
@@ -2270,7 +1637,9 @@ def add_group_expense(request, group_id):
             description = request.POST.get('description')
             amount_raw = request.POST.get('amount')
             date = request.POST.get('date')
-            included_members = request.POST.getlist('included_members')
+            included_members = list(dict.fromkeys(request.POST.getlist('included_members')))
+            split_mode = request.POST.get('split_mode') or splits.EQUAL
+            split_values = {m: request.POST.get(f'split_{m}', '') for m in included_members}
 
             # Basic validations
             error = None
@@ -2278,6 +1647,8 @@ def add_group_expense(request, group_id):
                 amount = Decimal(amount_raw)
                 if amount <= 0:
                     error = 'Amount must be greater than 0.'
+                elif amount != amount.quantize(Decimal('0.01')):
+                    error = 'Amount can have at most two decimal places.'
             except Exception:
                 error = 'Please enter a valid amount.'
 
@@ -2287,21 +1658,30 @@ def add_group_expense(request, group_id):
             if not included_members:
                 error = error or 'Please select at least one member to split the expense.'
 
-            # Ensure payer and included members are part of the group
+            # Ensure payer and included members are part of the group (one query for all of them)
             if not error:
-                if not group.members.filter(id=payer_id).exists():
+                requested = [m for m in included_members + [payer_id] if m.isdigit()]
+                in_group = {str(m) for m in group.members.filter(id__in=requested).values_list('id', flat=True)}
+                if payer_id not in in_group:
                     error = 'Selected payer is not a member of this group.'
                 else:
                     # Filter included_members to group members only
-                    included_member_ids = [m_id for m_id in included_members if group.members.filter(id=m_id).exists()]
-                    if not included_member_ids:
+                    included_members = [m for m in included_members if m in in_group]
+                    if not included_members:
                         error = 'Selected members are not in this group.'
-                    else:
-                        included_members = included_member_ids
+
+            if not error:
+                try:
+                    shares = splits.compute(split_mode, amount, [int(m) for m in included_members],
+                                            {int(m): split_values.get(m) for m in included_members})
+                except splits.SplitError as e:
+                    error = str(e)
 
             if error:
                 context = {
                     'group': group,
+                    'members': list(group.members.all()),
+                    'split_modes': splits.MODE_CHOICES,
                     'user': user,
                     'error': error,
                     'form_values': {
@@ -2310,39 +1690,35 @@ def add_group_expense(request, group_id):
                         'date': date,
                         'payer': payer_id,
                         'included_members': included_members,
+                        'split_mode': split_mode,
+                        'split_values': {int(m): v for m, v in split_values.items() if m.isdigit()},
                     }
                 }
                 return render(request, 'groups/add_group_expense.html', context)
 
-            # Create the expense
-            expense = GroupExpense.objects.create(
-                group=group,
-                paid_by_id=payer_id,
-                description=description,
-                amount=amount,
-                date=date
-            )
-
-            # Add included members
-            for member_id in included_members:
-                expense.included_members.add(member_id)
-
-            # Calculate splits (equal split)
-            split_amount = amount / len(included_members)
-
-            # Create splits for each member
-            for member_id in included_members:
-                member = Registration.objects.get(id=member_id)
-                GroupExpenseSplit.objects.create(
-                    expense=expense,
-                    member=member,
-                    amount=split_amount
+            # The expense, its splits and the group balances are written together
+            with transaction.atomic():
+                expense = GroupExpense.objects.create(
+                    group=group,
+                    paid_by_id=payer_id,
+                    description=description,
+                    amount=amount,
+                    date=date
                 )
+                expense.included_members.add(*[int(m) for m in included_members])
+                GroupExpenseSplit.objects.bulk_create([
+                    GroupExpenseSplit(expense=expense, member_id=member_id, amount=share)
+                    for member_id, share in shares.items()
+                ])
+                # bulk_create sends no signals; the payment was recorded by the save above
+                ledger.add_shares(group.id, shares)
 
             return redirect('group_detail', group_id=group.id)
         
         context = {
             'group': group,
+            'members': list(group.members.all()),
+            'split_modes': splits.MODE_CHOICES,
             'user': user
         }
         return render(request, 'groups/add_group_expense.html', context)
@@ -2353,7 +1729,7 @@ def add_group_expense(request, group_id):
 
 @login_required
 def group_balances(request, group_id):
-    user = Registration.objects.get(email=request.session['entry_email'])
+    user = request.finance_user
     
     try:
         group = Group.objects.get(id=group_id)
@@ -2362,71 +1738,49 @@ def group_balances(request, group_id):
             return redirect('groups')
         
         # Calculate detailed balances and totals
-        member_balances = {}
-        for member in group.members.all():
-            balance = group.get_member_balance(member)
-            member_balances[member] = balance
+        members = list(group.members.all())
+        ids, cents = ledger.balance_vector(group)
+        balances = ledger.balance_map(ids, cents, members)
+        member_balances = {member: balances[member.id] for member in members}
 
         total_expenses = GroupExpense.objects.filter(group=group).aggregate(total=Sum('amount'))['total'] or 0
         total_positive = sum(b for b in member_balances.values() if b > 0)
         total_negative = sum(b for b in member_balances.values() if b < 0)
 
-        # Build pairwise debt/credit relationships: who owes whom
-        from collections import defaultdict
-        debt_matrix = defaultdict(lambda: defaultdict(Decimal))  # debtor_id -> creditor_id -> amount
-
-        expenses = GroupExpense.objects.filter(group=group).prefetch_related('included_members')
-        for expense in expenses:
-            included = list(expense.included_members.all())
-            if not included:
-                continue
-            split_amount = (expense.amount / Decimal(len(included))) if len(included) else Decimal('0')
-            for m in included:
-                if m.id != expense.paid_by_id:
-                    debt_matrix[m.id][expense.paid_by_id] += split_amount
-
-        # Net bilateral debts between each pair
-        member_ids = list(group.members.values_list('id', flat=True))
-        for i_idx in range(len(member_ids)):
-            for j_idx in range(i_idx + 1, len(member_ids)):
-                i = member_ids[i_idx]
-                j = member_ids[j_idx]
-                d_ij = debt_matrix[i].get(j, Decimal('0'))
-                d_ji = debt_matrix[j].get(i, Decimal('0'))
-                if d_ij >= d_ji:
-                    debt_matrix[i][j] = d_ij - d_ji
-                    if debt_matrix[i][j] == 0:
-                        debt_matrix[i].pop(j, None)
-                    debt_matrix[j][i] = Decimal('0')
-                    debt_matrix[j].pop(i, None)
-                else:
-                    debt_matrix[j][i] = d_ji - d_ij
-                    if debt_matrix[j][i] == 0:
-                        debt_matrix[j].pop(i, None)
-                    debt_matrix[i][j] = Decimal('0')
-                    debt_matrix[i].pop(j, None)
+        # Fewest transfers that settle everyone's net balance (largest first)
+        transfers = settlement.settle(ids, cents)
+        id_to_member = {m.id: m for m in members}
+        # Former members can still have a balance from older expenses
+        missing = {uid for t in transfers for uid in (t.giver, t.receiver)} - id_to_member.keys()
+        if missing:
+            id_to_member.update(Registration.objects.in_bulk(missing))
+
+        gives = defaultdict(list)     # giver_id -> [(receiver_id, amount)]
+        receives = defaultdict(list)  # receiver_id -> [(giver_id, amount)]
+        settlement_instructions = []
+        for t in transfers:
+            amount = Decimal(t.cents).scaleb(-2)
+            gives[t.giver].append((t.receiver, amount))
+            receives[t.receiver].append((t.giver, amount))
+            settlement_instructions.append({
+                'giver': id_to_member[t.giver],
+                'receiver': id_to_member[t.receiver],
+                'amount': float(amount),
+                'id': f"{t.giver}_{t.receiver}"
+            })
 
         # Prepare readable Paid/Borrowed text with amounts for each member (Kittysplit-style)
-        id_to_member = {m.id: m for m in group.members.all()}
         paid_borrowed_text = {}
         settlements = {}
-        settlement_instructions = []
 
-        for m in group.members.all():
-            others = {mid for mid in member_ids if mid != m.id}
-            # who this member owes to (creditors)
-            owes_to_pairs = [(cred_id, amt) for cred_id, amt in debt_matrix[m.id].items() if amt > 0]
-            # who owes this member (debtors)
-            owed_by_pairs = []
-            for debtor_id in member_ids:
-                if debtor_id == m.id:
-                    continue
-                amt = debt_matrix[debtor_id].get(m.id, Decimal('0'))
-                if amt > 0:
-                    owed_by_pairs.append((debtor_id, amt))
+        def by_name(pair):
+            return id_to_member[pair[0]].name.lower()
 
-            total_paid_for = sum((amt for _uid, amt in owed_by_pairs), Decimal('0'))
+        for m in members:
+            owes_to_pairs = sorted(gives[m.id], key=by_name)
+            owed_by_pairs = sorted(receives[m.id], key=by_name)
             total_owes = sum((amt for _uid, amt in owes_to_pairs), Decimal('0'))
+            total_paid_for = sum((amt for _uid, amt in owed_by_pairs), Decimal('0'))
 
             # Build lines similar to Kittysplit:
             # - Gives ₹X to Name(s)
@@ -2435,41 +1789,25 @@ def group_balances(request, group_id):
             if owes_to_pairs:
                 detail = ', '.join(
                     f"{id_to_member[uid].name} (₹{'{:.2f}'.format(float(amt))})"
-                    for uid, amt in sorted(owes_to_pairs, key=lambda x: id_to_member[x[0]].name.lower())
+                    for uid, amt in owes_to_pairs
                 )
                 parts.append(f"Gives ₹{'{:.2f}'.format(float(total_owes))} to {detail}")
             if owed_by_pairs:
                 detail = ', '.join(
                     f"{id_to_member[uid].name} (₹{'{:.2f}'.format(float(amt))})"
-                    for uid, amt in sorted(owed_by_pairs, key=lambda x: id_to_member[x[0]].name.lower())
+                    for uid, amt in owed_by_pairs
                 )
                 parts.append(f"Receives ₹{'{:.2f}'.format(float(total_paid_for))} from {detail}")
 
             paid_borrowed_text[m.id] = ' | '.join(parts) if parts else '—'
 
             settlements[m.id] = {
-                'gives_pairs': [(id_to_member[uid].name, float(amt)) for uid, amt in sorted(owes_to_pairs, key=lambda x: id_to_member[x[0]].name.lower())],
-                'receives_pairs': [(id_to_member[uid].name, float(amt)) for uid, amt in sorted(owed_by_pairs, key=lambda x: id_to_member[x[0]].name.lower())],
+                'gives_pairs': [(id_to_member[uid].name, float(amt)) for uid, amt in owes_to_pairs],
+                'receives_pairs': [(id_to_member[uid].name, float(amt)) for uid, amt in owed_by_pairs],
                 'total_gives': float(total_owes),
                 'total_receives': float(total_paid_for),
             }
 
-        # Generate settlement instructions (like Kittysplit's "How to settle all debts")
-        for debtor_id in member_ids:
-            for creditor_id in member_ids:
-                if debtor_id != creditor_id:
-                    amount = debt_matrix[debtor_id].get(creditor_id, Decimal('0'))
-                    if amount > 0:
-                        settlement_instructions.append({
-                            'giver': id_to_member[debtor_id],
-                            'receiver': id_to_member[creditor_id],
-                            'amount': float(amount),
-                            'id': f"{debtor_id}_{creditor_id}"
-                        })
-
-        # Sort settlement instructions by amount (largest first)
-        settlement_instructions.sort(key=lambda x: x['amount'], reverse=True)
-
         context = {
             'group': group,
             'member_balances': member_balances,
@@ -2490,7 +1828,7 @@ def group_balances(request, group_id):
 @login_required
 @ensure_csrf_cookie
 def add_group_member(request, group_id):
-    user = Registration.objects.get(email=request.session['entry_email'])
+    user = request.finance_user
     
     try:
         group = Group.objects.get(id=group_id)
@@ -2499,26 +1837,30 @@ def add_group_member(request, group_id):
             return redirect('group_detail', group_id=group.id)
         
         if request.method == 'POST':
-            member_email = request.POST.get('member_email')
-            
-            try:
-                member = Registration.objects.get(email=member_email)
-                # Check if member is already in the group
-                if not group.members.filter(id=member.id).exists():
-                    GroupMember.objects.create(group=group, member=member, joined_at=datetime.now())
-                    return redirect('group_detail', group_id=group.id)
-                else:
-                    return render(request, 'groups/add_group_member.html', {
-                        'group': group,
-                        'user': user,
-                        'error': 'Member is already in the group'
-                    })
-            except Registration.DoesNotExist:
+            # One address, or a pasted list / CSV of them
+            emails = membership.parse_emails(request.POST.get('member_emails'))
+            if request.POST.get('member_email', '').strip():
+                emails.insert(0, request.POST['member_email'])
+            if not emails:
                 return render(request, 'groups/add_group_member.html', {
                     'group': group,
                     'user': user,
-                    'error': 'User with this email does not exist'
+                    'error': 'Please enter at least one email address'
                 })
+
+            report = membership.invite(group, emails)
+            added = sum(r.status == membership.ADDED for r in report)
+            if added == len(report):
+                messages.success(request, f"Added {added} member{'s' if added != 1 else ''} to the group.")
+                return redirect('group_detail', group_id=group.id)
+            return render(request, 'groups/add_group_member.html', {
+                'group': group,
+                'user': user,
+                'report': report,
+                'added': added,
+                'status_messages': membership.STATUS_MESSAGES,
+                'member_emails': request.POST.get('member_emails', ''),
+            })
         
         context = {
             'group': group,
@@ -2532,7 +1874,7 @@ def add_group_member(request, group_id):
 
 @login_required
 def delete_group(request, group_id):
-    user = Registration.objects.get(email=request.session['entry_email'])
+    user = request.finance_user
     
     try:
         group = Group.objects.get(id=group_id)
@@ -2540,7 +1882,9 @@ def delete_group(request, group_id):
         if group.created_by != user:
             return redirect('group_detail', group_id=group.id)
         
-        group.delete()
+        # The group's balances are deleted with it
+        with ledger.suspended(group.pk):
+            group.delete()
         return redirect('groups')
     
     except Group.DoesNotExist:
@@ -2551,9 +1895,7 @@ def delete_group(request, group_id):
 def generate_custom_report(request):
     """Generate custom reports based on user filters"""
     if request.method == 'POST':
-        user = None
-        if 'entry_email' in request.session:
-            user = Registration.objects.filter(email=request.session['entry_email']).first()
+        user = request.finance_user
         
         if not user:
             return redirect('login')
@@ -2561,186 +1903,56 @@ def generate_custom_report(request):
         # Get form data
         start_date = request.POST.get('start_date')
         end_date = request.POST.get('end_date')
-        category = request.POST.get('category', 'All')
-        transaction_type = request.POST.get('type', 'All')
-        amount_range = request.POST.get('amount_range', 'All')
-        sort_by = request.POST.get('sort_by', 'date_desc')
-        group_by = request.POST.get('group_by', 'None')
         export_format = request.POST.get('export_format', 'PDF')
         
-        # Build query filters
-        income_filters = {'user': user}
-        expense_filters = {'user': user}
-        
-        if start_date:
-            income_filters['created_at__gte'] = start_date
-            expense_filters['created_at__gte'] = start_date
-        
-        if end_date:
-            income_filters['created_at__lte'] = end_date
-            expense_filters['created_at__lte'] = end_date
-        
-        if category != 'All':
-            income_filters['category'] = category
-            expense_filters['category'] = category
-        
-        # Get transactions based on type
-        transactions = []
-        
-        if transaction_type in ['All', 'Income']:
-            income_data = Income.objects.filter(**income_filters).values(
-                'amount', 'category', 'description', 'created_at'
-            ).annotate(type=Value('Income', output_field=CharField()))
-            transactions.extend(list(income_data))
-        
-        if transaction_type in ['All', 'Expense']:
-            expense_data = Expense.objects.filter(**expense_filters).values(
-                'amount', 'category', 'description', 'created_at'
-            ).annotate(type=Value('Expense', output_field=CharField()))
-            transactions.extend(list(expense_data))
-        
-        # Apply amount range filter
-        if amount_range != 'All':
-            if amount_range == '0-1000':
-                transactions = [t for t in transactions if 0 <= float(t['amount']) <= 1000]
-            elif amount_range == '1000-5000':
-                transactions = [t for t in transactions if 1000 < float(t['amount']) <= 5000]
-            elif amount_range == '5000-10000':
-                transactions = [t for t in transactions if 5000 < float(t['amount']) <= 10000]
-            elif amount_range == '10000+':
-                transactions = [t for t in transactions if float(t['amount']) > 10000]
-        
-        # Sort transactions
-        if sort_by == 'date_desc':
-            transactions.sort(key=lambda x: x['created_at'], reverse=True)
-        elif sort_by == 'date_asc':
-            transactions.sort(key=lambda x: x['created_at'])
-        elif sort_by == 'amount_desc':
-            transactions.sort(key=lambda x: float(x['amount']), reverse=True)
-        elif sort_by == 'amount_asc':
-            transactions.sort(key=lambda x: float(x['amount']))
-        elif sort_by == 'category':
-            transactions.sort(key=lambda x: x['category'])
-        
         # Generate report based on format
-        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"Custom_Report_{timestamp}"
-
-        if export_format == 'CSV':
-            return generate_csv_report(transactions, filename)
-        elif export_format == 'JSON':
-            return generate_json_report(transactions, filename)
-        elif export_format == 'Excel':
-            # Excel-friendly CSV content type
-            response = HttpResponse(content_type='application/vnd.ms-excel')
-            response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-            writer = csv.writer(response)
-            writer.writerow(['Type', 'Amount', 'Category', 'Description', 'Date'])
-            for t in transactions:
-                writer.writerow([
-                    t['type'],
-                    float(t['amount']),
-                    t['category'],
-                    t['description'],
-                    t['created_at'].strftime('%Y-%m-%d %H:%M')
-                ])
-            return response
-        elif export_format == 'PDF':
-            # Build rows for PDF
-            header = ['Type', 'Amount', 'Category', 'Description', 'Date']
-            rows = []
-            for t in transactions:
-                rows.append([
-                    t['type'],
-                    float(t['amount']),
-                    t['category'],
-                    t['description'],
-                    t['created_at'].strftime('%Y-%m-%d %H:%M')
-                ])
+        generated_on = timezone.now()
+        filename = f"Custom_Report_{generated_on.strftime('%Y%m%d_%H%M%S')}"
 
+        if export_format == 'PDF':
             try:
-                from xhtml2pdf import pisa
+                from xhtml2pdf import pisa  # noqa: F401
             except Exception:
                 # Fallback to HTML preview if xhtml2pdf is not installed
                 html = render_to_string('reports/pdf_report.html', {
                     'user': user,
                     'report_type': 'Custom Report',
                     'date_range': f"{start_date or ''} to {end_date or ''}".strip(),
-                    'generated_on': timezone.now(),
-                    'header': header,
-                    'rows': rows,
+                    'generated_on': generated_on,
+                    'header': reporting.CUSTOM_REPORT_HEADER,
+                    'rows': list(reporting.custom_report_rows(reporting.custom_report_items(user, request.POST))),
                     'pdf_notice': 'xhtml2pdf is not installed. Please install it to enable direct PDF download.'
                 })
                 return HttpResponse(html)
 
-            html = render_to_string('reports/pdf_report.html', {
-                'user': user,
-                'report_type': 'Custom Report',
-                'date_range': f"{start_date or ''} to {end_date or ''}".strip(),
-                'generated_on': timezone.now(),
-                'header': header,
-                'rows': rows,
-                'pdf_notice': ''
-            })
-            result = BytesIO()
-            pdf = pisa.CreatePDF(src=html, dest=result)
-            if pdf.err:
-                return HttpResponse('Failed to generate PDF.', content_type='text/plain', status=500)
-            response = HttpResponse(result.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
-            return response
+            # Render off the request path; the form fields are the job parameters
+            params = {key: request.POST.get(key) for key in reporting.CUSTOM_REPORT_FIELDS if key in request.POST}
+            params['generated_on'] = generated_on.isoformat()
+            job = jobs.enqueue(user, 'custom_report', params, f'{filename}.pdf')
+            return _report_job_accepted(request, job)
+
+        # Streamed straight from the database, a chunk of rows at a time
+        items = reporting.custom_report_items(user, request.POST)
+        if export_format == 'JSON':
+            return exports.stream_json(exports.json_array(reporting.custom_report_json_items(items)), f'{filename}.json')
+        elif export_format == 'Excel':
+            # Excel-friendly CSV content type
+            return exports.stream_csv(
+                chain([reporting.CUSTOM_REPORT_HEADER], reporting.custom_report_rows(items)),
+                f'{filename}.csv', content_type='application/vnd.ms-excel'
+            )
         else:
-            # Default to CSV if format is unrecognized
-            return generate_csv_report(transactions, filename)
+            # CSV, also the default if format is unrecognized
+            return exports.stream_csv(reporting.custom_report_csv_rows(items), f'{filename}.csv')
     
     return redirect('reports')
 
 
-def generate_csv_report(transactions, filename):
-    """Generate CSV report from transactions data"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Type', 'Category', 'Description', 'Amount'])
-    
-    for transaction in transactions:
-        writer.writerow([
-            transaction['created_at'].strftime('%Y-%m-%d %H:%M'),
-            transaction['type'],
-            transaction['category'],
-            transaction['description'],
-            f"₹{transaction['amount']}"
-        ])
-    
-    return response
-
-
-
-
-def generate_json_report(transactions, filename):
-    """Generate JSON report from transactions data"""
-    # Convert datetime objects to strings for JSON serialization
-    for transaction in transactions:
-        transaction['created_at'] = transaction['created_at'].strftime('%Y-%m-%d %H:%M:%S')
-        transaction['amount'] = str(transaction['amount'])
-    
-    response = HttpResponse(
-        json.dumps(transactions, indent=2),
-        content_type='application/json'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}.json"'
-    
-    return response
-
-
 # Edit and Delete Transaction Views
 @login_required
 def edit_income(request, income_id):
     """Edit an existing income transaction"""
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if not user:
         return redirect('login')
@@ -2793,9 +2005,7 @@ def edit_income(request, income_id):
 @login_required
 def edit_expense(request, expense_id):
     """Edit an existing expense transaction"""
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if not user:
         return redirect('login')
@@ -2848,9 +2058,7 @@ def edit_expense(request, expense_id):
 @login_required
 def delete_income(request, income_id):
     """Delete an income transaction"""
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if not user:
         return redirect('login')
@@ -2892,9 +2100,7 @@ def delete_income(request, income_id):
 @login_required
 def delete_expense(request, expense_id):
     """Delete an expense transaction"""
-    user = None
-    if 'entry_email' in request.session:
-        user = Registration.objects.filter(email=request.session['entry_email']).first()
+    user = request.finance_user
     
     if not user:
         return redirect('login')